@@ -0,0 +1,280 @@
+"""Backtest of controller settings against Home Assistant recorder history
+
+Streams the mains phase currents and the Easee circuit currents out of a
+recorder SQLite database, resamples them onto the sample interval and
+replays the household load through the Calculator and the limit command
+policy. Every combination of the given settings runs in a process pool
+worker of its own, each streaming the database itself, so memory stays
+flat however much history is replayed.
+
+    python benchmarks/backtest_recorder.py home-assistant_v2.db \\
+        --mains sensor.current_l1 sensor.current_l2 sensor.current_l3 \\
+        --charger sensor.easee_circuit_current --rated-current 25 \\
+        --window 6 12 --margin 0 1 2 --strategy mean ewma kalman
+
+Needs the recorder schema of Home Assistant 2023.4 or later, with the
+states_meta table. Open the database of a stopped instance or a copy.
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import heapq
+import itertools
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from custom_components.generic_charge_controller.const import (  # noqa: E402
+    DEFAULT_WINDOW_SIZE,
+    FILTER_MEAN,
+    FILTER_STRATEGIES,
+)
+from custom_components.generic_charge_controller.easee.const import (  # noqa: E402
+    ATTR_PHASE_CURRENT_TMP,
+)
+from custom_components.generic_charge_controller.loadbalancer.backtest import (  # noqa: E402
+    DEFAULT_CAR_MAX_CURRENT,
+    backtest,
+)
+from custom_components.generic_charge_controller.loadbalancer.calculator import (  # noqa: E402
+    SAFETY_MARGIN,
+)
+from custom_components.generic_charge_controller.loadbalancer.policy import (  # noqa: E402
+    DEFAULT_INCREASE_DEADBAND,
+    DEFAULT_INCREASE_INTERVAL_SEC,
+    CommandPolicy,
+)
+
+DEFAULT_INTERVAL_SEC = 5
+# mains readings older than this leave a gap instead of being held
+MAX_HOLD_SEC = 300
+FETCH_ROWS = 5000
+
+STATES_QUERY = """
+    SELECT states.last_updated_ts, states.state, {attributes}
+    FROM states
+    {join}
+    WHERE states.metadata_id = ?
+      AND states.last_updated_ts >= ? AND states.last_updated_ts < ?
+    ORDER BY states.last_updated_ts
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def _metadata_id(connection: sqlite3.Connection, entity_id: str) -> int:
+    row = connection.execute(
+        "SELECT metadata_id FROM states_meta WHERE entity_id = ?", (entity_id,)
+    ).fetchone()
+    if row is None:
+        raise SystemExit(f"{entity_id} has no history in the recorder")
+    return row[0]
+
+
+def _states(
+    connection: sqlite3.Connection,
+    entity_id: str,
+    start: float,
+    end: float,
+    attributes: bool,
+) -> Iterator[tuple[float, str, str, str | None]]:
+    """States of one entity in time order, fetched in bounded batches"""
+    query = STATES_QUERY.format(
+        attributes="state_attributes.shared_attrs" if attributes else "NULL",
+        join=(
+            "LEFT JOIN state_attributes"
+            " ON states.attributes_id = state_attributes.attributes_id"
+            if attributes
+            else ""
+        ),
+    )
+    cursor = connection.execute(
+        query, (_metadata_id(connection, entity_id), start, end)
+    )
+    while rows := cursor.fetchmany(FETCH_ROWS):
+        for timestamp, state, attrs in rows:
+            yield timestamp, entity_id, state, attrs
+
+
+def _float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def recorder_loads(
+    path: str,
+    mains: list[str],
+    charger: str | None,
+    start: float = 0.0,
+    end: float = float("inf"),
+    interval: float = DEFAULT_INTERVAL_SEC,
+) -> Iterator[tuple[float, list[float]]]:
+    """Household load of every phase every `interval` seconds
+
+    The household load is the mains reading less the charger's circuit
+    current on the same phase, both as last recorded before the sample.
+    """
+    connection = _connect(path)
+    try:
+        streams = [
+            _states(connection, entity_id, start, end, False) for entity_id in mains
+        ]
+        if charger:
+            streams.append(_states(connection, charger, start, end, True))
+
+        readings: dict[str, tuple[float, float]] = {}
+        charger_currents = [0.0] * len(mains)
+        next_sample = None
+        for timestamp, entity_id, state, attrs in heapq.merge(*streams):
+            if next_sample is None:
+                next_sample = timestamp - timestamp % interval + interval
+
+            while next_sample <= timestamp:
+                fresh = [readings.get(entity) for entity in mains]
+                if all(
+                    reading and next_sample - reading[0] <= MAX_HOLD_SEC
+                    for reading in fresh
+                ):
+                    yield next_sample, [
+                        reading[1] - current
+                        for reading, current in zip(fresh, charger_currents)
+                    ]
+                next_sample += interval
+
+            if entity_id == charger:
+                attributes = json.loads(attrs) if attrs else {}
+                charger_currents = [
+                    _float(attributes.get(ATTR_PHASE_CURRENT_TMP % phase)) or 0.0
+                    for phase in range(1, len(mains) + 1)
+                ]
+            elif (value := _float(state)) is not None:
+                readings[entity_id] = (timestamp, value)
+            else:
+                readings.pop(entity_id, None)
+    finally:
+        connection.close()
+
+
+def run_config(job: tuple[dict, dict]) -> dict:
+    """Backtest one configuration, in a worker process"""
+    source, config = job
+    result = backtest(
+        recorder_loads(**source),
+        config["rated_current"],
+        config["strategy"],
+        window_size=config["window"],
+        car_max_current=config["car_max_current"],
+        safety_margin=config["margin"],
+        policy=CommandPolicy(
+            increase_deadband=config["increase_deadband"],
+            increase_interval=config["increase_interval"],
+        ),
+    )
+    return {**config, **result}
+
+
+def _timestamp(value: str | None, default: float) -> float:
+    return datetime.fromisoformat(value).timestamp() if value else default
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", help="recorder SQLite file")
+    parser.add_argument("--mains", nargs="+", required=True, help="phase sensors")
+    parser.add_argument("--charger", help="Easee circuit current sensor")
+    parser.add_argument("--rated-current", type=float, required=True)
+    parser.add_argument("--start", help="ISO date or time to start from")
+    parser.add_argument("--end", help="ISO date or time to stop at")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SEC)
+    parser.add_argument(
+        "--car-max-current", type=float, default=DEFAULT_CAR_MAX_CURRENT
+    )
+    parser.add_argument("--window", type=int, nargs="+", default=[DEFAULT_WINDOW_SIZE])
+    parser.add_argument("--margin", type=float, nargs="+", default=[SAFETY_MARGIN])
+    parser.add_argument(
+        "--strategy", nargs="+", choices=FILTER_STRATEGIES, default=[FILTER_MEAN]
+    )
+    parser.add_argument(
+        "--increase-deadband",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_INCREASE_DEADBAND],
+    )
+    parser.add_argument(
+        "--increase-interval",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_INCREASE_INTERVAL_SEC],
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    source = {
+        "path": args.database,
+        "mains": args.mains,
+        "charger": args.charger,
+        "start": _timestamp(args.start, 0.0),
+        "end": _timestamp(args.end, float("inf")),
+        "interval": args.interval,
+    }
+    configs = [
+        {
+            "rated_current": args.rated_current,
+            "car_max_current": args.car_max_current,
+            "strategy": strategy,
+            "window": window,
+            "margin": margin,
+            "increase_deadband": deadband,
+            "increase_interval": increase_interval,
+        }
+        for strategy, window, margin, deadband, increase_interval in itertools.product(
+            args.strategy,
+            args.window,
+            args.margin,
+            args.increase_deadband,
+            args.increase_interval,
+        )
+    ]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(run_config, [(source, config) for config in configs]))
+    results.sort(
+        key=lambda r: (
+            r["overload_seconds_per_hour"],
+            r["unused_headroom_amp_hours_per_hour"],
+        )
+    )
+
+    print(
+        f"{'strategy':>8} {'window':>6} {'margin':>6} {'deadband':>8}"
+        f" {'interval':>8} {'overload s/h':>12} {'unused Ah/h':>11}"
+        f" {'commands/h':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['strategy']:>8} {r['window']:>6} {r['margin']:>6g}"
+            f" {r['increase_deadband']:>8g} {r['increase_interval']:>8g}"
+            f" {r['overload_seconds_per_hour']:>12.1f}"
+            f" {r['unused_headroom_amp_hours_per_hour']:>11.2f}"
+            f" {r['commands_per_hour']:>10.1f}"
+        )
+
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
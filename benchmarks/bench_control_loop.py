@@ -0,0 +1,488 @@
+"""Control loop benchmarks and load test
+
+Drives the balancer, EaseeCharger and Calculator against the in-process
+fake Home Assistant and simulated Easee chargers, then writes the results
+as JSON so runs can be compared.
+
+    python benchmarks/bench_control_loop.py [--output bench_results.json]
+    python benchmarks/bench_control_loop.py --compare old.json new.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_hass import FakeHass, patch_integration  # noqa: E402
+from sim import HouseLoad, Site  # noqa: E402
+
+from custom_components.generic_charge_controller.const import (  # noqa: E402
+    DEFAULT_WINDOW_SIZE,
+    FILTER_STRATEGIES,
+    SAMPLING_MODE_ADAPTIVE,
+    SAMPLING_MODE_POLL,
+)
+from custom_components.generic_charge_controller.easee.charger import (  # noqa: E402
+    EaseeCharger,
+)
+from custom_components.generic_charge_controller.easee.const import (  # noqa: E402
+    EA_CHARGING,
+    EA_COMPLETED,
+    SVC_SET_LIMIT,
+)
+from custom_components.generic_charge_controller.loadbalancer.actuation import (  # noqa: E402
+    DEFAULT_ACK_TIMEOUT_SEC,
+)
+from custom_components.generic_charge_controller.loadbalancer.backtest import (  # noqa: E402
+    backtest,
+)
+from custom_components.generic_charge_controller.loadbalancer.core import (  # noqa: E402
+    DEFAULT_SAMPLE_INTERVAL_SEC,
+    async_get_balancer,
+)
+
+FUSE_CURRENT = 25
+TICKS_PER_HOUR = 3600 // DEFAULT_SAMPLE_INTERVAL_SEC
+GLITCH_RATE = 0.01
+GLITCH_SPIKE_AMPS = 30
+
+_LOGGER = logging.getLogger("benchmarks")
+
+
+class BenchController:
+    """Minimal controller registered with the balancer in place of the entity"""
+
+    def __init__(self, charger: EaseeCharger, unique_id: str) -> None:
+        self.charger = charger
+        self.unique_id = unique_id
+        self.scheduler = None
+        self.charge_limit = None
+        self.state = None
+        self.targets = None
+
+    def async_update_allocation(self, state, targets) -> None:
+        self.state = state
+        self.targets = targets
+
+
+class Bench:
+    """A fake hass with a number of sites, each one fuse with its chargers"""
+
+    def __init__(
+        self,
+        sites: int = 1,
+        chargers_per_site: int = 1,
+        seed: int = 0,
+        sampling_mode: str = SAMPLING_MODE_POLL,
+        phase_switching: bool = False,
+        offsets: dict[str, float] | None = None,
+        ack_timeout: float = DEFAULT_ACK_TIMEOUT_SEC,
+        direct: bool = False,
+        meter_every: int = 1,
+    ):
+        self.hass = FakeHass()
+        patch_integration(self.hass)
+
+        self.sites = [
+            Site(
+                self.hass,
+                f"site{i}",
+                chargers_per_site,
+                seed + i,
+                offsets,
+                direct=direct,
+                meter_every=meter_every,
+            )
+            for i in range(sites)
+        ]
+        self.controllers = []
+        for site in self.sites:
+            balancer = async_get_balancer(
+                self.hass,
+                site.mains,
+                FUSE_CURRENT,
+                DEFAULT_WINDOW_SIZE,
+                sampling_mode,
+            )
+            for sim in site.chargers:
+                charger = EaseeCharger(
+                    self.hass,
+                    _LOGGER,
+                    sim.device_id,
+                    sim.unique_id,
+                    phase_switching=phase_switching,
+                    ack_timeout=ack_timeout,
+                )
+                controller = BenchController(charger, sim.unique_id)
+                charger.async_subscribe()
+                balancer.async_register(controller)
+                self.controllers.append(controller)
+
+    @property
+    def limit_commands(self) -> int:
+        return sum(1 for call in self.hass.services.calls if call[1] == SVC_SET_LIMIT)
+
+    def advance(self) -> None:
+        """Move simulated time and the world forward by one sample interval"""
+        self.hass.clock.advance(DEFAULT_SAMPLE_INTERVAL_SEC)
+        for site in self.sites:
+            site.step()
+
+    async def tick(self) -> None:
+        """Run the control loop timers that are due, as Home Assistant would"""
+        await self.hass.async_run_due()
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(values, n=100)
+    return {
+        "p50": cuts[49],
+        "p90": cuts[89],
+        "p99": cuts[98],
+        "max": max(values),
+        "mean": statistics.fmean(values),
+    }
+
+
+async def bench_tick_latency(ticks: int) -> dict:
+    """Latency of one control loop tick for a single charger"""
+    bench = Bench()
+    durations = []
+    for _ in range(ticks):
+        bench.advance()
+        start = time.perf_counter()
+        await bench.tick()
+        durations.append((time.perf_counter() - start) * 1e6)
+
+    return {"unit": "us", "ticks": ticks, **_percentiles(durations)}
+
+
+async def bench_throughput(ticks: int) -> dict:
+    """Ticks per second with many controllers, separate and shared fuses"""
+    results = {}
+    for sites, chargers in ((1, 1), (10, 1), (50, 1), (200, 1), (1, 4), (1, 16)):
+        bench = Bench(sites, chargers)
+        elapsed = 0.0
+        for _ in range(ticks):
+            bench.advance()
+            start = time.perf_counter()
+            await bench.tick()
+            elapsed += time.perf_counter() - start
+
+        controllers = sites * chargers
+        results[f"{sites}x{chargers}"] = {
+            "fuses": sites,
+            "chargers_per_fuse": chargers,
+            "controller_ticks_per_sec": controllers * ticks / elapsed,
+            "us_per_fuse_tick": elapsed / (sites * ticks) * 1e6,
+        }
+
+    return results
+
+
+async def bench_allocations(ticks: int) -> dict:
+    """Memory allocated by the control loop per tick, measured by tracemalloc"""
+    bench = Bench()
+    for _ in range(50):  # warm up buffers and caches
+        bench.advance()
+        await bench.tick()
+
+    blocks = 0
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(ticks):
+            bench.advance()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            base, _ = tracemalloc.get_traced_memory()
+            await bench.tick()
+            _, tick_peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            blocks += sum(
+                stat.count_diff
+                for stat in after.compare_to(before, "filename")
+                if stat.count_diff > 0
+            )
+            peak = max(peak, tick_peak - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ticks": ticks,
+        "new_blocks_per_tick": blocks / ticks,
+        "peak_bytes_per_tick": peak,
+    }
+
+
+async def bench_service_calls(hours: int) -> dict:
+    """Limit commands sent per simulated hour of noisy household load"""
+    bench = Bench()
+    for _ in range(hours * TICKS_PER_HOUR):
+        bench.advance()
+        await bench.tick()
+
+    return {
+        "hours": hours,
+        "limit_commands_per_hour": bench.limit_commands / hours,
+    }
+
+
+async def bench_slow_service(ticks: int, latency: float = 0.5) -> dict:
+    """Tick latency while every limit command takes `latency` seconds"""
+    bench = Bench()
+    bench.hass.services.latency = latency
+    charger = bench.controllers[0].charger
+    durations = []
+    for _ in range(ticks):
+        bench.advance()
+        start = time.perf_counter()
+        await bench.tick()
+        durations.append((time.perf_counter() - start) * 1e6)
+
+    while charger.command_dispatcher.busy:
+        await asyncio.sleep(latency)
+
+    return {
+        "unit": "us",
+        "service_latency_sec": latency,
+        "ticks": ticks,
+        "limit_commands": bench.limit_commands,
+        "replaced": charger.command_dispatcher.replaced,
+        **_percentiles(durations),
+    }
+
+
+async def bench_sampling(hours: int) -> dict:
+    """Samples, commands and overload per hour, fixed poll against adaptive
+
+    Each hour the car charges for 40 minutes and is done for 20. Time moves
+    in 1 s steps with the mains meter publishing every second, the
+    household load moves every sample interval as in the other benchmarks.
+    """
+    results = {}
+    for mode in (SAMPLING_MODE_POLL, SAMPLING_MODE_ADAPTIVE):
+        bench = Bench(sampling_mode=mode)
+        site = bench.sites[0]
+        balancer = bench.hass.data["generic_charge_controller"]["balancers"]
+        balancer = next(iter(balancer.values()))
+        overload_seconds = 0
+        intervals = []
+        for second in range(hours * 3600):
+            status = EA_CHARGING if second % 3600 < 2400 else EA_COMPLETED
+            for sim in site.chargers:
+                sim.status = status
+
+            bench.hass.clock.advance(1)
+            if second % DEFAULT_SAMPLE_INTERVAL_SEC == 0:
+                site.step()
+            else:
+                site.publish()
+            await bench.tick()
+
+            if max(site.mains_currents().values()) > FUSE_CURRENT:
+                overload_seconds += 1
+            if balancer.sample_interval is not None:
+                intervals.append(balancer.sample_interval)
+
+        results[mode] = {
+            "samples_per_hour": balancer.metrics.ticks / hours,
+            "limit_commands_per_hour": bench.limit_commands / hours,
+            "overload_seconds_per_hour": overload_seconds / hours,
+            "mean_interval_sec": statistics.fmean(intervals) if intervals else 0.0,
+        }
+
+    return results
+
+
+async def bench_phase_switching(hours: int) -> dict:
+    """Charge delivered per hour with a heavy single phase load on P2
+
+    The load leaves less than the EV minimum on P2 much of the time, so a
+    three phase charge pauses where a single phase one could go on.
+    """
+    results = {}
+    for switching in (False, True):
+        bench = Bench(phase_switching=switching, offsets={"P2": 12.0})
+        site = bench.sites[0]
+        delivered = 0.0
+        for _ in range(hours * TICKS_PER_HOUR):
+            bench.advance()
+            await bench.tick()
+            delivered += sum(
+                sim.draw(phase) for sim in site.chargers for phase in sim.limits
+            )
+
+        results["switching" if switching else "three_phase"] = {
+            "amp_hours_per_hour": delivered / TICKS_PER_HOUR / hours,
+            "limit_commands_per_hour": bench.limit_commands / hours,
+        }
+
+    return results
+
+
+async def bench_actuation(hours: int) -> dict:
+    """Commands and unapplied limits with a charger that is slow and lossy
+
+    Limits land two samples late and one command in ten is lost. Counts
+    the seconds per hour the charger runs above the last limit sent,
+    with and without following the commands until they are applied.
+    """
+    results = {}
+    for ack_timeout in (0, DEFAULT_ACK_TIMEOUT_SEC):
+        bench = Bench(ack_timeout=ack_timeout)
+        sim = bench.sites[0].chargers[0]
+        sim.apply_delay = 2
+        sim.drop_rate = 0.1
+        charger = bench.controllers[0].charger
+        above_seconds = 0
+        for _ in range(hours * TICKS_PER_HOUR):
+            bench.advance()
+            await bench.tick()
+            sent = charger.command_policy.last_limits
+            if any(sim.limits[phase] > limit for phase, limit in sent.items()):
+                above_seconds += DEFAULT_SAMPLE_INTERVAL_SEC
+
+        tracker = charger.actuation
+        results["tracked" if ack_timeout else "fire_and_forget"] = {
+            "limit_commands_per_hour": bench.limit_commands / hours,
+            "dropped_per_hour": sim.dropped / hours,
+            "above_limit_seconds_per_hour": above_seconds / hours,
+            "reissued_per_hour": tracker.reissued / hours if tracker else 0,
+            "actuation_latency_ms": tracker.latency.mean if tracker else None,
+        }
+
+    return results
+
+
+def bench_filters(hours: int) -> dict:
+    """Backtest of every load filter strategy on the simulated house load
+
+    The charger is left out of the mains, so the filters see the same
+    series and only differ in how they follow it.
+    """
+    house = HouseLoad(seed=1)
+    series = [
+        (float(tick * DEFAULT_SAMPLE_INTERVAL_SEC), list(house.step().values()))
+        for tick in range(hours * TICKS_PER_HOUR)
+    ]
+    results = {
+        strategy: backtest(series, FUSE_CURRENT, strategy)
+        for strategy in FILTER_STRATEGIES
+    }
+
+    # a meter that now and then reports 0 A or a spike for one sample
+    glitches = random.Random(2)
+    glitchy = [
+        (
+            timestamp,
+            [
+                (
+                    glitches.choice((0.0, value + GLITCH_SPIKE_AMPS))
+                    if glitches.random() < GLITCH_RATE
+                    else value
+                )
+                for value in load
+            ],
+        )
+        for timestamp, load in series
+    ]
+    for strategy in FILTER_STRATEGIES:
+        results[f"{strategy}_glitchy"] = backtest(
+            glitchy, FUSE_CURRENT, strategy, spike_threshold=GLITCH_SPIKE_AMPS / 2
+        )
+    return results
+
+
+async def run(quick: bool) -> dict:
+    scale = 10 if quick else 1
+    return {
+        "tick_latency": await bench_tick_latency(2000 // scale),
+        "throughput": await bench_throughput(200 // scale),
+        "allocations": await bench_allocations(200 // scale),
+        "service_calls": await bench_service_calls(1 if quick else 4),
+        "slow_service": await bench_slow_service(20 if quick else 100),
+        "sampling": await bench_sampling(1 if quick else 4),
+        "phase_switching": await bench_phase_switching(1 if quick else 4),
+        "actuation": await bench_actuation(1 if quick else 4),
+        "filters": bench_filters(1 if quick else 24),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print the relative change of every metric between two result files"""
+    old = _flatten(json.loads(pathlib.Path(old_path).read_text())["results"])
+    new = _flatten(json.loads(pathlib.Path(new_path).read_text())["results"])
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:<55} {old[key]:>14.2f} {new[key]:>14.2f} {change:>+8.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(args.quick))
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    pathlib.Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Microbenchmark: per-sample cost of the phase mean filter
+
+Compares the running sums of PhaseSampleMatrix against the previous
+implementation, which ran numpy.insert + numpy.cumsum over the whole
+60 sample phase buffer on every tick, then the rolling median against
+numpy.median over the window.
+
+    python benchmarks/bench_filter.py
+"""
+
+import collections
+import pathlib
+import sys
+import timeit
+
+import numpy
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from custom_components.generic_charge_controller.loadbalancer.filters import (  # noqa: E402
+    OrderStatisticLoadFilter,
+)
+from custom_components.generic_charge_controller.loadbalancer.samples import (  # noqa: E402
+    NOMINAL_SAMPLE_INTERVAL_SEC,
+    PhaseSampleMatrix,
+)
+
+BUFFER_SIZE = 60
+SAMPLES = 20_000
+WINDOW_SIZES = (6, 12, 60)
+MEDIAN_WINDOW_SIZES = (6, 12, 60, 240)
+
+
+def _legacy_running_mean(samples, window_size) -> float:
+    valid_window = min(window_size, len(samples))
+    if not valid_window:
+        return 0
+
+    cumsum = numpy.cumsum(numpy.insert(samples, 0, 0))
+    return ((cumsum[valid_window:] - cumsum[:-valid_window]) / float(valid_window))[-1]
+
+
+def _measurements():
+    return [10.0 + (i % 17) * 0.37 for i in range(SAMPLES)]
+
+
+def bench_legacy(window_size: int) -> float:
+    """Seconds per sample for the numpy cumsum mean"""
+    data = _measurements()
+
+    def run():
+        samples = collections.deque([], BUFFER_SIZE)
+        for value in data:
+            samples.append(value)
+            _legacy_running_mean(samples, window_size)
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / SAMPLES
+
+
+def bench_streaming(window_size: int) -> float:
+    """Seconds per sample for the O(1) running mean"""
+    data = _measurements()
+
+    def run():
+        matrix = PhaseSampleMatrix(1, window_size, BUFFER_SIZE)
+        for i, value in enumerate(data):
+            matrix.push(0, value, i * NOMINAL_SAMPLE_INTERVAL_SEC)
+            matrix.mean(0)
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / SAMPLES
+
+
+def bench_numpy_median(window_size: int) -> float:
+    """Seconds per sample for numpy.median over the window"""
+    data = _measurements()
+
+    def run():
+        samples = collections.deque([], window_size)
+        for value in data:
+            samples.append(value)
+            numpy.median(samples)
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / SAMPLES
+
+
+def bench_rolling_median(window_size: int) -> float:
+    """Seconds per sample for the sorted window median"""
+    data = _measurements()
+
+    def run():
+        median = OrderStatisticLoadFilter(PhaseSampleMatrix(1, window_size), 0.5)
+        for i, value in enumerate(data):
+            median.observe(0, value, i * NOMINAL_SAMPLE_INTERVAL_SEC)
+            median.estimate()
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / SAMPLES
+
+
+def main() -> None:
+    print(f"{'window':>8} {'legacy ns':>12} {'streaming ns':>14} {'speedup':>9}")
+    for window_size in WINDOW_SIZES:
+        legacy = bench_legacy(window_size)
+        streaming = bench_streaming(window_size)
+        print(
+            f"{window_size:>8} {legacy * 1e9:>12.0f} {streaming * 1e9:>14.0f}"
+            f" {legacy / streaming:>8.1f}x"
+        )
+
+    print(f"\n{'window':>8} {'numpy ns':>12} {'rolling ns':>14} {'speedup':>9}")
+    for window_size in MEDIAN_WINDOW_SIZES:
+        numpy_median = bench_numpy_median(window_size)
+        rolling = bench_rolling_median(window_size)
+        print(
+            f"{window_size:>8} {numpy_median * 1e9:>12.0f} {rolling * 1e9:>14.0f}"
+            f" {numpy_median / rolling:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Ingestion benchmark: mains readings as sensor states or read directly
+
+Read path: cost of one meter reading reaching its phase buffer, as a
+sensor state (State object, state change event, parsing) and as a
+direct MQTT payload, plain or JSON with every phase in one message. The
+state path leaves out the recorder, so its cost is a lower bound.
+
+Modbus: a direct source per phase polls the simulated Modbus-TCP meter
+over localhost every 100 ms. Reports readings per second while the
+meter is up, requests per poll, the spread of the intervals, and how
+long readings take to return after the meter drops its connections for
+half a second.
+
+Control: the balancer in adaptive mode with the mains as sensor states
+updated every 10 s, as by a polling integration, against the meter
+read over MQTT every second. Overload time and mains states written.
+
+    python benchmarks/bench_ingest.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import pathlib
+import random
+import statistics
+import sys
+import time
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_control_loop import FUSE_CURRENT, Bench  # noqa: E402
+from fake_hass import FakeHass, patch_integration  # noqa: E402
+from sim import PHASES, SimulatedModbusMeter  # noqa: E402
+
+from custom_components.generic_charge_controller.const import (  # noqa: E402
+    SAMPLING_MODE_ADAPTIVE,
+)
+from custom_components.generic_charge_controller.loadbalancer import (  # noqa: E402
+    direct,
+)
+from custom_components.generic_charge_controller.loadbalancer.core import (  # noqa: E402
+    DEFAULT_SAMPLE_INTERVAL_SEC,
+)
+from custom_components.generic_charge_controller.loadbalancer.registry import (  # noqa: E402
+    async_get_sensor_registry,
+)
+from custom_components.generic_charge_controller.loadbalancer.samples import (  # noqa: E402
+    PhaseSampleMatrix,
+)
+
+READINGS = 30_000
+MODBUS_SECONDS = 4.0
+MODBUS_INTERVAL_SEC = 0.1
+OUTAGE_SEC = 0.5
+SENSOR_EVERY_SEC = 10
+
+
+def _buffer(matrix: PhaseSampleMatrix, row: int):
+    def push(reading) -> None:
+        if reading is not None:
+            matrix.push(row, reading.value, reading.reported)
+
+    return push
+
+
+async def bench_read_path(readings: int = READINGS) -> dict:
+    """Microseconds per reading from the meter to the phase buffer"""
+    hass = FakeHass()
+    patch_integration(hass)
+    registry = async_get_sensor_registry(hass)
+    rng = random.Random(0)
+    values = [round(rng.uniform(0, 25), 2) for _ in range(readings)]
+
+    def subscribe(sources: list[str]) -> None:
+        matrix = PhaseSampleMatrix(len(sources), 6)
+        for row, source in enumerate(sources):
+            registry.async_acquire(source).async_add_listener(_buffer(matrix, row))
+
+    subscribe(["sensor.mains_p1"])
+    subscribe(["mqtt:meter/p1"])
+    subscribe([f"mqtt:meter/SENSOR#ENERGY.Current.{i}" for i in range(3)])
+    await asyncio.sleep(0)  # let the subscriptions go through
+
+    plain = [b"%.2f" % value for value in values]
+    documents = [
+        json.dumps({"ENERGY": {"Current": values[i : i + 3]}}).encode()
+        for i in range(0, readings, 3)
+    ]
+
+    def sensor() -> None:
+        for value in values:
+            hass.clock.advance(1)
+            hass.states.async_set("sensor.mains_p1", value)
+
+    def mqtt_plain() -> None:
+        for payload in plain:
+            hass.clock.advance(1)
+            hass.mqtt.publish("meter/p1", payload)
+
+    def mqtt_json() -> None:
+        for payload in documents:
+            hass.clock.advance(1)
+            hass.mqtt.publish("meter/SENSOR", payload)
+
+    results = {}
+    for name, run, per_run in (
+        ("sensor_state", sensor, readings),
+        ("mqtt_plain", mqtt_plain, readings),
+        ("mqtt_json_3_phases", mqtt_json, len(documents) * 3),
+    ):
+        start = time.perf_counter()
+        run()
+        results[name] = {
+            "us_per_reading": (time.perf_counter() - start) * 1e6 / per_run
+        }
+    return results
+
+
+async def bench_modbus(seconds: float = MODBUS_SECONDS) -> dict:
+    """Readings from the simulated Modbus meter, through a short outage"""
+    # a real socket, so the real clock, and a quick retry for the outage
+    direct.time = time
+    direct.RECONNECT_DELAY_SEC = 0.1
+
+    meter = SimulatedModbusMeter()
+    await meter.start()
+    registry = async_get_sensor_registry(FakeHass())
+    received: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    lost = []
+
+    for phase in PHASES:
+        meter.currents[phase] = 10.0
+
+        def listener(reading, phase=phase) -> None:
+            if reading is None:
+                lost.append(time.monotonic())
+            else:
+                received[phase].append(time.monotonic())
+
+        stream = registry.async_acquire(meter.source(phase, MODBUS_INTERVAL_SEC))
+        stream.async_add_listener(listener)
+
+    await asyncio.sleep(seconds / 2)
+    stopped = time.monotonic()
+    await meter.stop()
+    await asyncio.sleep(OUTAGE_SEC)
+    await meter.start()
+    restarted = time.monotonic()
+    await asyncio.sleep(seconds / 2)
+
+    (modbus,) = registry.meters.meters.values()
+    diagnostics = modbus.as_dict()
+    for stream in list(registry.streams.values()):
+        registry.async_release(stream)
+    await meter.stop()
+
+    times = received["P1"]
+    intervals = [
+        (b - a) * 1000
+        for a, b in zip(times, times[1:])
+        if not a < stopped < b  # leave the outage out
+    ]
+    back = next(t for t in times if t > restarted)
+    return {
+        "readings_per_sec_per_phase": statistics.fmean(
+            len(t) for t in received.values()
+        )
+        / seconds,
+        "requests_per_poll": meter.requests / diagnostics["polls"],
+        "interval_ms_p50": statistics.median(intervals),
+        "interval_ms_max": max(intervals),
+        "outage_detected_ms": (lost[0] - stopped) * 1000 if lost else None,
+        "back_after_restart_ms": (back - restarted) * 1000,
+        "errors": diagnostics["errors"],
+    }
+
+
+async def bench_control(hours: int) -> dict:
+    """Overload and mains states written per hour, sensor against direct"""
+    results = {}
+    for name, options in (
+        (f"sensor_{SENSOR_EVERY_SEC}s", {"meter_every": SENSOR_EVERY_SEC}),
+        ("mqtt_1s", {"direct": True}),
+    ):
+        bench = Bench(sampling_mode=SAMPLING_MODE_ADAPTIVE, **options)
+        await asyncio.sleep(0)  # let the MQTT subscriptions go through
+        site = bench.sites[0]
+        overload_seconds = 0
+        for second in range(hours * 3600):
+            bench.hass.clock.advance(1)
+            if second % DEFAULT_SAMPLE_INTERVAL_SEC == 0:
+                site.step()
+            else:
+                site.publish()
+            await bench.tick()
+            if max(site.mains_currents().values()) > FUSE_CURRENT:
+                overload_seconds += 1
+
+        results[name] = {
+            "overload_seconds_per_hour": overload_seconds / hours,
+            "limit_commands_per_hour": bench.limit_commands / hours,
+            "mains_states_per_hour": (
+                0 if site.direct else site.meter_messages / hours
+            ),
+            "meter_messages_per_hour": site.meter_messages / hours,
+        }
+    return results
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'read path':<20} {'us/reading':>10}")
+    for name, result in asyncio.run(bench_read_path()).items():
+        print(f"{name:<20} {result['us_per_reading']:>10.2f}")
+
+    print("\nModbus-TCP at 10 Hz")
+    for name, value in asyncio.run(bench_modbus()).items():
+        print(f"  {name:<28} {value if value is None else round(value, 2)}")
+
+    print(
+        f"\n{'mains':<12} {'overload s/h':>12} {'commands/h':>10}"
+        f" {'states/h':>9} {'messages/h':>10}"
+    )
+    for name, result in asyncio.run(bench_control(2)).items():
+        print(
+            f"{name:<12} {result['overload_seconds_per_hour']:>12.1f}"
+            f" {result['limit_commands_per_hour']:>10.1f}"
+            f" {result['mains_states_per_hour']:>9.0f}"
+            f" {result['meter_messages_per_hour']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
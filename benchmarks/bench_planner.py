@@ -0,0 +1,290 @@
+"""Charge planner benchmark: incremental replanning and what it saves
+
+Replanning: a plan over two days of quarter hour prices is kept up to
+date through revised prices, tomorrow's prices arriving, and the minute
+by minute advance of the plan. The incremental planner is compared with
+building the plan from scratch on every change, counting microseconds
+and the price slots whose energy is summed per change.
+
+Charging: a car plugged in at 17:00 needs 30 kWh by 07:00 behind a 20 A
+fuse. A water heater runs in the cheap night hours and leaves less than
+the minimum charge current then. Charging at once is compared with the
+plan, the plan both with and without the headroom predicted from two
+weeks of load history. Reports price paid and energy short at 07:00.
+
+    python benchmarks/bench_planner.py
+"""
+
+from __future__ import annotations
+
+import math
+import pathlib
+import random
+import sys
+import time
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_hass import FakeHass, patch_integration  # noqa: E402
+from sim import PHASES  # noqa: E402
+
+from custom_components.generic_charge_controller.const import (  # noqa: E402
+    SAMPLING_MODE_POLL,
+)
+from custom_components.generic_charge_controller.loadbalancer.allocation import (  # noqa: E402
+    MIN_CHARGE_CURRENT,
+)
+from custom_components.generic_charge_controller.loadbalancer.core import (  # noqa: E402
+    async_get_balancer,
+)
+from custom_components.generic_charge_controller.loadbalancer.forecast import (  # noqa: E402
+    FORECAST_BUCKET_SEC,
+)
+from custom_components.generic_charge_controller.loadbalancer.planner import (  # noqa: E402
+    NOMINAL_VOLTAGE,
+    ChargePlanner,
+    PriceSlot,
+)
+
+DAY = 24 * 3600
+HOUR = 3600
+START = 1704067200.0  # 2024-01-01 00:00 UTC, the fake hass runs in UTC
+FUSE_CURRENT = 20
+CHARGER_CURRENT = 16
+TARGET_KWH = 30.0
+PLUG_IN_HOUR = 17
+READY_BY_HOUR = 7
+HISTORY_DAYS = 14
+REVISIONS = 2_000
+DAYS = 30
+
+
+def price_at(hour: float, rng: random.Random) -> float:
+    """Spot price in cents, cheap at night and dear in the evening"""
+    price = 30.0
+    if 17 <= hour < 21:
+        price += 25
+    elif 7 <= hour < 9:
+        price += 12
+    elif hour < 5:
+        price -= 18
+    return round(max(1.0, price + rng.gauss(0, 4)), 2)
+
+
+def prices(day: int, rng: random.Random) -> list[PriceSlot]:
+    """The quarter hour prices of one day"""
+    first = START + day * DAY
+    return [
+        PriceSlot(
+            first + i * FORECAST_BUCKET_SEC,
+            first + (i + 1) * FORECAST_BUCKET_SEC,
+            price_at(i / 4, rng),
+        )
+        for i in range(DAY // FORECAST_BUCKET_SEC)
+    ]
+
+
+def house_load(timestamp: float, rng: random.Random) -> float:
+    """Household current on every phase"""
+    hour = (timestamp % DAY) / HOUR
+    load = 4.0
+    if 1 <= hour < 4:
+        load += 11  # water heater on the night tariff
+    elif 17 <= hour < 21:
+        load += 6
+    elif 6 <= hour < 8:
+        load += 3
+    return max(0.0, load + rng.gauss(0, 0.7))
+
+
+def trained_balancer():
+    """Balancer of the 20 A fuse with two weeks of load history"""
+    hass = FakeHass()
+    patch_integration(hass)
+    balancer = async_get_balancer(
+        hass,
+        {phase: f"sensor.mains_{phase}" for phase in PHASES},
+        FUSE_CURRENT,
+        6,
+        SAMPLING_MODE_POLL,
+    )
+    rng = random.Random(1)
+    for minute in range(HISTORY_DAYS * DAY // 60):
+        timestamp = START - HISTORY_DAYS * DAY + minute * 60
+        load = house_load(timestamp, rng)
+        balancer.forecast.observe([load] * len(PHASES), timestamp)
+    return balancer
+
+
+def new_planner(balancer, headroom: bool = True) -> ChargePlanner:
+    def predicted(start, end):
+        return balancer.predicted_headroom(start, end, PHASES)
+
+    return ChargePlanner(
+        len(PHASES), CHARGER_CURRENT, None, predicted if headroom else None
+    )
+
+
+def rebuilt(balancer, slots, energy, deadline, now) -> ChargePlanner:
+    """The plan built from scratch"""
+    planner = new_planner(balancer)
+    planner.update_prices(slots, now)
+    planner.set_target(energy, deadline)
+    planner.limit(now)
+    return planner
+
+
+def bench_revisions(balancer) -> dict:
+    """Revised prices of single slots over a two day plan"""
+    rng = random.Random(2)
+    slots = prices(0, rng) + prices(1, rng)
+    now = START
+    deadline = START + 2 * DAY
+    revisions = [
+        (i, slots[i]._replace(price=round(slots[i].price + rng.gauss(0, 5), 2)))
+        for i in (rng.randrange(len(slots)) for _ in range(REVISIONS))
+    ]
+
+    planner = rebuilt(balancer, slots, 40.0, deadline, now)
+    summed = planner.replanned
+    start = time.perf_counter()
+    for _, slot in revisions:
+        planner.update_prices([slot], now)
+        planner.limit(now)
+    incremental = time.perf_counter() - start
+    summed = planner.replanned - summed
+
+    current = list(slots)
+    full_summed = 0
+    start = time.perf_counter()
+    for i, slot in revisions:
+        current[i] = slot
+        full_summed += rebuilt(balancer, current, 40.0, deadline, now).replanned
+    full = time.perf_counter() - start
+
+    return {
+        "incremental_us": incremental * 1e6 / REVISIONS,
+        "full_us": full * 1e6 / REVISIONS,
+        "incremental_slots": summed / REVISIONS,
+        "full_slots": full_summed / REVISIONS,
+    }
+
+
+def bench_tomorrow(balancer) -> dict:
+    """Tomorrow's prices arriving at 13:00 with today's plan in place"""
+    results = {"incremental_us": 0.0, "full_us": 0.0}
+    results.update(incremental_slots=0, full_slots=0)
+    for day in range(DAYS):
+        rng = random.Random(day)
+        today, tomorrow = prices(0, rng), prices(1, rng)
+        now = START + 13 * HOUR
+        deadline = START + DAY + READY_BY_HOUR * HOUR
+
+        planner = rebuilt(balancer, today, TARGET_KWH, deadline, now)
+        summed = planner.replanned
+        start = time.perf_counter()
+        planner.update_prices(tomorrow, now)
+        planner.limit(now)
+        results["incremental_us"] += (time.perf_counter() - start) * 1e6
+        results["incremental_slots"] += planner.replanned - summed
+
+        start = time.perf_counter()
+        full = rebuilt(balancer, today + tomorrow, TARGET_KWH, deadline, now)
+        results["full_us"] += (time.perf_counter() - start) * 1e6
+        results["full_slots"] += full.replanned
+
+    return {name: value / DAYS for name, value in results.items()}
+
+
+def charge(balancer, day: int, mode: str) -> dict:
+    """One night of charging, `mode` immediate, planned or planned_blind"""
+    rng = random.Random(day)
+    slots = prices(0, rng) + prices(1, rng)
+    price_of = {slot.start: slot.price for slot in slots}
+    plug_in = START + PLUG_IN_HOUR * HOUR
+    deadline = START + DAY + READY_BY_HOUR * HOUR
+
+    planner = None
+    if mode != "immediate":
+        planner = new_planner(balancer, headroom=mode == "planned")
+        planner.update_prices(slots, plug_in)
+        planner.set_target(TARGET_KWH, deadline)
+
+    load_rng = random.Random(1000 + day)
+    delivered = cost = 0.0
+    started = False
+    starts = 0
+    advance_us = 0.0
+    minutes = int((deadline - plug_in) // 60)
+    for minute in range(minutes):
+        now = plug_in + minute * 60
+        live = FUSE_CURRENT - math.trunc(house_load(now, load_rng)) - 1
+        amps = min(CHARGER_CURRENT, live)
+        if planner:
+            start = time.perf_counter()
+            planner.advance(now)
+            amps = min(amps, planner.limit(now) or 0)
+            advance_us += (time.perf_counter() - start) * 1e6
+        elif delivered >= TARGET_KWH:
+            amps = 0
+        if amps < MIN_CHARGE_CURRENT:
+            amps = 0
+
+        energy = amps * len(PHASES) * NOMINAL_VOLTAGE / 1000 / 60
+        if planner:
+            planner.consume(energy)
+        delivered += energy
+        cost += energy * price_of[now - now % FORECAST_BUCKET_SEC]
+        if amps and not started:
+            starts += 1
+        started = bool(amps)
+
+    return {
+        "cents_per_kwh": cost / delivered if delivered else 0.0,
+        "short_kwh": max(0.0, TARGET_KWH - delivered),
+        "starts": starts,
+        "advance_us": advance_us / minutes,
+    }
+
+
+def bench_charging(balancer) -> dict:
+    results = {}
+    for mode in ("immediate", "planned_blind", "planned"):
+        runs = [charge(balancer, day, mode) for day in range(DAYS)]
+        results[mode] = {
+            name: sum(run[name] for run in runs) / DAYS for name in runs[0]
+        }
+    return results
+
+
+def main() -> None:
+    balancer = trained_balancer()
+
+    print(
+        f"{'replanning':<18} {'full us':>9} {'incr. us':>9}"
+        f" {'full slots':>10} {'incr. slots':>11}"
+    )
+    for name, result in (
+        ("price revision", bench_revisions(balancer)),
+        ("tomorrow arrives", bench_tomorrow(balancer)),
+    ):
+        print(
+            f"{name:<18} {result['full_us']:>9.1f} {result['incremental_us']:>9.1f}"
+            f" {result['full_slots']:>10.1f} {result['incremental_slots']:>11.1f}"
+        )
+
+    print(
+        f"\n{'charging':<14} {'c/kWh':>7} {'short kWh':>9}"
+        f" {'starts':>6} {'us/minute':>9}"
+    )
+    for name, result in bench_charging(balancer).items():
+        print(
+            f"{name:<14} {result['cents_per_kwh']:>7.2f} {result['short_kwh']:>9.2f}"
+            f" {result['starts']:>6.1f} {result['advance_us']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Startup benchmark: what the integration adds to Home Assistant boot
+
+Import: each module is imported in a fresh interpreter after the Home
+Assistant modules it needs, so only the integration's own import time
+is counted, and whether numpy came with it.
+
+Setup: config entries are set up through the real sensor platform on
+the fake hass before the Easee integration has added its entities, as
+at boot, then the Easee entities appear and the chargers get ready.
+
+    python benchmarks/bench_startup.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+import time
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_hass import FakeHass, FakeStore, patch_integration  # noqa: E402
+from sim import SimulatedEasee  # noqa: E402
+
+from custom_components.generic_charge_controller import sensor  # noqa: E402
+from custom_components.generic_charge_controller.const import (  # noqa: E402
+    CONF_CHRG_DOMAIN,
+    CONF_CHRG_ID,
+    CONF_ENTITYID_CURR_P1,
+    CONF_RATED_CURRENT,
+    DATA_STORE,
+    DOMAIN,
+)
+from homeassistant.helpers.entity_registry import (  # noqa: E402
+    EVENT_ENTITY_REGISTRY_UPDATED,
+)
+
+PACKAGE = "custom_components.generic_charge_controller"
+MODULES = ("", ".config_flow", ".sensor", ".diagnostics")
+# Home Assistant modules the integration imports, loaded before timing
+HA_MODULES = (
+    "homeassistant.components.sensor",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.debounce",
+    "homeassistant.helpers.event",
+    "homeassistant.helpers.storage",
+)
+ENTRY_COUNTS = (1, 10, 50)
+
+IMPORT_PROBE = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+for module in {ha_modules!r}:
+    importlib.import_module(module)
+numpy_before = "numpy" in sys.modules
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps({{
+    "ms": (time.perf_counter() - start) * 1000,
+    "numpy": not numpy_before and "numpy" in sys.modules,
+}}))
+"""
+
+
+def bench_import(module: str, repeat: int = 3) -> dict:
+    """Own import time of a module, best of `repeat` fresh interpreters"""
+    code = IMPORT_PROBE.format(
+        root=str(BENCH_DIR.parent), ha_modules=HA_MODULES, module=module
+    )
+    runs = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True, check=True
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return {"ms": min(run["ms"] for run in runs), "numpy": runs[0]["numpy"]}
+
+
+class _Entry:
+    def __init__(self, index: int) -> None:
+        self.entry_id = f"entry{index}"
+        self.unique_id = f"ev{index}"
+        self.data = {
+            CONF_ENTITYID_CURR_P1: f"sensor.mains_{index % 4}_p1",
+            CONF_RATED_CURRENT: 25,
+            CONF_CHRG_ID: f"device_ev{index}",
+            CONF_CHRG_DOMAIN: "easee",
+        }
+
+
+async def bench_setup(entries: int) -> dict:
+    """Setup time per entry with the Easee entities missing, then readiness"""
+    hass = FakeHass()
+    patch_integration(hass)
+    hass.data[DOMAIN] = {DATA_STORE: FakeStore()}
+
+    controllers = []
+
+    def add_entities(entities) -> None:
+        controllers.append(entities[0])
+
+    start = time.perf_counter()
+    for i in range(entries):
+        await sensor.async_setup_entry(hass, _Entry(i), add_entities)
+    for controller in controllers:
+        controller.async_write_ha_state = lambda: None
+        await controller.async_added_to_hass()
+    setup = time.perf_counter() - start
+    lookups = hass.entity_registry.lookups
+
+    # the Easee integration comes up and adds its entities
+    for controller in controllers:
+        SimulatedEasee(hass, controller.unique_id)
+    start = time.perf_counter()
+    hass.bus.async_fire(EVENT_ENTITY_REGISTRY_UPDATED, {"action": "create"})
+    ready = time.perf_counter() - start
+
+    return {
+        "entries": entries,
+        "setup_ms_per_entry": setup * 1000 / entries,
+        "registry_lookups_before_ready": lookups,
+        "ready_ms": ready * 1000,
+        "ready": sum(controller.available for controller in controllers),
+    }
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'module':<52} {'import ms':>10} {'numpy':>6}")
+    for module in MODULES:
+        result = bench_import(PACKAGE + module)
+        print(
+            f"{PACKAGE + module:<52} {result['ms']:>10.1f}"
+            f" {'yes' if result['numpy'] else 'no':>6}"
+        )
+
+    print(
+        f"\n{'entries':>7} {'setup ms/entry':>15} {'lookups':>8}"
+        f" {'ready ms':>9} {'ready':>6}"
+    )
+    for entries in ENTRY_COUNTS:
+        result = asyncio.run(bench_setup(entries))
+        print(
+            f"{result['entries']:>7} {result['setup_ms_per_entry']:>15.3f}"
+            f" {result['registry_lookups_before_ready']:>8}"
+            f" {result['ready_ms']:>9.2f} {result['ready']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
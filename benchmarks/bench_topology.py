@@ -0,0 +1,100 @@
+"""Microbenchmark: cost of a meter update in the fuse tree
+
+A site is a tree of circuits with `branching` sub-panels per panel.
+Every update changes the slack of one random circuit, then the headroom
+of one charger circuit is looked up, as a balancer tick does. The
+incremental Circuit walks one path; the baseline re-solves the headroom
+of every circuit top down, as a whole-tree solver would.
+
+    python benchmarks/bench_topology.py
+"""
+
+import pathlib
+import random
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from custom_components.generic_charge_controller.loadbalancer.topology import (  # noqa: E402
+    Circuit,
+)
+
+PHASES = ("P1", "P2", "P3")
+UPDATES = 5_000
+# (branching, depth): wider trees at the same depth, then deeper ones
+SHAPES = ((2, 3), (4, 3), (8, 3), (2, 6), (2, 9))
+
+
+def build(branching: int, depth: int) -> list[Circuit]:
+    """Circuits of a full tree, root first"""
+    root = Circuit(("root",))
+    circuits = [root]
+    level = [root]
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(branching):
+                circuit = Circuit((f"{parent.key[0]}.{i}",))
+                circuit.attach(parent)
+                next_level.append(circuit)
+        circuits.extend(next_level)
+        level = next_level
+
+    for circuit in circuits:
+        circuit.update_slack({phase: 40.0 for phase in PHASES})
+    return circuits
+
+
+def _resolve(root: Circuit) -> dict[tuple, dict[str, float]]:
+    headroom = {root.key: dict(root.slack)}
+    stack = [root]
+    while stack:
+        circuit = stack.pop()
+        for child in circuit.children:
+            headroom[child.key] = {
+                phase: min(headroom[circuit.key][phase], child.slack[phase])
+                for phase in PHASES
+            }
+            stack.append(child)
+    return headroom
+
+
+def bench(branching: int, depth: int, incremental: bool) -> float:
+    """Seconds per meter update and headroom lookup"""
+    circuits = build(branching, depth)
+    leaves = [circuit for circuit in circuits if not circuit.children]
+    rng = random.Random(0)
+    updates = [
+        (rng.choice(circuits), rng.uniform(0, 40), rng.choice(leaves))
+        for _ in range(UPDATES)
+    ]
+
+    def run():
+        for circuit, slack, leaf in updates:
+            circuit.update_slack({phase: slack for phase in PHASES})
+            if incremental:
+                leaf.headroom(PHASES)
+            else:
+                _resolve(circuits[0])[leaf.key]
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / UPDATES
+
+
+def main() -> None:
+    print(
+        f"{'branching':>9} {'depth':>5} {'circuits':>8}"
+        f" {'re-solve us':>12} {'path us':>8} {'speedup':>9}"
+    )
+    for branching, depth in SHAPES:
+        size = sum(branching**d for d in range(depth + 1))
+        baseline = bench(branching, depth, False)
+        incremental = bench(branching, depth, True)
+        print(
+            f"{branching:>9} {depth:>5} {size:>8} {baseline * 1e6:>12.1f}"
+            f" {incremental * 1e6:>8.1f} {baseline / incremental:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
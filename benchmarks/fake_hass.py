@@ -0,0 +1,333 @@
+"""Lightweight in-process stand-in for the parts of Home Assistant we use
+
+Covers hass.states, hass.services, hass.bus, hass.data, the entity and
+device registries and an MQTT broker, plus a simulated clock. `patch_integration` points
+the integration modules at these fakes so the control loop can be driven
+tick by tick without a running Home Assistant core.
+
+The real `homeassistant` package still has to be importable, only its
+runtime is replaced.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from homeassistant.core import State
+
+# seconds since boot at the start of the simulation
+MONOTONIC_START = 10_000.0
+
+
+class SimClock:
+    """Simulated wall and monotonic clocks advanced by the benchmark
+
+    The monotonic clock counts from MONOTONIC_START rather than the epoch,
+    so times taken from one clock and compared with the other stand out.
+    """
+
+    def __init__(self, start: datetime | None = None) -> None:
+        self._start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self._now = self._start
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.timestamp()
+
+    def monotonic(self) -> float:
+        return MONOTONIC_START + (self._now - self._start).total_seconds()
+
+    def advance(self, seconds: float) -> None:
+        self._now += timedelta(seconds=seconds)
+
+
+class FakeStates:
+    """hass.states: get/async_set with state change listeners"""
+
+    def __init__(self, clock: SimClock) -> None:
+        self._clock = clock
+        self._states: dict[str, State] = {}
+        self._listeners: dict[str, list[Callable]] = {}
+
+    def get(self, entity_id: str) -> State | None:
+        return self._states.get(entity_id)
+
+    def async_set(
+        self, entity_id: str, state: Any, attributes: dict | None = None
+    ) -> None:
+        old_state = self._states.get(entity_id)
+        new_state = State(
+            entity_id,
+            str(state),
+            attributes or {},
+            last_changed=self._clock.now(),
+            last_updated=self._clock.now(),
+        )
+        self._states[entity_id] = new_state
+
+        event = SimpleNamespace(
+            data={
+                "entity_id": entity_id,
+                "old_state": old_state,
+                "new_state": new_state,
+            }
+        )
+        for listener in list(self._listeners.get(entity_id, ())):
+            listener(event)
+
+    def async_report(self, entity_id: str) -> None:
+        """Report the same value again, the way Home Assistant 2024.4 does
+
+        The state object is kept, only its last_reported moves on.
+        """
+        self._states[entity_id].last_reported = self._clock.now()
+
+    def track(self, entity_ids, action: Callable) -> Callable[[], None]:
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        for entity_id in entity_ids:
+            self._listeners.setdefault(entity_id, []).append(action)
+
+        def unsubscribe() -> None:
+            for entity_id in entity_ids:
+                self._listeners[entity_id].remove(action)
+
+        return unsubscribe
+
+
+class FakeServices:
+    """hass.services: registered handlers plus a call log"""
+
+    def __init__(self) -> None:
+        self._handlers: dict[tuple[str, str], Callable] = {}
+        self.calls: list[tuple[str, str, dict]] = []
+        self.latency = 0.0
+
+    def async_register(self, domain: str, service: str, handler: Callable, *_):
+        self._handlers[(domain, service)] = handler
+
+    def has_service(self, domain: str, service: str) -> bool:
+        return (domain, service) in self._handlers
+
+    async def async_call(
+        self, domain, service, service_data=None, blocking=False, **_kwargs
+    ):
+        self.calls.append((domain, service, service_data or {}))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if handler := self._handlers.get((domain, service)):
+            result = handler(SimpleNamespace(data=service_data or {}))
+            if asyncio.iscoroutine(result):
+                await result
+
+        return True
+
+
+class FakeBus:
+    """hass.bus: fire/listen on plain event types"""
+
+    def __init__(self) -> None:
+        self._listeners: dict[str, list[Callable]] = {}
+
+    def async_listen(self, event_type: str, listener: Callable) -> Callable[[], None]:
+        self._listeners.setdefault(event_type, []).append(listener)
+        return lambda: self._listeners[event_type].remove(listener)
+
+    def async_fire(self, event_type: str, event_data: dict | None = None) -> None:
+        event = SimpleNamespace(event_type=event_type, data=event_data or {})
+        for listener in list(self._listeners.get(event_type, ())):
+            listener(event)
+
+
+class FakeEntityRegistry:
+    """Entity registry lookup by (domain, platform, unique_id)"""
+
+    def __init__(self) -> None:
+        self._entities: dict[tuple[str, str, str], str] = {}
+        self.lookups = 0
+
+    def add(self, domain: str, platform: str, unique_id: str, entity_id: str):
+        self._entities[(domain, platform, unique_id)] = entity_id
+
+    def async_get_entity_id(self, domain, platform, unique_id) -> str | None:
+        self.lookups += 1
+        return self._entities.get((domain, platform, unique_id))
+
+
+class FakeDeviceRegistry:
+    """Device registry lookup by device id"""
+
+    def __init__(self) -> None:
+        self._devices: dict[str, SimpleNamespace] = {}
+
+    def add(self, device_id: str, domain: str, identifier: str):
+        self._devices[device_id] = SimpleNamespace(
+            id=device_id, identifiers={(domain, identifier)}
+        )
+
+    def async_get(self, device_id: str):
+        return self._devices.get(device_id)
+
+
+class FakeStore:
+    """Integration store that keeps nothing"""
+
+    def restore_phases(self, *_args) -> None:
+        pass
+
+    def restore_policy(self, *_args) -> None:
+        pass
+
+    def restore_forecast(self, *_args) -> None:
+        pass
+
+    def restore_plan(self, *_args) -> None:
+        pass
+
+    def async_schedule_save(self) -> None:
+        pass
+
+    def async_save_balancer(self, *_args) -> None:
+        pass
+
+
+class FakeMqtt:
+    """Home Assistant's MQTT integration with an in-process broker
+
+    Messages published go straight to the subscribers of the topic.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, list[Callable]] = {}
+        self.published = 0
+
+    async def async_wait_for_mqtt_client(self, _hass) -> bool:
+        return True
+
+    async def async_subscribe(
+        self, _hass, topic: str, msg_callback: Callable, qos: int = 0, encoding=None
+    ) -> Callable[[], None]:
+        self._subscribers.setdefault(topic, []).append(msg_callback)
+        return lambda: self._subscribers[topic].remove(msg_callback)
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        self.published += 1
+        message = SimpleNamespace(topic=topic, payload=payload)
+        for msg_callback in list(self._subscribers.get(topic, ())):
+            msg_callback(message)
+
+
+async def _run(action: Callable, now: datetime) -> None:
+    """Call a timer action, a coroutine function or a callback"""
+    if asyncio.iscoroutine(result := action(now)):
+        await result
+
+
+class FakeHass:
+    """The hass object handed to the integration"""
+
+    def __init__(self, clock: SimClock | None = None) -> None:
+        self.clock = clock or SimClock()
+        self.data: dict = {}
+        self.states = FakeStates(self.clock)
+        self.services = FakeServices()
+        self.bus = FakeBus()
+        self.entity_registry = FakeEntityRegistry()
+        self.device_registry = FakeDeviceRegistry()
+        self.mqtt = FakeMqtt()
+        self.timers: list[list] = []  # [action, interval, due]
+        self.scheduled: list[list] = []  # [due, action]
+        self.config = SimpleNamespace(path=lambda *parts: "/".join(parts))
+
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+
+    def async_create_task(self, coro, *_args, **_kwargs):
+        return asyncio.get_running_loop().create_task(coro)
+
+    def async_create_background_task(self, coro, name, *_args, **_kwargs):
+        return asyncio.get_running_loop().create_task(coro, name=name)
+
+    def track_time_interval(self, hass, action, interval, *_args, **_kwargs):
+        entry = [action, interval, self.clock.now() + interval]
+        self.timers.append(entry)
+        return lambda: self.timers.remove(entry)
+
+    def call_later(self, hass, delay, action, *_args):
+        entry = [self.clock.now() + timedelta(seconds=delay), action]
+        self.scheduled.append(entry)
+
+        def cancel() -> None:
+            if entry in self.scheduled:
+                self.scheduled.remove(entry)
+
+        return cancel
+
+    async def async_run_due(self) -> None:
+        """Run the timers due at the current simulated time"""
+        now = self.clock.now()
+        for entry in list(self.timers):
+            action, interval, due = entry
+            if due <= now:
+                while entry[2] <= now:
+                    entry[2] += interval
+                await _run(action, now)
+
+        for entry in list(self.scheduled):
+            if entry[0] <= now and entry in self.scheduled:
+                self.scheduled.remove(entry)
+                await _run(entry[1], now)
+
+        # let tasks created by callbacks run
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    def track_state_change_event(self, hass, entity_ids, action, *_args):
+        return self.states.track(entity_ids, action)
+
+
+def patch_integration(hass: FakeHass, patch: Callable = setattr) -> None:
+    """Point the integration modules at the fakes of `hass`
+
+    Every module attribute is set through `patch`, e.g. monkeypatch.setattr
+    to have them restored after a test.
+    """
+    # imported here so the integration is loaded after the caller set sys.path
+    from custom_components.generic_charge_controller import scheduler, sensor
+    from custom_components.generic_charge_controller.easee import charger
+    from custom_components.generic_charge_controller.loadbalancer import (
+        core,
+        direct,
+        registry,
+    )
+
+    sim_time = SimpleNamespace(
+        monotonic=hass.clock.monotonic,
+        time=hass.clock.time,
+        perf_counter=time.perf_counter,
+    )
+
+    patch(charger, "async_get_entity_reg", lambda _hass: hass.entity_registry)
+    patch(charger, "async_track_state_change_event", hass.track_state_change_event)
+    patch(charger, "time", sim_time)
+    patch(core, "async_track_time_interval", hass.track_time_interval)
+    patch(core, "async_call_later", hass.call_later)
+    patch(core, "time", sim_time)
+    patch(registry, "async_track_state_change_event", hass.track_state_change_event)
+    patch(direct, "time", sim_time)
+    patch(direct, "_mqtt_client", lambda: hass.mqtt)
+    patch(scheduler, "async_track_state_change_event", hass.track_state_change_event)
+    patch(scheduler, "async_track_time_interval", hass.track_time_interval)
+    patch(scheduler, "time", sim_time)
+    patch(sensor, "async_call_later", hass.call_later)
+    patch(sensor, "async_get_dev_reg", lambda _hass: hass.device_registry)
+    patch(sensor, "time", sim_time)
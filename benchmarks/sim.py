@@ -0,0 +1,311 @@
+"""Simulated Easee charger, household load and meters for the benchmarks"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import struct
+
+from custom_components.generic_charge_controller.easee.const import (
+    ATTR_ALLOCATED_CURRENT_TMP,
+    ATTR_PHASE_CURRENT_TMP,
+    CHRG_DOMAIN,
+    EA_CHARGING,
+    S_NAME_CIRCUITCURRENT,
+    S_NAME_STATUS,
+    SVC_SET_LIMIT,
+)
+from custom_components.generic_charge_controller.loadbalancer.allocation import (
+    MIN_CHARGE_CURRENT,
+)
+from custom_components.generic_charge_controller.loadbalancer.direct import (
+    MBAP_HEADER,
+)
+
+from fake_hass import FakeHass
+
+PHASES = ("P1", "P2", "P3")
+
+
+class SimulatedEasee:
+    """Charger publishing Easee style entities and obeying dynamic limits
+
+    The car draws the lower of its own maximum and the lowest commanded
+    limit on each of its phases, nothing below MIN_CHARGE_CURRENT. Limits
+    of 0 on P2 and P3 put it on P1 alone, as an Easee in automatic phase
+    mode does. Limit commands land `apply_delay` steps later, on the next
+    `step` by default, and a `drop_rate` share of them never lands. The
+    applied limits are published as the allocated circuit currents.
+    """
+
+    def __init__(
+        self,
+        hass: FakeHass,
+        unique_id: str,
+        rated_current: float = 32,
+        car_max_current: float = 16,
+        status: str = EA_CHARGING,
+        car_phases: int = 3,
+        apply_delay: int = 0,
+        drop_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.hass = hass
+        self.unique_id = unique_id
+        self.device_id = f"device_{unique_id}"
+        self.rated_current = rated_current
+        self.car_max_current = car_max_current
+        self.status = status
+        self.car_phases = car_phases
+        self.limits = dict.fromkeys(PHASES, rated_current)
+        self.commands = 0
+        self.apply_delay = apply_delay
+        self.drop_rate = drop_rate
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._steps = 0
+        self._landing: list[tuple[int, dict]] = []
+
+        self.status_entity = f"sensor.{unique_id}_{S_NAME_STATUS}"
+        self.circuit_entity = f"sensor.{unique_id}_{S_NAME_CIRCUITCURRENT}"
+        for name, entity_id in (
+            (S_NAME_STATUS, self.status_entity),
+            (S_NAME_CIRCUITCURRENT, self.circuit_entity),
+        ):
+            hass.entity_registry.add(
+                "sensor", CHRG_DOMAIN, f"{unique_id}_{name}", entity_id
+            )
+        hass.device_registry.add(self.device_id, CHRG_DOMAIN, unique_id)
+
+        if not hass.services.has_service(CHRG_DOMAIN, SVC_SET_LIMIT):
+            hass.services.async_register(
+                CHRG_DOMAIN, SVC_SET_LIMIT, _dispatch_set_limit(hass)
+            )
+        hass.data.setdefault("sim_chargers", {})[self.device_id] = self
+
+        self.step()
+
+    def draw(self, phase: str) -> float:
+        """Current drawn on a phase right now"""
+        if self.status != EA_CHARGING:
+            return 0.0
+
+        phases = PHASES[: self.car_phases]
+        if not self.limits["P2"] and not self.limits["P3"]:
+            phases = PHASES[:1]
+        if phase not in phases:
+            return 0.0
+
+        limit = min(self.limits[used] for used in phases)
+        if limit < MIN_CHARGE_CURRENT:
+            return 0.0
+        return float(min(self.car_max_current, limit))
+
+    def set_limits(self, data: dict) -> None:
+        self.commands += 1
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            return
+
+        limits = {
+            phase: limit
+            for i, phase in enumerate(PHASES, start=1)
+            if (limit := data.get(f"currentP{i}")) is not None
+        }
+        if self.apply_delay:
+            self._landing.append((self._steps + self.apply_delay, limits))
+        else:
+            self.limits.update(limits)
+
+    def step(self) -> None:
+        """Publish the current status and phase currents"""
+        self._steps += 1
+        while self._landing and self._landing[0][0] <= self._steps:
+            self.limits.update(self._landing.pop(0)[1])
+
+        attributes = {"circuit_ratedCurrent": self.rated_current}
+        for i, phase in enumerate(PHASES, start=1):
+            attributes[ATTR_PHASE_CURRENT_TMP % i] = self.draw(phase)
+            attributes[ATTR_ALLOCATED_CURRENT_TMP % i] = min(
+                self.limits[phase], self.rated_current
+            )
+
+        self.hass.states.async_set(self.status_entity, self.status)
+        self.hass.states.async_set(self.circuit_entity, self.draw("P1"), attributes)
+
+
+def _dispatch_set_limit(hass: FakeHass):
+    def handle(call) -> None:
+        hass.data["sim_chargers"][call.data["device_id"]].set_limits(call.data)
+
+    return handle
+
+
+class HouseLoad:
+    """Random walk household load with occasional large appliance spikes"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        base: float = 6.0,
+        noise: float = 0.8,
+        offsets: dict[str, float] | None = None,
+    ):
+        self._random = random.Random(seed)
+        self._offsets = offsets or {}
+        self._base = base
+        self._noise = noise
+        self._load = dict.fromkeys(PHASES, base)
+        self._spike_ticks = 0
+
+    def step(self) -> dict[str, float]:
+        if not self._spike_ticks and self._random.random() < 0.01:
+            self._spike_ticks = self._random.randint(2, 60)
+
+        spike = 0.0
+        if self._spike_ticks:
+            self._spike_ticks -= 1
+            spike = 10.0
+
+        for phase in PHASES:
+            walk = self._load[phase] + self._random.gauss(0, self._noise)
+            self._load[phase] = min(max(walk, 0.5), self._base * 3)
+
+        return {
+            phase: load + spike + self._offsets.get(phase, 0.0)
+            for phase, load in self._load.items()
+        }
+
+
+class Site:
+    """One main fuse: mains meter, household load and chargers
+
+    The mains meter publishes sensor states, or with `direct` plain
+    payloads on an MQTT topic per phase. It publishes on every
+    `meter_every`-th call of `publish`.
+    """
+
+    def __init__(
+        self,
+        hass: FakeHass,
+        name: str,
+        chargers: int,
+        seed: int = 0,
+        offsets: dict[str, float] | None = None,
+        direct: bool = False,
+        meter_every: int = 1,
+    ):
+        self.hass = hass
+        self.direct = direct
+        self.meter_every = meter_every
+        self._publishes = 0
+        self.meter_messages = 0
+        if direct:
+            self.mains = {
+                phase: f"mqtt:{name}/mains/{phase.lower()}" for phase in PHASES
+            }
+        else:
+            self.mains = {
+                phase: f"sensor.{name}_mains_{phase.lower()}" for phase in PHASES
+            }
+        self.load = HouseLoad(seed, offsets=offsets)
+        self.chargers = [SimulatedEasee(hass, f"{name}_ev{i}") for i in range(chargers)]
+        self.house = {}
+        self.step()
+
+    def step(self) -> None:
+        """Advance the household load and publish meter and charger states"""
+        self.house = self.load.step()
+        self.publish()
+
+    def mains_currents(self) -> dict[str, float]:
+        """Total current through the fuse on each phase"""
+        return {
+            phase: self.house[phase] + sum(c.draw(phase) for c in self.chargers)
+            for phase in PHASES
+        }
+
+    def publish(self) -> None:
+        """Publish meter and charger states without moving the load"""
+        for charger in self.chargers:
+            charger.step()
+
+        self._publishes += 1
+        if (self._publishes - 1) % self.meter_every:
+            return
+
+        for phase, total in self.mains_currents().items():
+            self.meter_messages += 1
+            if self.direct:
+                self.hass.mqtt.publish(
+                    self.mains[phase].removeprefix("mqtt:"), b"%.2f" % total
+                )
+            else:
+                self.hass.states.async_set(self.mains[phase], round(total, 2))
+
+
+class SimulatedModbusMeter:
+    """Modbus-TCP meter serving the phase currents on 127.0.0.1
+
+    Phase n is a float32 at input register `first_register + 2 * (n - 1)`,
+    the layout of Eastron SDM meters. Holding registers read the same.
+    `stop` drops the connections as a meter going offline would.
+    """
+
+    def __init__(self, unit: int = 1, first_register: int = 6) -> None:
+        self.unit = unit
+        self.first_register = first_register
+        self.currents = dict.fromkeys(PHASES, 0.0)
+        self.port = 0
+        self.requests = 0
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def source(self, phase: str, interval: float = 1.0) -> str:
+        """Direct source of a phase"""
+        register = self.first_register + 2 * PHASES.index(phase)
+        return (
+            f"modbus://127.0.0.1:{self.port}/{self.unit}/{register}?interval={interval}"
+        )
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        # let the handlers see their connections go
+        await asyncio.sleep(0.01)
+        await self._server.wait_closed()
+
+    def _registers(self, first: int, count: int) -> bytearray:
+        registers = bytearray(count * 2)
+        for i, phase in enumerate(PHASES):
+            offset = self.first_register + 2 * i - first
+            if 0 <= offset <= count - 2:
+                struct.pack_into(">f", registers, offset * 2, self.currents[phase])
+        return registers
+
+    async def _serve(self, reader, writer) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                transaction, _, length, unit = MBAP_HEADER.unpack(
+                    await reader.readexactly(MBAP_HEADER.size)
+                )
+                function, first, count = struct.unpack(
+                    ">BHH", await reader.readexactly(length - 1)
+                )
+                self.requests += 1
+                if unit != self.unit or function not in (3, 4):
+                    pdu = bytes((function | 0x80, 1))
+                else:
+                    pdu = bytes((function, count * 2)) + self._registers(first, count)
+                writer.write(MBAP_HEADER.pack(transaction, 0, len(pdu) + 1, unit) + pdu)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
@@ -13,9 +13,12 @@ from homeassistant.helpers.typing import ConfigType
 
 from homeassistant.config import CONF_NAME
 from .const import (
+    DATA_CONTROLLERS,
     DATA_HASS_CONFIG,
     DOMAIN,
 )
+from .profiler import async_register_services
+from .scheduler import async_register_services as async_register_plan_services
 
 PLATFORMS = [Platform.SENSOR]
 
@@ -28,6 +31,8 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the generic_charge_controller component."""
 
     hass.data[DATA_HASS_CONFIG] = config.get(DOMAIN)
+    async_register_services(hass)
+    async_register_plan_services(hass)
 
     # hass.config_entries.async_setup(conf_entry.entry_id)
     return True
@@ -57,5 +62,7 @@ async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
     unload_ok = await hass.config_entries.async_unload_platforms(
         config_entry, PLATFORMS
     )
+    if unload_ok:
+        hass.data[DOMAIN].get(DATA_CONTROLLERS, {}).pop(config_entry.entry_id, None)
 
     return unload_ok
@@ -2,8 +2,78 @@
 
 import abc
 
+from homeassistant.core import CALLBACK_TYPE
+
+from .const import PHASE1, PHASE2, PHASE3
+
 
 class AbstractCharger:
+    def async_subscribe(self) -> CALLBACK_TYPE:
+        """Start following charger state, returns a callable to stop"""
+        return lambda: None
+
+    def async_add_status_listener(self, listener: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Call listener when the charger status changes, returns a callable to stop"""
+        return lambda: None
+
+    @property
+    def call_latency(self):
+        """Latency histogram of the limit commands, if measured"""
+        return None
+
+    def phase_currents_at(self, timestamp: float) -> dict[str, float]:
+        """Phase currents as of the given time, if the charger keeps history"""
+        return self.phase_currents
+
+    @property
+    def currents_reported(self) -> float | None:
+        """Time the phase currents were last reported, None if not known
+
+        Only known when the source reports on every update, not only on
+        changes, so a quiet source can be told from a steady one.
+        """
+        return None
+
+    @property
+    def ready(self) -> bool:
+        """True once the charger can be balanced"""
+        return True
+
+    @property
+    def phases(self) -> tuple[str, ...]:
+        """Phases the charger is wired to"""
+        return (PHASE1, PHASE2, PHASE3)
+
+    @property
+    def phase_switching(self) -> bool:
+        """True if the charger may be switched to a single phase"""
+        return False
+
+    @property
+    def actuation(self):
+        """Acknowledgment of the limit commands, if tracked"""
+        return None
+
+    @property
+    def command_dispatcher(self):
+        """Background sender of the limit commands, if any"""
+        return None
+
+    @property
+    def can_start(self) -> bool:
+        """True if a vehicle is plugged in and waits for `start`"""
+        return False
+
+    @property
+    def can_stop(self) -> bool:
+        """True if the charge is on and can be paused with `stop`"""
+        return False
+
+    @property
+    def command_policy(self):
+        """Policy deciding which limit updates are sent, if any"""
+        return None
+
     @abc.abstractmethod
     def start(self) -> None:
         pass
@@ -1,4 +1,5 @@
 """Adds config flow for generic_charge_controller integration."""
+
 from __future__ import annotations
 
 from typing import Any
@@ -13,25 +14,112 @@ from homeassistant.data_entry_flow import FlowResult
 
 import uuid
 
+from .loadbalancer.direct import parse_source
+from .loadbalancer.policy import (
+    DEFAULT_COMMAND_TTL_MIN,
+    DEFAULT_INCREASE_DEADBAND,
+    DEFAULT_INCREASE_INTERVAL_SEC,
+)
 from .const import (
     DOMAIN,
     CONF_ACC_MAX_PRICE_CENTS,
     CONF_ENTITYID_CURR_P1,
-    # CONF_ENTITYID_CURR_P2,
-    # CONF_ENTITYID_CURR_P3,
+    CONF_ENTITYID_PRICE_CENTS,
+    CONF_ENTITYID_CURR_P2,
+    CONF_ENTITYID_CURR_P3,
     CONF_RATED_CURRENT,
+    CONF_PARENT_ENTITYID_CURR_P1,
+    CONF_PARENT_ENTITYID_CURR_P2,
+    CONF_PARENT_ENTITYID_CURR_P3,
+    CONF_PARENT_RATED_CURRENT,
+    CONF_FILTER_WINDOW,
+    CONF_SAMPLING_MODE,
+    CONF_FILTER_STRATEGY,
+    CONF_SPIKE_THRESHOLD,
+    CONF_INCREASE_DEADBAND,
+    CONF_INCREASE_INTERVAL,
+    CONF_COMMAND_TTL,
+    CONF_STATE_MIN_INTERVAL,
+    CONF_LIMIT_CHANGE_THRESHOLD,
+    CONF_MAX_SAMPLE_AGE,
+    CONF_STALE_FALLBACK_LIMIT,
+    CONF_CHARGER_PHASES,
+    CONF_PHASE_SWITCHING,
     CONF_CHRG_ID,
     CONF_CHRG_DOMAIN,
+    SAMPLING_MODES,
+    FILTER_MEAN,
+    FILTER_STRATEGIES,
+    DEFAULT_SAMPLING_MODE,
+    DEFAULT_STATE_MIN_INTERVAL_SEC,
+    DEFAULT_LIMIT_CHANGE_THRESHOLD,
+    DEFAULT_MAX_SAMPLE_AGE_SEC,
+    DEFAULT_STALE_FALLBACK_LIMIT,
+    DEFAULT_CHARGER_PHASES,
+    DEFAULT_WINDOW_SIZE,
+    DIRECT_SOURCES,
 )
 
+
+def phase_source(value: Any) -> str:
+    """Validate a sensor entity id or a direct mqtt: or modbus:// source"""
+    value = cv.string(value)
+    if value.startswith(DIRECT_SOURCES):
+        try:
+            parse_source(value)
+        except ValueError as err:
+            raise vol.Invalid(str(err)) from err
+    return value
+
+
 DATA_SCHEMA = vol.Schema(
     {
         vol.Required(
             CONF_ENTITYID_CURR_P1, description="Sensor ID for current P1"
-        ): cv.string,
+        ): phase_source,
+        vol.Optional(CONF_ENTITYID_CURR_P2): phase_source,
+        vol.Optional(CONF_ENTITYID_CURR_P3): phase_source,
         vol.Required(CONF_RATED_CURRENT): cv.positive_int,
         vol.Required(CONF_CHRG_ID): cv.string,
+        vol.Inclusive(CONF_PARENT_ENTITYID_CURR_P1, "parent_fuse"): phase_source,
+        vol.Inclusive(CONF_PARENT_RATED_CURRENT, "parent_fuse"): cv.positive_int,
+        vol.Optional(CONF_PARENT_ENTITYID_CURR_P2): phase_source,
+        vol.Optional(CONF_PARENT_ENTITYID_CURR_P3): phase_source,
+        vol.Optional(CONF_ENTITYID_PRICE_CENTS): cv.entity_id,
         vol.Optional(CONF_ACC_MAX_PRICE_CENTS): cv.positive_int,
+        vol.Optional(CONF_FILTER_WINDOW, default=DEFAULT_WINDOW_SIZE): cv.positive_int,
+        vol.Optional(CONF_SAMPLING_MODE, default=DEFAULT_SAMPLING_MODE): vol.In(
+            SAMPLING_MODES
+        ),
+        vol.Optional(CONF_FILTER_STRATEGY, default=FILTER_MEAN): vol.In(
+            FILTER_STRATEGIES
+        ),
+        vol.Optional(CONF_SPIKE_THRESHOLD, default=0): cv.positive_int,
+        vol.Optional(
+            CONF_INCREASE_DEADBAND, default=DEFAULT_INCREASE_DEADBAND
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_INCREASE_INTERVAL, default=DEFAULT_INCREASE_INTERVAL_SEC
+        ): cv.positive_int,
+        vol.Optional(CONF_COMMAND_TTL, default=DEFAULT_COMMAND_TTL_MIN): vol.All(
+            cv.positive_int, vol.Range(min=2)
+        ),
+        vol.Optional(
+            CONF_STATE_MIN_INTERVAL, default=DEFAULT_STATE_MIN_INTERVAL_SEC
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_LIMIT_CHANGE_THRESHOLD, default=DEFAULT_LIMIT_CHANGE_THRESHOLD
+        ): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(
+            CONF_MAX_SAMPLE_AGE, default=DEFAULT_MAX_SAMPLE_AGE_SEC
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_STALE_FALLBACK_LIMIT, default=DEFAULT_STALE_FALLBACK_LIMIT
+        ): cv.positive_int,
+        vol.Optional(CONF_CHARGER_PHASES, default=DEFAULT_CHARGER_PHASES): vol.All(
+            vol.Coerce(int), vol.In([1, 3])
+        ),
+        vol.Optional(CONF_PHASE_SWITCHING, default=False): cv.boolean,
     }
 )
 
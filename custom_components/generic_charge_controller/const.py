@@ -1,7 +1,13 @@
 """Generic charge controller constants"""
 
-
 DATA_HASS_CONFIG = "generic_charger_hass_config"
+DATA_BALANCERS = "balancers"
+DATA_STORE = "store"
+DATA_CONTROLLERS = "controllers"
+DATA_SENSORS = "sensors"
+
+SERVICE_PROFILE = "profile"
+SERVICE_PLAN_CHARGE = "plan_charge"
 DOMAIN = "generic_charge_controller"
 
 PHASE_TMP = "P%s"
@@ -16,12 +22,64 @@ CONF_ENTITYID_PRICE_CENTS = "spot_price_cents"
 CONF_ENTITYID_POWER_NOW = "charger_power_sensor"
 CONF_ACC_MAX_PRICE_CENTS = "accepted_max_price_cents"
 CONF_RATED_CURRENT = "mains_fuse_current"
+CONF_PARENT_ENTITYID_CURR_P1 = "parent_current_sensor_phase1"
+CONF_PARENT_ENTITYID_CURR_P2 = "parent_current_sensor_phase2"
+CONF_PARENT_ENTITYID_CURR_P3 = "parent_current_sensor_phase3"
+CONF_PARENT_RATED_CURRENT = "parent_fuse_current"
+CONF_FILTER_WINDOW = "filter_window_samples"
+CONF_SAMPLING_MODE = "sampling_mode"
+CONF_FILTER_STRATEGY = "filter_strategy"
+CONF_SPIKE_THRESHOLD = "spike_threshold_amps"
+CONF_INCREASE_DEADBAND = "increase_deadband_amps"
+CONF_INCREASE_INTERVAL = "increase_interval_sec"
+CONF_COMMAND_TTL = "command_ttl_minutes"
+CONF_STATE_MIN_INTERVAL = "state_min_interval_sec"
+CONF_LIMIT_CHANGE_THRESHOLD = "limit_change_threshold_amps"
+CONF_MAX_SAMPLE_AGE = "max_sample_age_sec"
+CONF_STALE_FALLBACK_LIMIT = "stale_fallback_amps"
+CONF_CHARGER_PHASES = "charger_phases"
+CONF_PHASE_SWITCHING = "phase_switching"
 CONF_CHRG_ID = "charger_device_id"
 CONF_CHRG_DOMAIN = "charger_domain"
 
+SAMPLING_MODE_POLL = "poll"
+SAMPLING_MODE_EVENT = "event"
+SAMPLING_MODE_ADAPTIVE = "adaptive"
+SAMPLING_MODES = [SAMPLING_MODE_ADAPTIVE, SAMPLING_MODE_POLL, SAMPLING_MODE_EVENT]
+DEFAULT_SAMPLING_MODE = SAMPLING_MODE_ADAPTIVE
+
+FILTER_MEAN = "mean"
+FILTER_EWMA = "ewma"
+FILTER_KALMAN = "kalman"
+FILTER_MEDIAN = "median"
+FILTER_TRIMMED_MEAN = "trimmed_mean"
+FILTER_STRATEGIES = [
+    FILTER_MEAN,
+    FILTER_EWMA,
+    FILTER_KALMAN,
+    FILTER_MEDIAN,
+    FILTER_TRIMMED_MEAN,
+]
+
+DEFAULT_WINDOW_SIZE = 6  # 6 samples, 5 seconds sampling -> 30 sec mean
+DEFAULT_STATE_MIN_INTERVAL_SEC = 0
+DEFAULT_LIMIT_CHANGE_THRESHOLD = 1
+DEFAULT_MAX_SAMPLE_AGE_SEC = 180
+DEFAULT_STALE_FALLBACK_LIMIT = 6
+DEFAULT_CHARGER_PHASES = 3
+
+# phase sources read straight from the meter instead of a sensor entity
+SOURCE_MQTT = "mqtt:"
+SOURCE_MODBUS = "modbus://"
+DIRECT_SOURCES = (SOURCE_MQTT, SOURCE_MODBUS)
+
 CHRG_DOMAIN_EASEE = "easee"
 CHRG_DOMAINS = CHRG_DOMAIN_EASEE
 
 DETECTED_CHRG_DOMAIN = "detected_charger_domain"
 
 ATTR_LIMIT_Px = "Current limit %s"
+ATTR_COMMANDS_SENT = "Commands sent"
+ATTR_COMMANDS_SUPPRESSED = "Commands suppressed"
+ATTR_SAMPLE_INTERVAL = "Sample interval (s)"
+ATTR_PLANNED_LIMIT = "Planned limit (A)"
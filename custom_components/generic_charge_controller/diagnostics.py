@@ -0,0 +1,105 @@
+"""Diagnostics support for the generic charge controller"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import REDACTED, async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_CHRG_ID, DATA_CONTROLLERS, DIRECT_SOURCES, DOMAIN
+from .loadbalancer.registry import async_get_sensor_registry
+
+TO_REDACT = {CONF_CHRG_ID}
+
+
+def _source(value: Any) -> Any:
+    """Mains source with the address of a direct meter redacted"""
+    if isinstance(value, str):
+        for prefix in DIRECT_SOURCES:
+            if value.startswith(prefix):
+                return prefix + REDACTED
+    return value
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Control loop state, metrics and the trace of the last ticks"""
+    config = {key: _source(value) for key, value in entry.data.items()}
+    data: dict[str, Any] = {"config": async_redact_data(config, TO_REDACT)}
+
+    controller = hass.data.get(DOMAIN, {}).get(DATA_CONTROLLERS, {}).get(entry.entry_id)
+    if not controller:
+        return data
+
+    balancer = controller.balancer
+    charger = controller.charger
+    policy = charger.command_policy
+
+    data["fuse"] = {
+        "sensors": [_source(entity_id) for entity_id in balancer.key],
+        "rated_current": balancer.rated_current,
+        "controllers": [c.unique_id for c in balancer.controllers],
+        "parent": (
+            [_source(entity_id) for entity_id in balancer.parent.key]
+            if balancer.parent
+            else None
+        ),
+        "children": [
+            [_source(entity_id) for entity_id in child.key]
+            for child in balancer.children
+        ],
+        "headroom": balancer.circuit.headroom(balancer.phases),
+        "claimed": balancer.circuit.claimed,
+        "fuse_usage": balancer.fuse_usage,
+        "sample_ages": balancer.sample_ages(),
+        "sample_interval": balancer.sample_interval,
+        "load_filter": balancer.calculator.load_filter.name,
+        "load_estimate": balancer.calculator.filtered_loads().tolist(),
+        "rejected_samples": balancer.calculator.load_filter.rejected,
+        "stale_sources": balancer.stale_sources,
+        "single_phase_chargers": balancer.single_phase_chargers,
+        "phases": {
+            phase_id: {
+                "target_current": phase_data.target_current,
+                "filtered_current": phase_data.filtered_current,
+                "samples": phase_data.samples.tolist(),
+            }
+            for phase_id, phase_data in balancer.phases.items()
+        },
+    }
+    registry = async_get_sensor_registry(hass)
+    streams = registry.streams
+    data["sensor_streams"] = [
+        {
+            "source": _source(entity_id),
+            "readers": stream.refs,
+            "listeners": stream.listener_count,
+        }
+        for entity_id in balancer.key
+        if (stream := streams.get(entity_id))
+    ]
+    if registry.meters:
+        data["direct_meters"] = [
+            meter.as_dict() for meter in registry.meters.meters.values()
+        ]
+    data["loop"] = balancer.metrics.as_dict()
+    data["charger"] = {
+        "charging": charger.charging,
+        "phase_currents": charger.phase_currents,
+        "rated_current": charger.rated_current,
+        "command_latency_ms": (
+            charger.call_latency.as_dict() if charger.call_latency else None
+        ),
+        "actuation": charger.actuation.as_dict() if charger.actuation else None,
+        "command_counters": policy.counters if policy else None,
+        "dispatcher": (
+            charger.command_dispatcher.as_dict() if charger.command_dispatcher else None
+        ),
+        "last_limits": policy.last_limits if policy else None,
+    }
+    if controller.scheduler:
+        data["plan"] = controller.scheduler.as_dict()
+    return data
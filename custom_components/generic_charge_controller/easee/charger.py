@@ -1,38 +1,86 @@
 """Control for Easee EV chargers"""
 
+import collections
 from logging import Logger
+import time
+from typing import NamedTuple
 
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers.entity_registry import async_get as async_get_entity_reg
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.entity_registry import (
+    EVENT_ENTITY_REGISTRY_UPDATED,
+    async_get as async_get_entity_reg,
+)
+from homeassistant.helpers.event import async_track_state_change_event
 from homeassistant.helpers.state import State
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from ..abstract_charger import AbstractCharger
 from ..const import PHASE_TMP
+from ..loadbalancer.actuation import DEFAULT_ACK_TIMEOUT_SEC, ActuationTracker
+from ..loadbalancer.dispatcher import CommandDispatcher
+from ..loadbalancer.metrics import Histogram
+from ..loadbalancer.policy import CommandPolicy
+from ..loadbalancer.registry import has_heartbeat, reported_at
 from .const import (
     ACTION_COMMAND,
     ACTION_START,
     ACTION_STOP,
+    ATTR_ALLOCATED_CURRENT_TMP,
     ATTR_PHASE_CURRENT_TMP,
     CHRG_DOMAIN,
-    DEVICE_STATES,
     EA_AWAITING_START,
     EA_CHARGING,
+    EA_COMPLETED,
     EA_READY_TO_CHARGE,
     S_NAME_CIRCUITCURRENT,
-    S_NAME_ONLINE,
     S_NAME_STATUS,
     SVC_SET_LIMIT,
 )
 
+# circuit current readings kept to align them with the mains samples
+CURRENT_HISTORY_SIZE = 16
+
+
+class EaseeSnapshot(NamedTuple):
+    """Charger state read at a single moment"""
+
+    status: str | None
+    phase_currents: dict[str, float]
+    rated_current: float
+    updated: datetime | None
+    allocated_currents: dict[str, float] | None
+
+
+EMPTY_SNAPSHOT = EaseeSnapshot(
+    None, {PHASE_TMP % p: 0.0 for p in range(1, 4)}, 0.0, None, None
+)
+
 
 class EaseeCharger(AbstractCharger):
-    """Charger implementation for Easee"""
+    """Charger implementation for Easee
+
+    Construction does no lookups. The Easee entities are resolved once
+    the charger is subscribed and again on every entity registry update,
+    so a charger whose entities appear after boot becomes `ready` then,
+    with a status change, instead of failing the setup.
+
+    Limit commands are followed until the circuit's allocated currents
+    show them, see ActuationTracker. Commands not applied in
+    `ack_timeout` seconds are sent again and increases wait until the
+    last command is applied. An `ack_timeout` of 0 turns this off.
+    """
 
     def __init__(
-        self, hass: HomeAssistant, logger: Logger, device_id: str, unique_id: str
+        self,
+        hass: HomeAssistant,
+        logger: Logger,
+        device_id: str,
+        unique_id: str,
+        policy: CommandPolicy | None = None,
+        phase_count: int = 3,
+        phase_switching: bool = False,
+        ack_timeout: float = DEFAULT_ACK_TIMEOUT_SEC,
     ) -> None:
         """Init"""
         self.hass = hass
@@ -40,17 +88,148 @@ class EaseeCharger(AbstractCharger):
         self._device_id = device_id
         self._unique_id = unique_id
         self._rated_current: float = 0.0
-        self._update_rated_current()
-        self._last_balanced: tuple[datetime, dict] = (
-            datetime.min,
-            {},
+        self._phases = tuple(PHASE_TMP % i for i in range(1, phase_count + 1))
+        self._phase_switching = phase_switching
+        self._entity_ids: dict[str, str | None] = {}
+        self._snapshot: EaseeSnapshot = EMPTY_SNAPSHOT
+        self._current_history: collections.deque[tuple[float, dict[str, float]]] = (
+            collections.deque([], CURRENT_HISTORY_SIZE)
         )
+        self._currents_heartbeat = False
+        self._unsub_states: CALLBACK_TYPE | None = None
+        self._status_listeners: list[CALLBACK_TYPE] = []
+        self._policy = policy or CommandPolicy()
+        self._call_latency = Histogram()
+        self._dispatcher = CommandDispatcher(hass, logger, self._async_send_limits)
+        self._actuation = ActuationTracker(ack_timeout) if ack_timeout else None
 
-    def _update_rated_current(self):
-        if circuit_current := self._get_state(S_NAME_CIRCUITCURRENT):
-            self._rated_current = circuit_current.attributes.get(
-                "circuit_ratedCurrent", 0.0
+    @callback
+    def async_subscribe(self) -> CALLBACK_TYPE:
+        """Keep the snapshot up to date from state changes, returns unsubscribe"""
+        unsub_registry = self.hass.bus.async_listen(
+            EVENT_ENTITY_REGISTRY_UPDATED, self._async_registry_updated
+        )
+        self._track_states()
+        self._refresh()
+
+        @callback
+        def unsubscribe() -> None:
+            unsub_registry()
+            self._dispatcher.async_cancel()
+            if self._unsub_states:
+                self._unsub_states()
+                self._unsub_states = None
+
+        return unsubscribe
+
+    @callback
+    def async_add_status_listener(self, listener: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Call listener when the charger status changes, returns a callable to stop"""
+        self._status_listeners.append(listener)
+        return lambda: self._status_listeners.remove(listener)
+
+    @callback
+    def _track_states(self) -> None:
+        if self._unsub_states:
+            self._unsub_states()
+            self._unsub_states = None
+
+        entity_ids = [
+            entity_id
+            for entity_id in (
+                self._get_entity_id(S_NAME_STATUS),
+                self._get_entity_id(S_NAME_CIRCUITCURRENT),
             )
+            if entity_id
+        ]
+        if entity_ids:
+            self._unsub_states = async_track_state_change_event(
+                self.hass, entity_ids, self._async_state_changed
+            )
+
+    @callback
+    def _async_registry_updated(self, event: Event) -> None:
+        """Drop resolved entity ids when one of ours is added, renamed or removed"""
+        if event.data.get("action") == "create" and self._all_resolved():
+            return
+
+        entity_id = event.data.get("entity_id")
+        old_entity_id = event.data.get("old_entity_id")
+        if (
+            self._all_resolved()
+            and entity_id not in self._entity_ids.values()
+            and old_entity_id not in self._entity_ids.values()
+        ):
+            return
+
+        self._logger.debug("Entity registry changed, resolving Easee entities again")
+        self._entity_ids.clear()
+        self._track_states()
+        self._refresh()
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Update the snapshot, telling the status listeners if it changed"""
+        status = self._snapshot.status
+        self._update_snapshot()
+        if self._snapshot.status == status:
+            return
+
+        if status is None:
+            self._logger.info("Easee charger %s ready", self._unique_id)
+        for listener in list(self._status_listeners):
+            listener()
+
+    def _all_resolved(self) -> bool:
+        return len(self._entity_ids) == 2 and all(self._entity_ids.values())
+
+    def _update_snapshot(self) -> None:
+        """Read status and circuit currents together into a new snapshot"""
+        status = self._get_state(S_NAME_STATUS)
+        circuit_current = self._get_state(S_NAME_CIRCUITCURRENT)
+
+        phase_currents = EMPTY_SNAPSHOT.phase_currents
+        allocated_currents = None
+        if circuit_current:
+            attributes = circuit_current.attributes
+            phase_currents = {}
+            for p in range(1, 4):
+                phase_currents[PHASE_TMP % p] = float(
+                    attributes.get(ATTR_PHASE_CURRENT_TMP % p) or 0.0
+                )
+            if rated_current := attributes.get("circuit_ratedCurrent", 0.0):
+                self._rated_current = rated_current
+
+            if ATTR_ALLOCATED_CURRENT_TMP % 1 in attributes:
+                allocated_currents = {
+                    PHASE_TMP
+                    % p: float(attributes.get(ATTR_ALLOCATED_CURRENT_TMP % p) or 0.0)
+                    for p in range(1, 4)
+                }
+                if self._actuation:
+                    self._actuation.observe(
+                        allocated_currents, self._rated_current, time.monotonic()
+                    )
+
+            reported = reported_at(circuit_current)
+            self._currents_heartbeat = has_heartbeat(circuit_current)
+            if not self._current_history or reported > self._current_history[-1][0]:
+                self._current_history.append((reported, phase_currents))
+
+        updated = max(
+            (state.last_updated for state in (status, circuit_current) if state),
+            default=None,
+        )
+        self._snapshot = EaseeSnapshot(
+            status.state if status else None,
+            phase_currents,
+            self._rated_current,
+            updated,
+            allocated_currents,
+        )
 
     async def _action_command(self, command):
         await self.hass.services.async_call(
@@ -68,82 +247,180 @@ class EaseeCharger(AbstractCharger):
         await self._action_command(ACTION_STOP)
 
     async def update_limits(self, phases: dict[str, float]) -> None:
+        """Hand new limits to the dispatcher, returns without waiting for it"""
         self._logger.debug("Charger limits set to: %s", phases)
         if not phases:
             self._logger.error("Cannot load balance, no target currents received")
             return
 
+        now = time.monotonic()
+        tracker = self._actuation
+        limits = self._policy.evaluate(
+            phases, now, hold_increases=bool(tracker and tracker.awaiting)
+        )
+        reissue = False
+        if not limits and tracker and (unapplied := tracker.overdue(now)):
+            self._logger.info(
+                "Limits %s not applied by the charger, resending", unapplied
+            )
+            limits = {
+                phase: min(limit, phases.get(phase, limit))
+                for phase, limit in unapplied.items()
+            }
+            reissue = True
+        if not limits:
+            self._logger.info("No load balancing update needed")
+            return
+
+        if not self._dispatcher.submit(limits) and reissue:
+            # the same limits are on their way already
+            tracker.cancel_reissue()
+
+    async def _async_send_limits(self, limits: dict[str, float]) -> None:
         svc_data = {
             "device_id": self._device_id,
-            "time_to_live": 5,  # fall back to charger default after 5 mins if no other update is given
+            # fall back to charger default if no other update is given in time
+            "time_to_live": self._policy.ttl_minutes,
         }
-
-        balance_needed = (datetime.now() - self._last_balanced[0]).total_seconds() > 180
         for i in range(1, 4):
-            if p_curr := phases.get(PHASE_TMP % i, None):
+            if (p_curr := limits.get(PHASE_TMP % i, None)) is not None:
                 svc_data[f"currentP{i}"] = p_curr
-                if p_curr != self._last_balanced[1].get(f"currentP{i}", 0.0):
-                    balance_needed = True
-
-        if not balance_needed:
-            self._logger.info("No load balancing update needed")
-            return
 
         self._logger.debug("Load balancing with data: %s", svc_data)
 
-        if not await self.hass.services.async_call(
-            "easee", SVC_SET_LIMIT, svc_data, blocking=True
-        ):
-            raise HomeAssistantError("Cannot send load balancing command")
+        sent_at = time.monotonic()
+        start = time.perf_counter()
+        try:
+            await self.hass.services.async_call(
+                "easee", SVC_SET_LIMIT, svc_data, blocking=True
+            )
+        finally:
+            self._call_latency.observe((time.perf_counter() - start) * 1000)
 
-        self._last_balanced = (datetime.now(), svc_data)
+        now = time.monotonic()
+        self._policy.record_sent(limits, now)
+        if self._actuation:
+            self._actuation.sent(limits, sent_at, now)
+
+    def _get_entity_id(self, req_state: str) -> str | None:
+        """Resolve and cache the entity id of a charger sensor"""
+        if req_state in self._entity_ids:
+            return self._entity_ids[req_state]
 
-    def _get_state(self, req_state: str) -> State:
-        """Get specific state"""
         state_uid = f"{self._unique_id}_{req_state}"
         entity_reg = async_get_entity_reg(self.hass)
         entity = entity_reg.async_get_entity_id(
             Platform.SENSOR.SENSOR, CHRG_DOMAIN, state_uid
         )
+        if not entity:
+            # misses are cached too, looked up again on the next registry update
+            self._logger.debug("Entity %s not found yet", state_uid)
+
+        self._entity_ids[req_state] = entity
+        return entity
 
+    def _get_state(self, req_state: str) -> State:
+        """Get specific state"""
+        entity = self._get_entity_id(req_state)
         if not entity:
-            self._logger.warning("Entity %s not found", state_uid)
-            return
+            return None
 
         state = self.hass.states.get(entity)
         if not state:
-            self._logger.debug("Entity %s state cannot be fetched")
+            self._logger.debug("Entity %s state cannot be fetched", entity)
             return None
 
-        self._logger.debug("Entity %s state: %s", state_uid, state.as_dict())
+        self._logger.debug("Entity %s state: %s", entity, state.state)
         return state
 
+    @property
+    def call_latency(self) -> Histogram:
+        """Latency of the limit service calls"""
+        return self._call_latency
+
+    @property
+    def actuation(self) -> ActuationTracker | None:
+        """Acknowledgment of the limit commands by the charger"""
+        return self._actuation
+
+    @property
+    def command_dispatcher(self) -> CommandDispatcher:
+        """Background sender of the limit commands"""
+        return self._dispatcher
+
+    @property
+    def command_policy(self) -> CommandPolicy:
+        """Policy deciding which limit updates are sent"""
+        return self._policy
+
+    @property
+    def snapshot(self) -> EaseeSnapshot:
+        """Status and circuit currents as of the last charger state change"""
+        return self._snapshot
+
     @property
     def phase_currents(self) -> dict[str, float]:
-        circuit_current = self._get_state(S_NAME_CIRCUITCURRENT)
+        return self._snapshot.phase_currents
 
-        ret_currents = {}
+    @property
+    def phases(self) -> tuple[str, ...]:
+        return self._phases
 
-        for p in range(1, 4):
-            ret_currents[PHASE_TMP % p] = float(
-                circuit_current.attributes.get(ATTR_PHASE_CURRENT_TMP % p)
-            )
+    @property
+    def phase_switching(self) -> bool:
+        """True if limits of 0 on P2 and P3 may put the charger on one phase"""
+        return self._phase_switching
+
+    def phase_currents_at(self, timestamp: float) -> dict[str, float]:
+        """Circuit currents at the given time, interpolated between readings"""
+        history = self._current_history
+        if not history or timestamp >= history[-1][0]:
+            return self._snapshot.phase_currents
+
+        for i in range(len(history) - 1, 0, -1):
+            before, currents_before = history[i - 1]
+            if before <= timestamp:
+                after, currents_after = history[i]
+                share = (timestamp - before) / (after - before)
+                return {
+                    phase: current + (currents_after[phase] - current) * share
+                    for phase, current in currents_before.items()
+                }
 
-        return ret_currents
+        return history[0][1]
+
+    @property
+    def currents_reported(self) -> float | None:
+        """Time the circuit currents were last reported, None without a heartbeat"""
+        if not self._current_history or not self._currents_heartbeat:
+            return None
+        return self._current_history[-1][0]
+
+    @property
+    def ready(self) -> bool:
+        """True once the charger status is known"""
+        return self._snapshot.status is not None
 
     @property
     def charging(self) -> bool:
         """Indicates if charge is ongoing and balance required"""
-        return self._get_state(S_NAME_STATUS).state in (
+        return self._snapshot.status in (
             EA_READY_TO_CHARGE,
             EA_AWAITING_START,
             EA_CHARGING,
         )
 
     @property
-    def rated_current(self) -> float:
-        """Rated current on the circuit"""
-        if not self._rated_current:
-            self._update_rated_current()
+    def can_start(self) -> bool:
+        """True while a vehicle waits for a start or stopped charging"""
+        return self._snapshot.status in (EA_AWAITING_START, EA_COMPLETED)
+
+    @property
+    def can_stop(self) -> bool:
+        """True while the vehicle charges or is about to"""
+        return self._snapshot.status in (EA_READY_TO_CHARGE, EA_CHARGING)
 
+    @property
+    def rated_current(self) -> float:
+        """Rated current on the circuit, 0 until the charger reports it"""
         return self._rated_current
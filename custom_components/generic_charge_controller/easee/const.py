@@ -34,6 +34,7 @@ S_NAME_CIRCUITCURRENT = "circuit_current"
 S_NAME_ONLINE = "online"
 S_NAME_STATUS = "status"
 ATTR_PHASE_CURRENT_TMP = "state_circuitTotalPhaseConductorCurrentL%s"
+ATTR_ALLOCATED_CURRENT_TMP = "state_circuitTotalAllocatedPhaseConductorCurrentL%s"
 
 
 EA_DISCONNECTED = "disconnected"
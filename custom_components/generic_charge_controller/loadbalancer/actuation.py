@@ -0,0 +1,137 @@
+"""Acknowledgment of limit commands by what the charger reports back"""
+
+import math
+
+from .metrics import Histogram
+
+DEFAULT_ACK_TIMEOUT_SEC = 60
+DEFAULT_REISSUES = 2
+# Reported limits this close to the commanded ones count as applied
+ACK_TOLERANCE = 0.5
+# Cloud chargers take seconds to minutes, BUCKETS_MS ends at 10 s
+LATENCY_BUCKETS_MS = (
+    500,
+    1000,
+    2000,
+    5000,
+    10000,
+    20000,
+    30000,
+    60000,
+    120000,
+    300000,
+    math.inf,
+)
+
+
+class ActuationTracker:
+    """Follows the last limit command until the charger shows it applied
+
+    The service call returning only means the command was accepted. A
+    command counts as applied once the limits the charger reports match
+    it, capped at the circuit rating. The time from sending to that
+    report goes into `latency`. A command not applied in `timeout`
+    seconds is handed out for sending again, up to `reissues` times,
+    then counted in `unapplied` and dropped. The command sent next counts
+    as the reissue even if it was capped to newer targets.
+
+    Nothing is tracked until the charger has reported limits once, so
+    chargers that never do are not flooded with repeats.
+    """
+
+    def __init__(
+        self, timeout: float = DEFAULT_ACK_TIMEOUT_SEC, reissues: int = DEFAULT_REISSUES
+    ) -> None:
+        self._timeout = timeout
+        self._reissues = reissues
+        self._pending: dict[str, float] | None = None
+        self._sent_at = 0.0
+        self._attempts = 0
+        # the next command sent is a reissue of the pending one
+        self._reissuing = False
+        self._applied: dict[str, float] | None = None
+        self._rated_current = 0.0
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.confirmed = 0
+        self.reissued = 0
+        self.unapplied = 0
+
+    @property
+    def awaiting(self) -> bool:
+        """True while a command waits to be applied"""
+        return self._pending is not None
+
+    @property
+    def applied(self) -> dict[str, float] | None:
+        """Limits the charger last reported"""
+        return self._applied
+
+    def _matches(self, limits: dict[str, float]) -> bool:
+        if self._applied is None:
+            return False
+
+        for phase, limit in limits.items():
+            if self._rated_current:
+                limit = min(limit, self._rated_current)
+            applied = self._applied.get(phase)
+            if applied is None or abs(applied - limit) > ACK_TOLERANCE:
+                return False
+        return True
+
+    def _confirm(self, now: float) -> None:
+        self.latency.observe((now - self._sent_at) * 1000)
+        self.confirmed += 1
+        self._pending = None
+
+    def sent(self, limits: dict[str, float], sent_at: float, now: float) -> None:
+        """Start following a command sent at `sent_at`"""
+        if self._applied is None:
+            return
+
+        if limits != self._pending and not self._reissuing:
+            self._attempts = 0
+        self._reissuing = False
+        self._pending = limits
+        self._sent_at = sent_at
+        if self._matches(limits):
+            self._confirm(now)
+
+    def observe(
+        self, applied: dict[str, float], rated_current: float, now: float
+    ) -> None:
+        """Take the limits the charger reports, confirming the command"""
+        self._applied = applied
+        self._rated_current = rated_current
+        if self._pending is not None and self._matches(self._pending):
+            self._confirm(now)
+
+    def overdue(self, now: float) -> dict[str, float] | None:
+        """Limits to send again if the command was not applied in time"""
+        if self._pending is None or now - self._sent_at < self._timeout:
+            return None
+
+        if self._attempts >= self._reissues:
+            self.unapplied += 1
+            self._pending = None
+            return None
+
+        self._attempts += 1
+        self.reissued += 1
+        self._reissuing = True
+        self._sent_at = now
+        return self._pending
+
+    def cancel_reissue(self) -> None:
+        """Forget the reissue handed out by `overdue`, it was not sent"""
+        self._reissuing = False
+
+    def as_dict(self) -> dict:
+        """Counters and latency, for diagnostics"""
+        return {
+            "awaiting": self._pending,
+            "applied": self._applied,
+            "confirmed": self.confirmed,
+            "reissued": self.reissued,
+            "unapplied": self.unapplied,
+            "latency_ms": self.latency.as_dict(),
+        }
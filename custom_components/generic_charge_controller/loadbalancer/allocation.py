@@ -0,0 +1,177 @@
+"""Phase aware sharing of the fuse headroom between chargers"""
+
+from math import trunc
+from typing import NamedTuple
+
+# Lowest current an EV charges with, less than this on a phase is wasted
+MIN_CHARGE_CURRENT = 6
+
+# A vehicle drawing at least PHASE_ON_CURRENT on one phase and less than
+# PHASE_OFF_CURRENT on the others charges from that phase only
+PHASE_ON_CURRENT = 3
+PHASE_OFF_CURRENT = 1
+
+# Switching phases pauses the charge, so it must pay off and not flap
+PHASE_SWITCH_HOLD_SEC = 300
+PHASE_SWITCH_GAIN = 1.2
+
+
+class ChargerDemand(NamedTuple):
+    """What the allocator needs to know about one charger"""
+
+    key: str
+    limit: float
+    phases: tuple[str, ...]
+    currents: dict[str, float]
+    switchable: bool
+
+
+def vehicle_phases(demand: ChargerDemand) -> tuple[str, ...]:
+    """Phases the vehicle draws from, all of the charger's until it shows"""
+    drawing = [
+        phase
+        for phase in demand.phases
+        if demand.currents.get(phase, 0.0) >= PHASE_OFF_CURRENT
+    ]
+    if len(drawing) == 1 and demand.currents[drawing[0]] >= PHASE_ON_CURRENT:
+        return tuple(drawing)
+    return demand.phases
+
+
+def _fill_once(
+    headroom: dict[str, float],
+    limits: list[float],
+    phases: list[tuple[str, ...]],
+    active: list[int],
+) -> list[int]:
+    levels = [0] * len(limits)
+    remaining = {phase: trunc(max(0, amps)) for phase, amps in headroom.items()}
+    growing = list(active)
+    while growing:
+        for i in list(growing):
+            if levels[i] + 1 > limits[i] or any(
+                remaining.get(phase, 0) < 1 for phase in phases[i]
+            ):
+                growing.remove(i)
+                continue
+            levels[i] += 1
+            for phase in phases[i]:
+                remaining[phase] -= 1
+
+    return levels
+
+
+def fill(
+    headroom: dict[str, float],
+    limits: list[float],
+    phases: list[tuple[str, ...]],
+) -> list[int]:
+    """Max-min fair charge currents in whole amps
+
+    Every charger takes the same current on each of its phases. Currents
+    rise one amp at a time, round robin, while all of a charger's phases
+    have room. While some chargers cannot reach MIN_CHARGE_CURRENT, the
+    one whose pause lets the others deliver the most gets nothing and the
+    filling starts over without it.
+    """
+    active = [i for i, used in enumerate(phases) if used]
+    while True:
+        levels = _fill_once(headroom, limits, phases, active)
+        starved = [i for i in active if levels[i] < MIN_CHARGE_CURRENT]
+        if not starved:
+            return levels
+
+        def delivered_without(paused: int) -> int:
+            others = [i for i in active if i != paused]
+            return delivered(_fill_once(headroom, limits, phases, others), phases)
+
+        active.remove(max(reversed(starved), key=delivered_without))
+
+
+def delivered(levels: list[int], phases: list[tuple[str, ...]]) -> int:
+    """Total current delivered over all phases"""
+    return sum(level * len(used) for level, used in zip(levels, phases))
+
+
+class PhaseAllocator:
+    """Turns per phase targets into one limit vector per charger
+
+    A vehicle charging from one phase only reserves headroom on that
+    phase, the rest is left to the other chargers; `drawn_phases` tells
+    which phases a limit really takes. Unless the charger is switched to
+    one phase its limit still covers all phases, so the vehicle is not
+    made to switch. Chargers that may switch phases are put on one phase
+    when a current of at least MIN_CHARGE_CURRENT does not fit on all of
+    them, and back on all phases once that delivers more. A switch is
+    held for PHASE_SWITCH_HOLD_SEC and needs a PHASE_SWITCH_GAIN better
+    result.
+    """
+
+    def __init__(self) -> None:
+        self._single_phase: set[str] = set()
+        self._switched: dict[str, float] = {}
+
+    @property
+    def single_phase(self) -> list[str]:
+        """Chargers switched to one phase"""
+        return sorted(self._single_phase)
+
+    def drawn_phases(self, demand: ChargerDemand) -> tuple[str, ...]:
+        """Phases the charger's current is drawn from, as last allocated"""
+        if demand.key in self._single_phase:
+            return demand.phases[:1]
+        return vehicle_phases(demand)
+
+    def _can_switch(
+        self, demand: ChargerDemand, phases: tuple[str, ...], now: float
+    ) -> bool:
+        # a vehicle charging from one phase on its own has nothing to switch
+        return (
+            demand.switchable
+            and len(demand.phases) > 1
+            and (demand.key in self._single_phase or phases == demand.phases)
+            and now - self._switched.get(demand.key, -PHASE_SWITCH_HOLD_SEC)
+            >= PHASE_SWITCH_HOLD_SEC
+        )
+
+    def allocate(
+        self, headroom: dict[str, float], demands: list[ChargerDemand], now: float
+    ) -> list[dict[str, int]]:
+        """Limits for each charger, 0 where it must pause"""
+        limits = [demand.limit for demand in demands]
+        phases = [self.drawn_phases(demand) for demand in demands]
+        levels = fill(headroom, limits, phases)
+
+        for i, demand in enumerate(demands):
+            if not self._can_switch(demand, phases[i], now):
+                continue
+
+            single = demand.key in self._single_phase
+            trial = list(phases)
+            trial[i] = demand.phases if single else demand.phases[:1]
+            trial_levels = fill(headroom, limits, trial)
+            before = delivered(levels, phases)
+            after = delivered(trial_levels, trial)
+            if after > before and after >= PHASE_SWITCH_GAIN * before:
+                phases, levels = trial, trial_levels
+                self._switched[demand.key] = now
+                if single:
+                    self._single_phase.discard(demand.key)
+                else:
+                    self._single_phase.add(demand.key)
+
+        return [
+            {
+                phase: (
+                    level
+                    if demand.key not in self._single_phase or phase in used
+                    else 0
+                )
+                for phase in demand.phases
+            }
+            for demand, used, level in zip(demands, phases, levels)
+        ]
+
+    def forget(self, key: str) -> None:
+        """Drop the phase mode of a charger that stopped charging"""
+        self._single_phase.discard(key)
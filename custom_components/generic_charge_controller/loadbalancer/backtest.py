@@ -0,0 +1,96 @@
+"""Replay of a household load series through the Calculator"""
+
+from collections.abc import Iterable, Sequence
+import collections
+import logging
+
+import numpy
+
+from ..const import DEFAULT_WINDOW_SIZE, PHASE_TMP
+from .allocation import MIN_CHARGE_CURRENT
+from .calculator import SAFETY_MARGIN, Calculator
+from .filters import create_load_filter
+from .policy import SENT, CommandPolicy
+from .samples import PhaseSampleMatrix
+
+DEFAULT_CAR_MAX_CURRENT = 16
+DEFAULT_LATENCY_SAMPLES = 1
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def backtest(
+    loads: Iterable[tuple[float, Sequence[float]]],
+    rated_current: float,
+    strategy: str,
+    window_size: int = DEFAULT_WINDOW_SIZE,
+    car_max_current: float = DEFAULT_CAR_MAX_CURRENT,
+    latency: int = DEFAULT_LATENCY_SAMPLES,
+    safety_margin: float = SAFETY_MARGIN,
+    policy: CommandPolicy | None = None,
+    spike_threshold: float = 0.0,
+) -> dict[str, float]:
+    """Overload, unused headroom and commands of one configuration
+
+    `loads` yields the time and the household load of every phase, the
+    mains reading less the charger. The targets go through `policy` as
+    in `update_limits`, and a three phase car follows the commands sent
+    `latency` samples late. It charges with the lowest limit of all
+    phases up to `car_max_current`, nothing below the EV minimum.
+
+    All results are per hour: seconds with a phase above `rated_current`,
+    amp hours the car could have drawn on top without passing the
+    rating, and limit commands sent.
+
+    `spike_threshold` goes to the median and trimmed mean filters.
+    """
+    policy = policy or CommandPolicy()
+    matrix = None
+    calculator = None
+    phases: list[str] = []
+    in_transit: collections.deque[float | None] = collections.deque()
+    draw = 0.0
+    previous = None
+    seconds = overload = unused = 0.0
+
+    for timestamp, load in loads:
+        load = numpy.asarray(load, dtype=float)
+        if matrix is None:
+            matrix = PhaseSampleMatrix(len(load), window_size)
+            calculator = Calculator(
+                _LOGGER,
+                rated_current,
+                create_load_filter(strategy, matrix, spike_threshold),
+                safety_margin,
+            )
+            phases = [PHASE_TMP % (row + 1) for row in range(len(load))]
+
+        if previous is not None:
+            elapsed = timestamp - previous
+            peak = float((load + draw).max())
+            seconds += elapsed
+            if peak > rated_current:
+                overload += elapsed
+            spare = min(rated_current - peak, car_max_current - draw)
+            unused += max(0.0, spare) * elapsed
+        previous = timestamp
+
+        matrix.push_all(load, timestamp)
+        calculator.load_filter.observe_all(load, timestamp)
+        targets = dict(zip(phases, calculator.filtered_targets().tolist()))
+        limits = policy.evaluate(targets, timestamp)
+        if limits:
+            policy.record_sent(limits, timestamp)
+        in_transit.append(min(limits.values()) if limits else None)
+
+        if len(in_transit) > latency and (limit := in_transit.popleft()) is not None:
+            limit = min(car_max_current, limit)
+            draw = limit if limit >= MIN_CHARGE_CURRENT else 0.0
+
+    hours = seconds / 3600 or 1.0
+    return {
+        "hours": seconds / 3600,
+        "overload_seconds_per_hour": overload / hours,
+        "unused_headroom_amp_hours_per_hour": unused / 3600 / hours,
+        "commands_per_hour": policy.counters.get(SENT, 0) / hours,
+    }
@@ -1,43 +1,83 @@
 """Advanced current calculations"""
 
-import numpy
 from math import trunc
 
+import numpy
+
+from .filters import LoadFilter
+
 SAFETY_MARGIN = 1
 
+# Adaptive sampling: fastest within NEAR_HEADROOM of the rating, slowest
+# with FAR_HEADROOM or more to spare, linear in between
+MIN_SAMPLE_INTERVAL_SEC = 2
+MAX_SAMPLE_INTERVAL_SEC = 20
+NEAR_HEADROOM = 1
+FAR_HEADROOM = 10
+
 
 class Calculator:
-    """Target current calculator"""
+    """Target current calculator
+
+    Targets are calculated from the estimate of a pluggable LoadFilter.
+    """
 
-    def __init__(self, logger, rated_current: float = 0) -> None:
+    def __init__(
+        self,
+        logger,
+        rated_current: float = 0,
+        load_filter: LoadFilter | None = None,
+        safety_margin: float = SAFETY_MARGIN,
+    ) -> None:
         self._rated_current = rated_current
         self._logger = logger
+        self._filter = load_filter
+        self._safety_margin = safety_margin
 
-    def _running_mean(self, samples, window_size) -> float:
-        """Running mean calculator"""
-        # https://stackoverflow.com/questions/13728392/moving-average-or-running-mean
+    @property
+    def load_filter(self) -> LoadFilter | None:
+        """Strategy estimating the phase loads"""
+        return self._filter
 
-        valid_window = min(window_size, len(samples))
-        if not valid_window:
-            return 0
+    @property
+    def rated_current(self) -> float:
+        """Rated current the targets are calculated against"""
+        return self._rated_current
 
-        cumsum = numpy.cumsum(numpy.insert(samples, 0, 0))
-        return (cumsum[valid_window:] - cumsum[:-valid_window]) / float(valid_window)
+    def update_rated_current(self, rated_current: float) -> None:
+        """Sets the rated current, e.g. once the charger reports it"""
+        self._rated_current = rated_current
 
     def _get_new_current(self, calc_load: float) -> int:
-        return max(0, self._rated_current - trunc(calc_load) - SAFETY_MARGIN)
+        return max(0, self._rated_current - trunc(calc_load) - self._safety_margin)
 
     def calculate_target_current(self, current_load: float) -> int:
         """Provides the target current as a simple operation"""
 
         return self._get_new_current(current_load)
 
-    def calculate_target_with_filter(self, phase_data) -> int:
-        """Provides the target current run through a mean filter"""
+    def calculate_targets(self, loads: numpy.ndarray) -> numpy.ndarray:
+        """Target currents for a vector of phase loads in one operation"""
 
-        running_mean = self._running_mean(
-            phase_data.samples,
-            6,  # windows size 6 => 5x6 seconds, 30 sec
-        )
+        return numpy.maximum(
+            0, self._rated_current - numpy.trunc(loads) - self._safety_margin
+        ).astype(int)
+
+    def filtered_loads(self) -> numpy.ndarray:
+        """Load estimate of every phase from the load filter"""
+        return self._filter.estimate()
 
-        return self._get_new_current(running_mean[-1])
+    def filtered_targets(self) -> numpy.ndarray:
+        """Target currents of every phase from the load filter"""
+        return self.calculate_targets(self._filter.estimate())
+
+    def sample_interval(self, load: float) -> float:
+        """Seconds until the next sample given the highest phase load"""
+        headroom = self._rated_current - load
+        share = (headroom - NEAR_HEADROOM) / (FAR_HEADROOM - NEAR_HEADROOM)
+        share = min(max(share, 0.0), 1.0)
+        return round(
+            MIN_SAMPLE_INTERVAL_SEC
+            + share * (MAX_SAMPLE_INTERVAL_SEC - MIN_SAMPLE_INTERVAL_SEC),
+            1,
+        )
@@ -1,5 +1,861 @@
 """Load balancer implementation"""
 
+import asyncio
+from datetime import timedelta
+import functools
+import logging
+import time
+
+import numpy
+
+from homeassistant.const import STATE_OFF, STATE_ON, STATE_UNAVAILABLE
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from ..const import (
+    DATA_BALANCERS,
+    DEFAULT_MAX_SAMPLE_AGE_SEC,
+    DEFAULT_STALE_FALLBACK_LIMIT,
+    DOMAIN,
+    FILTER_MEAN,
+    SAMPLING_MODE_ADAPTIVE,
+    SAMPLING_MODE_EVENT,
+)
+from ..exceptions import NoSensorsError
+from .allocation import ChargerDemand, PhaseAllocator
+from .calculator import MIN_SAMPLE_INTERVAL_SEC, Calculator
+from .filters import create_load_filter
+from .forecast import FORECAST_BUCKET_SEC, LoadForecast
+from .metrics import LoopMetrics
+from .phase import ElectricalPhase
+from .registry import SensorReading, SensorStream, async_get_sensor_registry
+from .samples import NOMINAL_SAMPLE_INTERVAL_SEC, PhaseSampleMatrix
+from .thermal import FuseThermalModel
+from .topology import Circuit
+
+DEFAULT_SAMPLE_INTERVAL_SEC = NOMINAL_SAMPLE_INTERVAL_SEC
+DEFAULT_WATCHDOG_INTERVAL_SEC = 30
+DEFAULT_DEBOUNCE_SEC = 1.0
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@callback
+def async_get_balancer(
+    hass: HomeAssistant,
+    phase_entities: dict[str, str],
+    rated_current: float,
+    window_size: int,
+    sampling_mode: str,
+    store=None,
+    max_sample_age: float = DEFAULT_MAX_SAMPLE_AGE_SEC,
+    stale_limit: float = DEFAULT_STALE_FALLBACK_LIMIT,
+    filter_strategy: str = FILTER_MEAN,
+    spike_threshold: float = 0.0,
+    parent: "DynamicLoadBalancer | None" = None,
+) -> "DynamicLoadBalancer":
+    """Get the balancer of the fuse measured by the given sensors
+
+    With `parent`, the fuse is behind the fuse of that balancer.
+    """
+    balancers = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_BALANCERS, {})
+    key = tuple(sorted(phase_entities.values()))
+
+    if balancer := balancers.get(key):
+        if rated_current != balancer.rated_current:
+            _LOGGER.warning(
+                "Fuse behind %s configured as both %sA and %sA, using the lower",
+                key,
+                rated_current,
+                balancer.rated_current,
+            )
+            balancer.update_rated_current(min(rated_current, balancer.rated_current))
+        if parent:
+            balancer.async_attach(parent)
+        return balancer
+
+    matrix = PhaseSampleMatrix(len(phase_entities), window_size)
+    phases = {
+        phase_id: ElectricalPhase(phase_id, entity_id, None, window_size, matrix, row)
+        for row, (phase_id, entity_id) in enumerate(phase_entities.items())
+    }
+    if store:
+        store.restore_phases(key, phases, matrix.window_sec)
+
+    balancer = DynamicLoadBalancer(
+        hass,
+        key,
+        phases,
+        rated_current,
+        sampling_mode,
+        store,
+        max_sample_age=max_sample_age,
+        stale_limit=stale_limit,
+        filter_strategy=filter_strategy,
+        spike_threshold=spike_threshold,
+    )
+    if store:
+        store.restore_forecast(key, balancer.forecast)
+    balancers[key] = balancer
+    if parent:
+        balancer.async_attach(parent)
+    return balancer
+
 
 class DynamicLoadBalancer:
-    """Dynamic load balancer"""
+    """Dynamic load balancer
+
+    Shares the headroom of one main fuse between all chargers behind it.
+    The mains are sampled once per tick regardless of the charger count;
+    a sample is the mains reading minus what the chargers draw, so the
+    filter follows the rest of the household load. The phases are rows of
+    one sample matrix, so subtraction, filtering and targets are computed
+    for all phases at once. The targets are turned into charger limits by
+    a PhaseAllocator, which knows the phases each vehicle charges from.
+
+    Sampling stops while no charger behind the fuse is charging and starts
+    again on a charger status change. In adaptive mode the sample interval
+    follows the headroom the household load leaves on the fuse. The filter
+    windows are spans of time, so they do not depend on the interval.
+
+    The mains sensors are read through the shared sensor registry, so
+    balancers with sensors in common parse and subscribe to them once.
+    Mains read directly from an MQTT topic or a Modbus meter come through
+    the registry the same way, best sampled in event mode.
+
+    Samples carry the time the meter reported them, repeated readings are
+    skipped and the charger currents are interpolated to the same time
+    before subtracting. When the mains or a charger drawing current has
+    not reported for `max_sample_age` seconds, every charger is held at
+    `stale_limit` until fresh data arrives. Only sources whose report
+    time moves on every report, see has_heartbeat, can go stale; others
+    may just be repeating their value. Stale chargers behind a
+    sub-circuit count for every fuse up to the root.
+
+    A fuse may sit behind the fuse of another balancer, e.g. a sub-panel
+    behind the main fuse. The balancers form a tree of Circuits: each
+    one subtracts the chargers of its whole subtree from its mains,
+    publishes its targets as the slack of its circuit and gives its own
+    chargers no more than every fuse up to the root has left. A fuse whose
+    mains are unavailable or stale leaves its subtree `stale_limit` per
+    charging charger. A balancer runs while it or a sub-circuit has
+    chargers registered.
+
+    The filtered load also feeds a LoadForecast of the peak household
+    load by time of day, from which `predicted_headroom` tells a charge
+    planner what the fuses will leave later.
+
+    Controllers register with `async_register` and need `charger`,
+    `unique_id` and `charge_limit` attributes and an
+    `async_update_allocation(state, targets)` callback. A `charge_limit`
+    other than None, e.g. a planned current, caps what the charger gets.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        key: tuple,
+        phases: dict[str, ElectricalPhase],
+        rated_current: float,
+        sampling_mode: str,
+        store=None,
+        max_sample_age: float = DEFAULT_MAX_SAMPLE_AGE_SEC,
+        stale_limit: float = DEFAULT_STALE_FALLBACK_LIMIT,
+        filter_strategy: str = FILTER_MEAN,
+        spike_threshold: float = 0.0,
+    ) -> None:
+        self.hass = hass
+        self._store = store
+        self._key = key
+        self._phases = phases
+        self._phase_rows = sorted(phases.values(), key=lambda p: p.row)
+        self._matrix = self._phase_rows[0].matrix if phases else None
+        self._streams: list[SensorStream] = []
+        load_filter = None
+        if self._matrix:
+            load_filter = create_load_filter(
+                filter_strategy, self._matrix, spike_threshold
+            )
+            load_filter.warm_up()
+        self._calculator = Calculator(_LOGGER, rated_current, load_filter)
+        self._forecast = LoadForecast(len(phases))
+        self._thermal = {
+            phase_id: FuseThermalModel(rated_current) for phase_id in phases
+        }
+        self._protecting: set[str] = set()
+        self._metrics = LoopMetrics()
+        self._tick_running = False
+        self._last_measurements: dict[str, float] = {}
+        self._sampling_mode = sampling_mode
+        self._controllers: list = []
+        self._unsubs: list[CALLBACK_TYPE] = []
+        self._available = True
+        # phases whose latest reading was unusable
+        self._unavailable: set[str] = set()
+        # phases whose latest reading came with a heartbeat
+        self._heartbeats: set[str] = set()
+        self._idle = False
+        self._last_sample = 0.0
+        self._sample_interval: float | None = None
+        self._cancel_update: CALLBACK_TYPE | None = None
+        self._max_sample_age = max_sample_age
+        self._stale_limit = stale_limit
+        self._stale: list[str] = []
+        self._allocator = PhaseAllocator()
+        self._circuit = Circuit(key)
+        self._parent: DynamicLoadBalancer | None = None
+        self._children: list[DynamicLoadBalancer] = []
+        self._running = False
+        self._debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=DEFAULT_DEBOUNCE_SEC,
+            immediate=True,
+            function=self._async_recalculate,
+        )
+
+    @property
+    def key(self) -> tuple:
+        """Mains sensor entity ids identifying the fuse"""
+        return self._key
+
+    @property
+    def rated_current(self) -> float:
+        """Rated current of the main fuse"""
+        return self._calculator.rated_current
+
+    @property
+    def phases(self) -> dict[str, ElectricalPhase]:
+        """Phase data of the mains"""
+        return self._phases
+
+    @property
+    def controllers(self) -> list:
+        """Registered controllers"""
+        return self._controllers
+
+    @property
+    def parent(self) -> "DynamicLoadBalancer | None":
+        """Balancer of the fuse in front of this one"""
+        return self._parent
+
+    @property
+    def children(self) -> list["DynamicLoadBalancer"]:
+        """Running balancers of the fuses behind this one"""
+        return self._children
+
+    @property
+    def circuit(self) -> Circuit:
+        """Place of the fuse in the site's fuse tree"""
+        return self._circuit
+
+    @property
+    def metrics(self) -> LoopMetrics:
+        """Control loop instrumentation"""
+        return self._metrics
+
+    @property
+    def sample_interval(self) -> float | None:
+        """Seconds between samples in effect, None while not polling"""
+        return None if self._idle else self._sample_interval
+
+    def sample_ages(self) -> dict[str, float | None]:
+        """Seconds since the last sample on each phase"""
+        now = time.time()
+        return {
+            phase_id: (
+                now - phase_data.latest_sample_time if phase_data.sample_count else None
+            )
+            for phase_id, phase_data in self._phases.items()
+        }
+
+    @property
+    def stale_sources(self) -> list[str]:
+        """Sources too old to balance on at the last tick"""
+        return self._stale
+
+    @property
+    def calculator(self) -> Calculator:
+        """Target current calculator with its load filter"""
+        return self._calculator
+
+    @property
+    def forecast(self) -> LoadForecast:
+        """Household load by time of day, learnt from the samples"""
+        return self._forecast
+
+    def predicted_headroom(
+        self, start: float, end: float, phases: tuple[str, ...]
+    ) -> float | None:
+        """Lowest target current predicted on `phases` between two times
+
+        Also bounded by the fuses in front. None until every quarter hour
+        in between can be predicted somehow, i.e. before any history.
+        """
+        headroom = None
+        timestamp = start
+        while timestamp < end:
+            if (loads := self._forecast.predict(timestamp)) is None:
+                return None
+            for phase_data in self._phase_rows:
+                if phase_data.phase_id in phases:
+                    target = self._calculator.calculate_target_current(
+                        loads[phase_data.row]
+                    )
+                    headroom = target if headroom is None else min(headroom, target)
+            timestamp += FORECAST_BUCKET_SEC
+
+        if self._parent:
+            parent = self._parent.predicted_headroom(start, end, phases)
+            if parent is None:
+                return None
+            headroom = parent if headroom is None else min(headroom, parent)
+        return headroom
+
+    @property
+    def single_phase_chargers(self) -> list[str]:
+        """Chargers switched to a single phase"""
+        return self._allocator.single_phase
+
+    @property
+    def fuse_usage(self) -> dict[str, float]:
+        """Share of the I²t budget used on each phase"""
+        return {phase_id: model.usage for phase_id, model in self._thermal.items()}
+
+    def update_rated_current(self, rated_current: float) -> None:
+        """Sets the rated current of the main fuse"""
+        self._calculator.update_rated_current(rated_current)
+        for model in self._thermal.values():
+            model.update_rated_current(rated_current)
+
+    @callback
+    def async_register(self, controller) -> CALLBACK_TYPE:
+        """Add a controller to the balancing, returns a callable to remove it"""
+        self._controllers.append(controller)
+        unsub_status = controller.charger.async_add_status_listener(
+            self._async_charger_status_changed
+        )
+        self._async_update_running()
+
+        @callback
+        def unregister() -> None:
+            if self._store:
+                self._store.async_save_balancer(self)
+
+            unsub_status()
+            self._controllers.remove(controller)
+            self._async_update_running()
+
+        return unregister
+
+    @callback
+    def async_attach(self, parent: "DynamicLoadBalancer") -> None:
+        """Put the fuse behind the fuse of `parent`"""
+        if parent is self._parent:
+            return
+        if self._parent:
+            _LOGGER.warning(
+                "Fuse behind %s configured behind both %s and %s, using the first",
+                self._key,
+                self._parent.key,
+                parent.key,
+            )
+            return
+
+        try:
+            self._circuit.attach(parent.circuit)
+        except ValueError as err:
+            _LOGGER.warning("Cannot put fuse behind %s there: %s", self._key, err)
+            return
+
+        self._parent = parent
+        if self._running:
+            parent._async_add_child(self)
+
+    @callback
+    def _async_add_child(self, child: "DynamicLoadBalancer") -> None:
+        self._children.append(child)
+        self._async_update_running()
+
+    @callback
+    def _async_remove_child(self, child: "DynamicLoadBalancer") -> None:
+        self._children.remove(child)
+        self._async_update_running()
+
+    @callback
+    def _async_update_running(self) -> None:
+        """Start with the first charger behind the fuse, stop after the last"""
+        running = bool(self._controllers or self._children)
+        if running == self._running:
+            return
+
+        self._running = running
+        if running:
+            self._async_start()
+            if self._parent:
+                self._parent._async_add_child(self)
+            return
+
+        self._async_stop()
+        self._circuit.claim({})
+        self.hass.data[DOMAIN][DATA_BALANCERS].pop(self._key, None)
+        if self._parent:
+            self._circuit.detach()
+            self._parent._async_remove_child(self)
+            self._parent = None
+
+    @callback
+    def _async_start(self) -> None:
+        registry = async_get_sensor_registry(self.hass)
+        self._streams = [
+            registry.async_acquire(phase_data.entity_id)
+            for phase_data in self._phase_rows
+        ]
+
+        if self._sampling_mode == SAMPLING_MODE_EVENT:
+            # Samples arrive with the meter, the timer only covers silent meters
+            for phase_data, stream in zip(self._phase_rows, self._streams):
+                self._unsubs.append(
+                    stream.async_add_listener(
+                        functools.partial(self._async_phase_reading, phase_data)
+                    )
+                )
+            self._unsubs.append(self._debouncer.async_cancel)
+            self._unsubs.append(
+                async_track_time_interval(
+                    self.hass,
+                    self._async_watchdog,
+                    timedelta(seconds=DEFAULT_WATCHDOG_INTERVAL_SEC),
+                )
+            )
+        elif self._sampling_mode == SAMPLING_MODE_ADAPTIVE:
+            self._async_schedule_update(DEFAULT_SAMPLE_INTERVAL_SEC)
+            self._unsubs.append(self._async_cancel_update)
+        else:
+            self._sample_interval = DEFAULT_SAMPLE_INTERVAL_SEC
+            self._unsubs.append(
+                async_track_time_interval(
+                    self.hass,
+                    self._async_update,
+                    timedelta(seconds=DEFAULT_SAMPLE_INTERVAL_SEC),
+                )
+            )
+
+    @callback
+    def _async_stop(self) -> None:
+        while self._unsubs:
+            self._unsubs.pop()()
+
+        registry = async_get_sensor_registry(self.hass)
+        while self._streams:
+            registry.async_release(self._streams.pop())
+
+    @callback
+    def _async_schedule_update(self, delay: float) -> None:
+        self._async_cancel_update()
+        self._sample_interval = delay
+        self._cancel_update = async_call_later(self.hass, delay, self._async_update)
+
+    @callback
+    def _async_cancel_update(self) -> None:
+        if self._cancel_update:
+            self._cancel_update()
+            self._cancel_update = None
+
+    async def _async_update(self, now=None):
+        if self._idle:
+            return
+
+        await self._async_tick(self._update_phase_currents)
+        if self._sampling_mode == SAMPLING_MODE_ADAPTIVE and not self._idle:
+            self._async_schedule_update(self._next_interval())
+
+    def _next_interval(self) -> float:
+        """Sample faster the closer the household load is to the rating
+
+        The chargers are left out, they follow their limits up to the
+        rating, so counting them would keep the interval at its shortest
+        whenever a car charges.
+        """
+        if not self._available:
+            return DEFAULT_SAMPLE_INTERVAL_SEC
+        if self._protecting:
+            return MIN_SAMPLE_INTERVAL_SEC
+
+        loads = self._calculator.filtered_loads()
+        return self._calculator.sample_interval(float(loads.max()))
+
+    @callback
+    def _async_charger_status_changed(self) -> None:
+        """Sample now, waking the balancer if it was idle."""
+        if self._idle:
+            _LOGGER.debug("Charger status changed, resuming sampling")
+            self._idle = False
+            self._drop_stale_samples()
+
+        self.hass.async_create_task(self._async_update())
+        if self._parent:
+            self._parent._async_charger_status_changed()
+
+    def _drop_stale_samples(self) -> None:
+        """Forget samples too old to describe the load after a pause."""
+        max_age = self._matrix.window_sec
+        ages = [age for age in self.sample_ages().values() if age is not None]
+        if ages and min(ages) > max_age:
+            self._matrix.clear()
+            self._calculator.load_filter.reset()
+
+    async def _async_tick(self, update) -> None:
+        """Run `update` and balance, unless the previous tick is still busy."""
+        if self._tick_running:
+            self._metrics.skipped_ticks += 1
+            _LOGGER.debug("Previous tick still running, skipping")
+            return
+
+        self._tick_running = True
+        start = time.perf_counter()
+        try:
+            update()
+            allocations = await self._async_balance()
+        finally:
+            self._tick_running = False
+
+        self._metrics.record_tick(
+            (time.perf_counter() - start) * 1000, self._trace(allocations)
+        )
+        if self._store:
+            self._store.async_schedule_save()
+
+    def _trace(self, allocations: dict[str, dict[str, int]]) -> dict:
+        loads = self._calculator.filtered_loads().tolist() if self._matrix else []
+        return {
+            "time": time.time(),
+            "available": self._available,
+            "stale": list(self._stale),
+            "single_phase": self._allocator.single_phase,
+            "measured": dict(self._last_measurements),
+            "filtered": {
+                phase_data.phase_id: round(loads[phase_data.row], 2)
+                for phase_data in self._phase_rows
+            },
+            "targets": {
+                phase_id: phase_data.target_current
+                for phase_id, phase_data in self._phases.items()
+            },
+            "allocations": allocations,
+        }
+
+    @callback
+    def _async_phase_reading(self, phase_data, reading: SensorReading | None) -> None:
+        """Push a new meter reading into its phase buffer."""
+        if self._idle:
+            return
+
+        if self._add_phase_sample(phase_data, reading):
+            self._unavailable.discard(phase_data.phase_id)
+        else:
+            self._unavailable.add(phase_data.phase_id)
+        self._available = not self._unavailable
+        self._debouncer.async_schedule_call()
+
+    async def _async_recalculate(self):
+        """Recalculate targets from the samples batched since the last run."""
+        await self._async_tick(self._update_targets_if_available)
+
+    def _update_targets_if_available(self):
+        if self._available:
+            self._update_targets()
+
+    async def _async_watchdog(self, now=None):
+        """Fall back to polling when no meter update arrived in time."""
+        if time.monotonic() - self._last_sample < DEFAULT_WATCHDOG_INTERVAL_SEC:
+            return
+
+        _LOGGER.debug("No phase updates in %ss, polling", DEFAULT_WATCHDOG_INTERVAL_SEC)
+        await self._async_update()
+
+    def _charger_currents(self, timestamps: list[float] | None = None) -> list[float]:
+        """Total current drawn by the registered chargers, by matrix row
+
+        With `timestamps`, each row is taken at its own time.
+        """
+        totals = [0.0] * len(self._phase_rows)
+        for controller in self._subtree_controllers():
+            charger = controller.charger
+            currents = charger.phase_currents
+            for phase_data in self._phase_rows:
+                if timestamps is not None:
+                    currents = charger.phase_currents_at(timestamps[phase_data.row])
+                totals[phase_data.row] += currents.get(phase_data.phase_id, 0.0)
+
+        return totals
+
+    def _subtree_controllers(self) -> list:
+        """Controllers behind the fuse, here and in the sub-circuits"""
+        controllers = list(self._controllers)
+        for child in self._children:
+            controllers.extend(child._subtree_controllers())
+        return controllers
+
+    def _is_duplicate(self, phase_data, timestamp: float) -> bool:
+        """True if the phase already has a sample reported at `timestamp`"""
+        latest = phase_data.latest_sample_time
+        if latest is not None and timestamp <= latest:
+            self._metrics.duplicate_samples += 1
+            return True
+        return False
+
+    def _read_measurement(self, phase_data, reading: SensorReading | None) -> bool:
+        """Record a mains reading of a phase, False if it is unusable."""
+        if reading is None:
+            self._metrics.unavailable_events += 1
+            return False
+
+        self._last_measurements[phase_data.phase_id] = reading.value
+        if reading.heartbeat:
+            self._heartbeats.add(phase_data.phase_id)
+        else:
+            self._heartbeats.discard(phase_data.phase_id)
+        return True
+
+    def _add_phase_sample(self, phase_data, reading: SensorReading | None) -> bool:
+        """Add a sample from a phase sensor reading, False if it is unusable."""
+        if not self._read_measurement(phase_data, reading):
+            return False
+
+        measurement, timestamp, _ = reading
+        now = time.monotonic()
+        self._thermal[phase_data.phase_id].update(measurement, now)
+        self._last_sample = now
+
+        if self._is_duplicate(phase_data, timestamp):
+            return True
+
+        charger_currents = self._charger_currents([timestamp] * len(self._phase_rows))
+        self._push_sample(
+            phase_data, measurement - charger_currents[phase_data.row], timestamp
+        )
+        return True
+
+    def _push_sample(self, phase_data, value: float, timestamp: float) -> None:
+        phase_data.add_sample(value, timestamp)
+        self._calculator.load_filter.observe(phase_data.row, value, timestamp)
+
+    def _update_targets(self):
+        """Recalculate the current available to chargers on each phase."""
+        loads = self._calculator.filtered_loads()
+        targets = self._calculator.calculate_targets(loads).tolist()
+        _LOGGER.debug("Filtered targets: %s", targets)
+        self._forecast.observe(loads.tolist(), time.time())
+
+        for phase_data in self._phase_rows:
+            new_target = targets[phase_data.row]
+
+            thermal = self._thermal[phase_data.phase_id]
+            if thermal.protecting != (phase_data.phase_id in self._protecting):
+                self._log_protection(phase_data.phase_id, thermal)
+
+            if thermal.protecting:
+                # no time left to wait for the mean, act on the last reading
+                new_target = min(
+                    new_target,
+                    self._calculator.calculate_target_current(phase_data.latest_sample),
+                )
+
+            if phase_data.target_current != new_target:
+                _LOGGER.debug(
+                    "New target current on %s, %s -> %s",
+                    phase_data.phase_id,
+                    phase_data.target_current,
+                    new_target,
+                )
+                phase_data.update_target(new_target)
+
+        self._circuit.update_slack(
+            {
+                phase_data.phase_id: phase_data.target_current
+                for phase_data in self._phase_rows
+            }
+        )
+
+    def _log_protection(self, phase_id: str, thermal: FuseThermalModel) -> None:
+        if thermal.protecting:
+            self._protecting.add(phase_id)
+            _LOGGER.warning(
+                "Fuse phase %s at %.0f%% of its I²t budget, bypassing filter",
+                phase_id,
+                thermal.usage * 100,
+            )
+        else:
+            self._protecting.discard(phase_id)
+            _LOGGER.info("Fuse phase %s cooled down, filtering again", phase_id)
+
+    def _update_phase_currents(self):
+        """Update local phase currents from source sensors."""
+        if not self._phases:
+            raise NoSensorsError("Phase sensor(s) not available")
+
+        now = time.monotonic()
+        measurements = []
+        timestamps = []
+        for phase_data, stream in zip(self._phase_rows, self._streams):
+            reading = stream.read()
+            if not self._read_measurement(phase_data, reading):
+                self._unavailable.add(phase_data.phase_id)
+                self._available = False
+                return
+
+            self._thermal[phase_data.phase_id].update(reading.value, now)
+            measurements.append(reading.value)
+            timestamps.append(reading.reported)
+
+        fresh = [
+            not self._is_duplicate(phase_data, timestamps[phase_data.row])
+            for phase_data in self._phase_rows
+        ]
+        if all(fresh):
+            values = numpy.subtract(measurements, self._charger_currents(timestamps))
+            timestamps = numpy.array(timestamps)
+            self._matrix.push_all(values, timestamps)
+            self._calculator.load_filter.observe_all(values, timestamps)
+        elif any(fresh):
+            charger_currents = self._charger_currents(timestamps)
+            for phase_data in self._phase_rows:
+                row = phase_data.row
+                if fresh[row]:
+                    self._push_sample(
+                        phase_data,
+                        measurements[row] - charger_currents[row],
+                        timestamps[row],
+                    )
+
+        self._last_sample = now
+        self._unavailable.clear()
+        self._available = True
+        self._update_targets()
+
+    def _allocate(self, controllers: list) -> list[dict[str, int]]:
+        """Split what the fuses leave between the given controllers."""
+        headroom = self._circuit.headroom(self._phases)
+        headroom = {phase_id: headroom.get(phase_id, 0) for phase_id in self._phases}
+        demands = []
+        for controller in controllers:
+            charger = controller.charger
+            limit = charger.rated_current or self.rated_current
+            if self._stale:
+                limit = min(limit, self._stale_limit)
+            if (planned := controller.charge_limit) is not None:
+                limit = min(limit, planned)
+            demands.append(
+                ChargerDemand(
+                    controller.unique_id,
+                    limit,
+                    tuple(phase for phase in charger.phases if phase in headroom),
+                    charger.phase_currents,
+                    charger.phase_switching,
+                )
+            )
+
+        allocations = self._allocator.allocate(headroom, demands, time.monotonic())
+        claim = dict.fromkeys(self._phases, 0)
+        for demand, allocation in zip(demands, allocations):
+            # only what the vehicle can draw counts against the fuses
+            for phase_id in self._allocator.drawn_phases(demand):
+                claim[phase_id] += allocation[phase_id]
+        self._circuit.claim(claim)
+        return allocations
+
+    def _hold_slack(self, charging: int) -> None:
+        """Leave the subtree `stale_limit` per charging charger"""
+        self._circuit.update_slack(
+            dict.fromkeys(self._phases, charging * self._stale_limit)
+        )
+
+    def _find_stale(self, charging: list) -> list[str]:
+        """Entity ids of the mains sensors and charging chargers gone quiet
+
+        A charger reporting no current is left out, a charger waiting to
+        start or paused by the car has no reason to report.
+        """
+        if not self._max_sample_age:
+            return []
+
+        oldest = time.time() - self._max_sample_age
+        stale = [
+            phase_data.entity_id
+            for phase_data in self._phase_rows
+            if phase_data.phase_id in self._heartbeats
+            and (latest := phase_data.latest_sample_time) is not None
+            and latest < oldest
+        ]
+        stale.extend(
+            controller.unique_id
+            for controller in charging
+            if (reported := controller.charger.currents_reported) is not None
+            and reported < oldest
+            and any(controller.charger.phase_currents.values())
+        )
+        return stale
+
+    def _update_stale(self, charging: list) -> None:
+        stale = self._find_stale(charging)
+        if stale and not self._stale:
+            _LOGGER.warning(
+                "No data from %s in %ss, limiting chargers to %sA",
+                ", ".join(stale),
+                self._max_sample_age,
+                self._stale_limit,
+            )
+        elif self._stale and not stale:
+            _LOGGER.info("Sensor data fresh again, balancing normally")
+        self._stale = stale
+
+    async def _async_balance(self) -> dict[str, dict[str, int]]:
+        """Send each charging controller its share, returns the shares."""
+        subtree_charging = [
+            c for c in self._subtree_controllers() if c.charger.charging
+        ]
+        if not self._available:
+            _LOGGER.warning("Sensors unavailable, cannot do load balancing")
+            self._hold_slack(len(subtree_charging))
+            for controller in self._controllers:
+                controller.async_update_allocation(STATE_UNAVAILABLE, None)
+            return {}
+
+        self._update_stale(subtree_charging)
+        if self._stale:
+            self._hold_slack(len(subtree_charging))
+
+        charging = [c for c in self._controllers if c.charger.charging]
+        for controller in self._controllers:
+            if controller not in charging:
+                self._allocator.forget(controller.unique_id)
+                controller.async_update_allocation(STATE_OFF, None)
+
+        if not charging:
+            self._circuit.claim({})
+            if not subtree_charging:
+                _LOGGER.debug("No charging detected, sampling stopped")
+                self._idle = True
+            return {}
+
+        _LOGGER.debug("Charging detected on %s charger(s), balancing", len(charging))
+        allocations = self._allocate(charging)
+        results = await asyncio.gather(
+            *(
+                controller.charger.update_limits(allocation)
+                for controller, allocation in zip(charging, allocations)
+            ),
+            return_exceptions=True,
+        )
+
+        for controller, allocation, result in zip(charging, allocations, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Load balancing update failed: %s", result)
+            controller.async_update_allocation(STATE_ON, allocation)
+
+        return {
+            controller.unique_id: allocation
+            for controller, allocation in zip(charging, allocations)
+        }
@@ -0,0 +1,510 @@
+"""Mains readings straight from the meter, bypassing the state machine
+
+A phase source configured as `mqtt:<topic>` or `modbus://...` instead of
+a sensor entity id is read here. The readings go into the phase buffers
+without becoming entity states, so they are neither limited by another
+integration's polling nor written to the recorder.
+
+    mqtt:<topic>                    payload is the current
+    mqtt:<topic>#<key>.<key>        current at that path of a JSON payload
+    modbus://<host>[:<port>]/<unit>/<register>[?type=&scale=&function=&interval=]
+
+Modbus values are float32 input registers read once a second unless the
+query says otherwise. Sources on the same topic or the same Modbus unit
+share one subscription or one connection, and the registers of a unit
+are fetched in as few requests as fit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections.abc import Callable
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from ..const import SOURCE_MODBUS, SOURCE_MQTT
+from .registry import SensorReading
+
+DEFAULT_MODBUS_PORT = 502
+DEFAULT_POLL_INTERVAL_SEC = 1.0
+MIN_POLL_INTERVAL_SEC = 0.1
+MODBUS_TIMEOUT_SEC = 2
+RECONNECT_DELAY_SEC = 10
+# registers a single read request may return
+MAX_REGISTERS = 125
+
+MODBUS_FUNCTIONS = {"holding": 3, "input": 4}
+MODBUS_TYPES = {
+    "int16": struct.Struct(">h"),
+    "uint16": struct.Struct(">H"),
+    "int32": struct.Struct(">i"),
+    "uint32": struct.Struct(">I"),
+    "float32": struct.Struct(">f"),
+}
+# transaction id, protocol, length, unit, function, first register, count
+READ_REQUEST = struct.Struct(">HHHBBHH")
+# transaction id, protocol, length, unit
+MBAP_HEADER = struct.Struct(">HHHB")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MqttSource(NamedTuple):
+    """Parsed `mqtt:` source"""
+
+    topic: str
+    path: tuple[str, ...]
+
+
+class ModbusSource(NamedTuple):
+    """Parsed `modbus://` source"""
+
+    host: str
+    port: int
+    unit: int
+    function: int
+    register: int
+    data_type: struct.Struct
+    scale: float
+    interval: float
+
+
+class ModbusError(Exception):
+    """Raised when the meter answers with an exception or a bad frame"""
+
+
+def parse_source(source: str) -> MqttSource | ModbusSource:
+    """Parse a direct source, raises ValueError if it is malformed"""
+    if source.startswith(SOURCE_MQTT):
+        topic, _, path = source[len(SOURCE_MQTT) :].partition("#")
+        if not topic or "+" in topic or "#" in topic:
+            raise ValueError(f"{source}: one topic without wildcards expected")
+        return MqttSource(topic, tuple(path.split(".")) if path else ())
+
+    if not source.startswith(SOURCE_MODBUS):
+        raise ValueError(f"{source}: not an mqtt: or modbus:// source")
+
+    url = urlsplit(source)
+    parts = url.path.strip("/").split("/")
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    try:
+        if not url.hostname or len(parts) != 2:
+            raise ValueError("modbus://<host>[:<port>]/<unit>/<register> expected")
+        function = query.get("function", "input")
+        if function not in MODBUS_FUNCTIONS:
+            raise ValueError(f"function must be one of {', '.join(MODBUS_FUNCTIONS)}")
+        data_type = query.get("type", "float32")
+        if data_type not in MODBUS_TYPES:
+            raise ValueError(f"type must be one of {', '.join(MODBUS_TYPES)}")
+        unit, register = int(parts[0]), int(parts[1])
+        if not 0 <= unit <= 255 or not 0 <= register <= 0xFFFF:
+            raise ValueError("unit 0-255 and register 0-65535 expected")
+        return ModbusSource(
+            url.hostname,
+            url.port or DEFAULT_MODBUS_PORT,
+            unit,
+            MODBUS_FUNCTIONS[function],
+            register,
+            MODBUS_TYPES[data_type],
+            float(query.get("scale", 1)),
+            max(
+                float(query.get("interval", DEFAULT_POLL_INTERVAL_SEC)),
+                MIN_POLL_INTERVAL_SEC,
+            ),
+        )
+    except ValueError as err:
+        raise ValueError(f"{source}: {err}") from err
+
+
+class DirectStream:
+    """One direct source, read like a SensorStream
+
+    `read` returns the last reading the meter connection pushed, None
+    while the source has no usable value.
+    """
+
+    __slots__ = ("entity_id", "refs", "meter", "_reading", "_listeners")
+
+    def __init__(self, entity_id: str) -> None:
+        self.entity_id = entity_id
+        self.refs = 0
+        self.meter: MqttMeter | ModbusMeter | None = None
+        self._reading: SensorReading | None = None
+        # a tuple, so pushing a reading needs no copy to iterate
+        self._listeners: tuple[Callable[[SensorReading | None], None], ...] = ()
+
+    @property
+    def listener_count(self) -> int:
+        """Number of subscribed listeners"""
+        return len(self._listeners)
+
+    def read(self) -> SensorReading | None:
+        """Last reading of the source, None if it is unusable"""
+        return self._reading
+
+    @callback
+    def async_add_listener(
+        self, listener: Callable[[SensorReading | None], None]
+    ) -> CALLBACK_TYPE:
+        """Call `listener` with every new reading, returns a callable to stop"""
+        self._listeners += (listener,)
+
+        @callback
+        def remove() -> None:
+            listeners = list(self._listeners)
+            listeners.remove(listener)
+            self._listeners = tuple(listeners)
+
+        return remove
+
+    @callback
+    def async_push(self, value: float | None, reported: float) -> None:
+        """Take a reading from the meter, None if it was unusable"""
+        if value is None:
+            if self._reading is None:
+                return
+            self._reading = None
+        else:
+            self._reading = SensorReading(value, reported, True)
+        for listener in self._listeners:
+            listener(self._reading)
+
+
+def _mqtt_client():
+    """Home Assistant's MQTT integration, imported on first use"""
+    # an optional dependency, not every site has MQTT set up
+    from homeassistant.components import mqtt
+
+    return mqtt
+
+
+class MqttMeter:
+    """Subscription to one topic, feeding the sources reading it
+
+    The payload is parsed once per message however many phases it
+    carries.
+    """
+
+    def __init__(self, hass: HomeAssistant, topic: str) -> None:
+        self.hass = hass
+        self.topic = topic
+        self.key = (topic,)
+        self._streams: list[tuple[DirectStream, tuple[str, ...]]] = []
+        self._json = False
+        self._task: asyncio.Task | None = None
+        self._unsub: CALLBACK_TYPE | None = None
+        self.messages = 0
+
+    @property
+    def empty(self) -> bool:
+        """True once no source reads the topic"""
+        return not self._streams
+
+    @callback
+    def async_add(self, stream: DirectStream, source: MqttSource) -> None:
+        """Feed `stream` from the topic"""
+        self._streams.append((stream, source.path))
+        self._json = self._json or bool(source.path)
+        if not self._task:
+            self._task = self.hass.async_create_background_task(
+                self._async_subscribe(), f"{__name__} {self.topic}"
+            )
+
+    @callback
+    def async_remove(self, stream: DirectStream) -> None:
+        """Stop feeding `stream`, unsubscribing after the last source"""
+        self._streams = [entry for entry in self._streams if entry[0] is not stream]
+        self._json = any(path for _, path in self._streams)
+        if self._streams:
+            return
+
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    async def _async_subscribe(self) -> None:
+        try:
+            mqtt = _mqtt_client()
+        except ImportError as err:
+            _LOGGER.error("Cannot read %s, MQTT is not available: %s", self.topic, err)
+            return
+
+        if not await mqtt.async_wait_for_mqtt_client(self.hass):
+            _LOGGER.error("Cannot read %s, MQTT is not set up", self.topic)
+            return
+
+        # raw payload, float() and json.loads() take bytes
+        self._unsub = await mqtt.async_subscribe(
+            self.hass, self.topic, self._async_message, encoding=None
+        )
+        _LOGGER.debug("Reading phase currents from MQTT topic %s", self.topic)
+
+    def as_dict(self) -> dict:
+        """Subscription state, for diagnostics"""
+        return {"subscribed": self._unsub is not None, "messages": self.messages}
+
+    @callback
+    def _async_message(self, msg) -> None:
+        now = time.time()
+        self.messages += 1
+        payload = msg.payload
+        document = None
+        if self._json:
+            try:
+                document = json.loads(payload)
+            except ValueError:
+                pass
+
+        for stream, path in self._streams:
+            try:
+                value = payload
+                if path:
+                    value = document
+                    for key in path:
+                        value = value[int(key) if isinstance(value, list) else key]
+                value = float(value)
+            except (KeyError, IndexError, TypeError, ValueError):
+                if stream.read() is not None:
+                    _LOGGER.warning("No current in %s: %s", stream.entity_id, payload)
+                value = None
+            stream.async_push(value, now)
+
+
+class ModbusMeter:
+    """Connection to one Modbus-TCP unit, polling the sources on it
+
+    The registers of all sources are read together, in as few requests
+    as fit, at the shortest interval any source asks for. Each value is
+    unpacked in place from the response. While the meter cannot be
+    reached its sources are unusable and the connection is retried.
+    """
+
+    def __init__(self, hass: HomeAssistant, host: str, port: int, unit: int) -> None:
+        self.hass = hass
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.key = (host, port, unit)
+        self._sources: list[tuple[DirectStream, ModbusSource]] = []
+        # (function, first register, count, request frame, sources in it)
+        self._requests: list[tuple[int, int, int, bytearray, list]] = []
+        self._interval = DEFAULT_POLL_INTERVAL_SEC
+        self._transaction = 0
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._failing = False
+        self.polls = 0
+        self.errors = 0
+        self.last_error: str | None = None
+
+    @property
+    def empty(self) -> bool:
+        """True once no source reads the unit"""
+        return not self._sources
+
+    @callback
+    def async_add(self, stream: DirectStream, source: ModbusSource) -> None:
+        """Poll `source` into `stream`"""
+        self._sources.append((stream, source))
+        self._plan()
+        if not self._task:
+            self._task = self.hass.async_create_background_task(
+                self._async_poll(), f"{__name__} {self.host}:{self.port}/{self.unit}"
+            )
+
+    @callback
+    def async_remove(self, stream: DirectStream) -> None:
+        """Stop polling `stream`, disconnecting after the last source"""
+        self._sources = [entry for entry in self._sources if entry[0] is not stream]
+        self._plan()
+        if self._sources:
+            return
+
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._close()
+
+    def _plan(self) -> None:
+        """Group the registers into read requests"""
+        self._requests = []
+        for stream, source in sorted(
+            self._sources, key=lambda entry: (entry[1].function, entry[1].register)
+        ):
+            end = source.register + source.data_type.size // 2
+            if self._requests:
+                function, first, count, frame, sources = self._requests[-1]
+                if function == source.function and end - first <= MAX_REGISTERS:
+                    self._requests[-1] = (
+                        function,
+                        first,
+                        max(count, end - first),
+                        frame,
+                        sources + [(stream, source)],
+                    )
+                    continue
+            self._requests.append(
+                (
+                    source.function,
+                    source.register,
+                    end - source.register,
+                    bytearray(READ_REQUEST.size),
+                    [(stream, source)],
+                )
+            )
+        self._interval = min(
+            (source.interval for _, source in self._sources),
+            default=DEFAULT_POLL_INTERVAL_SEC,
+        )
+
+    async def _async_poll(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                async with asyncio.timeout(MODBUS_TIMEOUT_SEC):
+                    await self._async_read()
+            except (OSError, TimeoutError, EOFError, ModbusError) as err:
+                self._fail(err)
+                await asyncio.sleep(RECONNECT_DELAY_SEC)
+                continue
+            except Exception as err:  # pylint: disable=broad-except
+                # keep polling whatever the meter sends
+                _LOGGER.exception(
+                    "Unexpected error reading Modbus meter %s:%s", self.host, self.port
+                )
+                self._fail(err)
+                await asyncio.sleep(RECONNECT_DELAY_SEC)
+                continue
+
+            if self._failing:
+                _LOGGER.info("Modbus meter %s:%s back", self.host, self.port)
+                self._failing = False
+                self.last_error = None
+            await asyncio.sleep(max(self._interval - (time.monotonic() - started), 0))
+
+    async def _async_read(self) -> None:
+        if not self._writer:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+            _LOGGER.debug("Connected to Modbus meter %s:%s", self.host, self.port)
+
+        for function, first, count, frame, sources in self._requests:
+            self._transaction = (self._transaction + 1) & 0xFFFF
+            READ_REQUEST.pack_into(
+                frame, 0, self._transaction, 0, 6, self.unit, function, first, count
+            )
+            self._writer.write(frame)
+            await self._writer.drain()
+            transaction, protocol, length, _ = MBAP_HEADER.unpack(
+                await self._reader.readexactly(MBAP_HEADER.size)
+            )
+            if length < 3:
+                # unit id, function code and at least one byte of data
+                raise ModbusError(f"Frame of {length} bytes")
+            pdu = await self._reader.readexactly(length - 1)
+            if transaction != self._transaction or protocol:
+                raise ModbusError(f"Unexpected frame {transaction}/{protocol}")
+            if pdu[0] & 0x7F != function:
+                raise ModbusError(f"Answer to function {pdu[0] & 0x7F}")
+            if pdu[0] & 0x80:
+                raise ModbusError(f"Exception {pdu[1]} reading register {first}")
+            if pdu[1] != count * 2 or len(pdu) != 2 + count * 2:
+                raise ModbusError(f"{len(pdu) - 2} bytes for {count} registers")
+
+            now = time.time()
+            for stream, source in sources:
+                (value,) = source.data_type.unpack_from(
+                    pdu, 2 + (source.register - first) * 2
+                )
+                stream.async_push(value * source.scale, now)
+        self.polls += 1
+
+    def as_dict(self) -> dict:
+        """Connection state and counters, for diagnostics"""
+        return {
+            "connected": self._writer is not None,
+            "interval": self._interval,
+            "requests": len(self._requests),
+            "polls": self.polls,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+    def _fail(self, err: Exception) -> None:
+        self.errors += 1
+        self.last_error = str(err) or type(err).__name__
+        if not self._failing:
+            _LOGGER.warning(
+                "Cannot read Modbus meter %s:%s, retrying in %ss: %s",
+                self.host,
+                self.port,
+                RECONNECT_DELAY_SEC,
+                self.last_error,
+            )
+            self._failing = True
+        self._close()
+        for stream, _ in self._sources:
+            stream.async_push(None, 0.0)
+
+    def _close(self) -> None:
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class DirectMeters:
+    """Meter connections, shared by the direct sources on them"""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._meters: dict[tuple, MqttMeter | ModbusMeter] = {}
+
+    @property
+    def meters(self) -> dict[tuple, MqttMeter | ModbusMeter]:
+        """Open subscriptions and connections"""
+        return self._meters
+
+    @callback
+    def async_open(self, entity_id: str) -> DirectStream:
+        """Stream of a direct source, unusable if the source is malformed"""
+        stream = DirectStream(entity_id)
+        try:
+            source = parse_source(entity_id)
+        except ValueError as err:
+            _LOGGER.error("Cannot read phase current from %s", err)
+            return stream
+
+        if isinstance(source, MqttSource):
+            key = (source.topic,)
+            if not (meter := self._meters.get(key)):
+                meter = self._meters[key] = MqttMeter(self.hass, source.topic)
+        else:
+            key = (source.host, source.port, source.unit)
+            if not (meter := self._meters.get(key)):
+                meter = self._meters[key] = ModbusMeter(self.hass, *key)
+
+        stream.meter = meter
+        meter.async_add(stream, source)
+        return stream
+
+    @callback
+    def async_close(self, stream: DirectStream) -> None:
+        """Stop feeding a stream, closing its meter after the last one"""
+        if not (meter := stream.meter):
+            return
+
+        stream.meter = None
+        meter.async_remove(stream)
+        if meter.empty:
+            self._meters.pop(meter.key, None)
@@ -0,0 +1,159 @@
+"""Single-flight delivery of limit commands to a charger"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+import random
+
+from homeassistant.core import HomeAssistant, callback
+
+DEFAULT_TIMEOUT_SEC = 15
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BACKOFF_SEC = 2
+MAX_BACKOFF_SEC = 30
+
+
+class CommandDispatcher:
+    """Sends limit commands in the background, one at a time
+
+    `submit` returns at once. While a command is in flight, newer ones wait
+    in a single slot where the newest replaces the older. Every attempt is
+    bounded by `timeout` and failed attempts are retried after an
+    exponential backoff with jitter, unless a newer command is waiting.
+
+    Decreases take priority. They cut a retry backoff short, while a newer
+    increase waits it out. A command already on the wire is never
+    cancelled, so limits always reach the charger in submission order.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        logger: logging.Logger,
+        send: Callable[[dict[str, float]], Awaitable[None]],
+        timeout: float = DEFAULT_TIMEOUT_SEC,
+        attempts: int = DEFAULT_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF_SEC,
+    ) -> None:
+        self.hass = hass
+        self._logger = logger
+        self._send = send
+        self._timeout = timeout
+        self._attempts = attempts
+        self._backoff = backoff
+        self._pending: dict[str, float] | None = None
+        self._in_flight: dict[str, float] | None = None
+        self._last_sent: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self._preempt = asyncio.Event()
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.replaced = 0
+        self.last_error: str | None = None
+
+    @property
+    def busy(self) -> bool:
+        """True while a command is being sent or waits for a retry"""
+        return self._task is not None and not self._task.done()
+
+    def _is_decrease(self, limits: dict[str, float]) -> bool:
+        reference = self._in_flight or self._last_sent
+        return any(
+            limit < reference.get(phase, float("inf"))
+            for phase, limit in limits.items()
+        )
+
+    @callback
+    def submit(self, limits: dict[str, float]) -> bool:
+        """Queue limits for sending, replacing any queued older ones
+
+        Returns False if the same limits are already being sent.
+        """
+        if self.busy and limits == self._in_flight:
+            return False
+
+        if self._pending is not None:
+            self.replaced += 1
+        self._pending = limits
+
+        if self._is_decrease(limits):
+            self._preempt.set()
+
+        if not self.busy:
+            self._task = self.hass.async_create_task(self._async_run())
+        return True
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop the queued command and stop sending"""
+        self._pending = None
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _async_run(self) -> None:
+        while self._pending is not None:
+            limits, self._pending = self._pending, None
+            self._preempt.clear()
+            self._in_flight = limits
+            try:
+                await self._async_deliver(limits)
+            finally:
+                self._in_flight = None
+
+    async def _async_deliver(self, limits: dict[str, float]) -> None:
+        for attempt in range(self._attempts):
+            if attempt:
+                if await self._async_backoff(attempt) or self._pending is not None:
+                    self._logger.debug("Dropping retry of %s, newer limits", limits)
+                    return
+                self.retries += 1
+
+            try:
+                async with asyncio.timeout(self._timeout):
+                    await self._send(limits)
+            except TimeoutError:
+                self.timeouts += 1
+                self.last_error = f"No response in {self._timeout}s"
+            except Exception as err:  # pylint: disable=broad-except
+                self.last_error = str(err) or type(err).__name__
+            else:
+                self._last_sent = limits
+                self.last_error = None
+                return
+
+            self._logger.warning(
+                "Limit command %s failed (attempt %s of %s): %s",
+                limits,
+                attempt + 1,
+                self._attempts,
+                self.last_error,
+            )
+
+        self.failures += 1
+        self._logger.error("Giving up on limit command %s", limits)
+
+    async def _async_backoff(self, attempt: int) -> bool:
+        """Wait before a retry, True if a decrease cut the wait short"""
+        delay = min(self._backoff * 2 ** (attempt - 1), MAX_BACKOFF_SEC)
+        delay *= random.uniform(0.5, 1.0)
+        try:
+            async with asyncio.timeout(delay):
+                await self._preempt.wait()
+        except TimeoutError:
+            return False
+        return True
+
+    def as_dict(self) -> dict:
+        """Counters, for diagnostics"""
+        return {
+            "busy": self.busy,
+            "pending": self._pending,
+            "in_flight": self._in_flight,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "replaced": self.replaced,
+            "last_error": self.last_error,
+        }
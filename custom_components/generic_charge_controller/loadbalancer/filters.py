@@ -0,0 +1,288 @@
+"""Streaming sample filters"""
+
+import bisect
+import collections
+import math
+
+import numpy
+
+from ..const import (
+    FILTER_EWMA,
+    FILTER_KALMAN,
+    FILTER_MEAN,
+    FILTER_MEDIAN,
+    FILTER_TRIMMED_MEAN,
+)
+from .samples import NOMINAL_SAMPLE_INTERVAL_SEC, PhaseSampleMatrix
+
+# Kalman trend filter tuning: meter noise variance in A², random walk of
+# the load trend in A²/s³, and how far ahead the estimate looks
+KALMAN_MEASUREMENT_VAR = 0.5
+KALMAN_TREND_VAR = 0.02
+KALMAN_HORIZON_SEC = NOMINAL_SAMPLE_INTERVAL_SEC
+
+# Share of the window dropped at each end by the trimmed mean
+TRIM_SHARE = 0.25
+# Samples in the window before spikes are judged against its median
+SPIKE_MIN_SAMPLES = 3
+
+
+class LoadFilter:
+    """Estimates the household load of every phase of a sample matrix
+
+    The balancer hands every sample it stores to `observe` or
+    `observe_all`, so stateful filters update in constant time.
+    """
+
+    name = ""
+
+    def __init__(self, matrix: PhaseSampleMatrix) -> None:
+        self._matrix = matrix
+        self._rejected = [0] * len(matrix)
+
+    @property
+    def rejected(self) -> list[int]:
+        """Samples of every phase rejected as spikes"""
+        return list(self._rejected)
+
+    def observe(self, row: int, value: float, timestamp: float) -> None:
+        """Take one sample of one phase"""
+
+    def observe_all(
+        self, values: numpy.ndarray, timestamps: float | numpy.ndarray
+    ) -> None:
+        """Take one sample of every phase"""
+        timestamps = numpy.broadcast_to(timestamps, len(values)).tolist()
+        for row, value in enumerate(values.tolist()):
+            self.observe(row, value, timestamps[row])
+
+    def estimate(self) -> numpy.ndarray:
+        """Load estimate of every phase"""
+        raise NotImplementedError
+
+    def warm_up(self) -> None:
+        """Replay the samples already in the matrix, e.g. restored ones"""
+        for row in range(len(self._matrix)):
+            values = self._matrix.values(row).tolist()
+            times = self._matrix.times(row).tolist()
+            for value, timestamp in zip(values, times):
+                self.observe(row, value, timestamp)
+
+    def reset(self) -> None:
+        """Forget the filter state along with the samples"""
+
+
+class MeanLoadFilter(LoadFilter):
+    """Boxcar mean over the sample window, kept by the matrix itself"""
+
+    name = FILTER_MEAN
+
+    def observe_all(
+        self, values: numpy.ndarray, timestamps: float | numpy.ndarray
+    ) -> None:
+        # the matrix has the samples already
+        pass
+
+    def estimate(self) -> numpy.ndarray:
+        return self._matrix.means()
+
+
+class EwmaLoadFilter(LoadFilter):
+    """Exponentially weighted mean with a time constant in seconds
+
+    The weight of a sample follows the time since the previous one, so
+    irregular sampling does not skew the estimate.
+    """
+
+    name = FILTER_EWMA
+
+    def __init__(self, matrix: PhaseSampleMatrix, time_constant: float) -> None:
+        super().__init__(matrix)
+        self._time_constant = time_constant
+        self._values = numpy.zeros(len(matrix))
+        self._times = numpy.full(len(matrix), numpy.nan)
+
+    def observe(self, row: int, value: float, timestamp: float) -> None:
+        last = self._times[row]
+        if math.isnan(last):
+            self._values[row] = value
+        else:
+            weight = -math.expm1(-max(0.0, timestamp - last) / self._time_constant)
+            self._values[row] += weight * (value - self._values[row])
+        self._times[row] = timestamp
+
+    def observe_all(
+        self, values: numpy.ndarray, timestamps: float | numpy.ndarray
+    ) -> None:
+        elapsed = numpy.maximum(0.0, timestamps - self._times)
+        weights = numpy.where(
+            numpy.isnan(elapsed), 1.0, -numpy.expm1(-elapsed / self._time_constant)
+        )
+        self._values += weights * (values - self._values)
+        self._times[:] = timestamps
+
+    def estimate(self) -> numpy.ndarray:
+        return self._values.copy()
+
+    def reset(self) -> None:
+        self._values[:] = 0.0
+        self._times[:] = numpy.nan
+
+
+class KalmanLoadFilter(LoadFilter):
+    """Level and trend Kalman filter predicting the load `horizon` ahead
+
+    A rising load raises the estimate before the samples have caught up,
+    a falling one frees headroom early, where a mean lags both ways.
+    """
+
+    name = FILTER_KALMAN
+
+    def __init__(
+        self,
+        matrix: PhaseSampleMatrix,
+        measurement_var: float = KALMAN_MEASUREMENT_VAR,
+        trend_var: float = KALMAN_TREND_VAR,
+        horizon: float = KALMAN_HORIZON_SEC,
+    ) -> None:
+        super().__init__(matrix)
+        self._measurement_var = measurement_var
+        self._trend_var = trend_var
+        self._horizon = horizon
+        # per phase: level, trend, time, covariance p00, p01, p11
+        self._states: list[list[float] | None] = [None] * len(matrix)
+
+    def observe(self, row: int, value: float, timestamp: float) -> None:
+        state = self._states[row]
+        if state is None:
+            self._states[row] = [value, 0.0, timestamp, self._measurement_var, 0.0, 1.0]
+            return
+
+        level, trend, last, p00, p01, p11 = state
+        dt = max(0.0, timestamp - last)
+        q = self._trend_var
+
+        # predict
+        level += trend * dt
+        p00 += dt * (2 * p01 + dt * p11) + q * dt**3 / 3
+        p01 += dt * p11 + q * dt**2 / 2
+        p11 += q * dt
+
+        # correct with the measured level
+        innovation = value - level
+        s = p00 + self._measurement_var
+        k0, k1 = p00 / s, p01 / s
+        level += k0 * innovation
+        trend += k1 * innovation
+        p11 -= k1 * p01
+        p01 -= k0 * p01
+        p00 -= k0 * p00
+
+        self._states[row] = [level, trend, timestamp, p00, p01, p11]
+
+    def estimate(self) -> numpy.ndarray:
+        return numpy.array(
+            [
+                state[0] + state[1] * self._horizon if state else 0.0
+                for state in self._states
+            ]
+        )
+
+    def reset(self) -> None:
+        self._states = [None] * len(self._states)
+
+
+class OrderStatisticLoadFilter(LoadFilter):
+    """Rolling median or trimmed mean over the sample window
+
+    The window is the `window_sec` of the matrix, capped at its capacity.
+    Every phase keeps its window twice: in arrival order, to know which
+    samples leave, and sorted, so the median is an index lookup and an
+    update a binary search plus a short memmove. `trim` is the share of
+    the window dropped at each end, 0.5 gives the median.
+
+    With a `spike_threshold`, a sample further than that from the median
+    is held back. A second one in a row is a real step in the load and
+    both are let in, a lone one is counted in `rejected` and dropped.
+    """
+
+    def __init__(
+        self, matrix: PhaseSampleMatrix, trim: float, spike_threshold: float = 0.0
+    ) -> None:
+        super().__init__(matrix)
+        self.name = FILTER_MEDIAN if trim >= 0.5 else FILTER_TRIMMED_MEAN
+        self._trim = min(trim, 0.5)
+        self._spike_threshold = spike_threshold
+        self._window_sec = matrix.window_sec
+        self._capacity = matrix.capacity
+        # (timestamp, value) of every phase in arrival order
+        self._arrivals = [collections.deque() for _ in range(len(matrix))]
+        self._sorted: list[list[float]] = [[] for _ in range(len(matrix))]
+        self._held: list[tuple[float, float] | None] = [None] * len(matrix)
+
+    def _insert(self, row: int, value: float, timestamp: float) -> None:
+        arrivals = self._arrivals[row]
+        ordered = self._sorted[row]
+        if len(arrivals) == self._capacity:
+            del ordered[bisect.bisect_left(ordered, arrivals.popleft()[1])]
+        arrivals.append((timestamp, value))
+        bisect.insort(ordered, value)
+
+        cutoff = timestamp - self._window_sec
+        while arrivals[0][0] <= cutoff:
+            del ordered[bisect.bisect_left(ordered, arrivals.popleft()[1])]
+
+    def _median(self, ordered: list[float]) -> float:
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+    def observe(self, row: int, value: float, timestamp: float) -> None:
+        ordered = self._sorted[row]
+        if self._spike_threshold and len(ordered) >= SPIKE_MIN_SAMPLES:
+            if abs(value - self._median(ordered)) > self._spike_threshold:
+                held = self._held[row]
+                if held is None:
+                    self._held[row] = (value, timestamp)
+                    return
+                self._insert(row, *held)
+            elif self._held[row] is not None:
+                self._rejected[row] += 1
+        self._held[row] = None
+        self._insert(row, value, timestamp)
+
+    def _value(self, ordered: list[float]) -> float:
+        if not ordered:
+            return 0.0
+        if self._trim >= 0.5:
+            return self._median(ordered)
+
+        cut = int(len(ordered) * self._trim)
+        kept = ordered[cut : len(ordered) - cut]
+        return math.fsum(kept) / len(kept)
+
+    def estimate(self) -> numpy.ndarray:
+        return numpy.array([self._value(ordered) for ordered in self._sorted])
+
+    def reset(self) -> None:
+        for arrivals, ordered in zip(self._arrivals, self._sorted):
+            arrivals.clear()
+            ordered.clear()
+        self._held = [None] * len(self._held)
+
+
+def create_load_filter(
+    name: str, matrix: PhaseSampleMatrix, spike_threshold: float = 0.0
+) -> LoadFilter:
+    """Load filter strategy of the given name over a sample matrix"""
+    if name == FILTER_MEDIAN:
+        return OrderStatisticLoadFilter(matrix, 0.5, spike_threshold)
+    if name == FILTER_TRIMMED_MEAN:
+        return OrderStatisticLoadFilter(matrix, TRIM_SHARE, spike_threshold)
+    if name == FILTER_EWMA:
+        # about half the delay of a boxcar over the same window
+        return EwmaLoadFilter(matrix, matrix.window_sec / 4)
+    if name == FILTER_KALMAN:
+        return KalmanLoadFilter(matrix)
+    return MeanLoadFilter(matrix)
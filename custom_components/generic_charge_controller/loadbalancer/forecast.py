@@ -0,0 +1,137 @@
+"""Household load by time of day, learnt from the filtered samples"""
+
+from __future__ import annotations
+
+from homeassistant.util import dt as dt_util
+
+FORECAST_BUCKET_SEC = 900
+FORECAST_BUCKETS = 24 * 3600 // FORECAST_BUCKET_SEC
+# weight of the newest day in the average of a quarter hour
+FORECAST_ALPHA = 0.3
+# the prediction is the average peak plus this many mean deviations
+FORECAST_DEVIATIONS = 2
+
+
+def _bucket(timestamp: float) -> int:
+    local = dt_util.as_local(dt_util.utc_from_timestamp(timestamp))
+    return (local.hour * 3600 + local.minute * 60) // FORECAST_BUCKET_SEC
+
+
+def _rounded(buckets: list[list[float] | None]) -> list[list[float] | None]:
+    return [
+        None if loads is None else [round(v, 2) for v in loads] for loads in buckets
+    ]
+
+
+class LoadForecast:
+    """Peak household load of every quarter hour of the day, per phase
+
+    The highest filtered load seen in a quarter hour is blended into the
+    average of that quarter hour of the day once the next one starts,
+    the newest day weighted FORECAST_ALPHA, and so is its distance from
+    the average. A quarter hour is predicted as its average plus
+    FORECAST_DEVIATIONS mean deviations; one never seen as the highest
+    prediction of those that were. Quarter hours are in local time.
+
+    Only what the balancer samples is learnt, so while it idles the
+    forecast keeps what it had.
+    """
+
+    __slots__ = ("_phases", "_means", "_deviations", "_slot", "_bucket", "_peaks")
+
+    def __init__(self, phases: int) -> None:
+        self._phases = phases
+        self._means: list[list[float] | None] = [None] * FORECAST_BUCKETS
+        self._deviations: list[list[float] | None] = [None] * FORECAST_BUCKETS
+        # quarter hour since the epoch being observed, its bucket and peaks
+        self._slot: int | None = None
+        self._bucket = 0
+        self._peaks: list[float] = []
+
+    @property
+    def known(self) -> int:
+        """Number of quarter hours of the day with an average"""
+        return sum(mean is not None for mean in self._means)
+
+    def observe(self, loads: list[float], timestamp: float) -> None:
+        """Take the filtered load of every phase at `timestamp`"""
+        slot = int(timestamp // FORECAST_BUCKET_SEC)
+        if slot != self._slot:
+            self._commit()
+            self._slot = slot
+            self._bucket = _bucket(timestamp)
+            self._peaks = list(loads)
+            return
+
+        peaks = self._peaks
+        for i, load in enumerate(loads):
+            if load > peaks[i]:
+                peaks[i] = load
+
+    def _commit(self) -> None:
+        if not self._peaks:
+            return
+
+        means = self._means[self._bucket]
+        deviations = self._deviations[self._bucket]
+        if means is None or deviations is None:
+            self._means[self._bucket] = list(self._peaks)
+            self._deviations[self._bucket] = [0.0] * self._phases
+            return
+
+        for i, peak in enumerate(self._peaks):
+            deviations[i] += FORECAST_ALPHA * (abs(peak - means[i]) - deviations[i])
+            means[i] += FORECAST_ALPHA * (peak - means[i])
+
+    def _predict_bucket(self, bucket: int) -> list[float] | None:
+        means = self._means[bucket]
+        deviations = self._deviations[bucket]
+        if means is None or deviations is None:
+            return None
+        return [
+            mean + FORECAST_DEVIATIONS * deviation
+            for mean, deviation in zip(means, deviations)
+        ]
+
+    def predict(self, timestamp: float) -> list[float] | None:
+        """Expected peak load of every phase at `timestamp`, None if unknown"""
+        if (loads := self._predict_bucket(_bucket(timestamp))) is not None:
+            return loads
+
+        known = [
+            loads
+            for bucket in range(FORECAST_BUCKETS)
+            if (loads := self._predict_bucket(bucket)) is not None
+        ]
+        if not known:
+            return None
+        return [max(phase) for phase in zip(*known)]
+
+    def as_dict(self) -> dict:
+        """Averages and deviations, for storage"""
+        return {
+            "means": _rounded(self._means),
+            "deviations": _rounded(self._deviations),
+        }
+
+    def restore(self, stored: dict) -> None:
+        """Take back stored averages, ignored if they do not fit"""
+        means = stored.get("means")
+        deviations = stored.get("deviations")
+        if (
+            not isinstance(means, list)
+            or not isinstance(deviations, list)
+            or len(means) != FORECAST_BUCKETS
+            or len(deviations) != FORECAST_BUCKETS
+            or any(
+                (mean is None) != (deviation is None)
+                or (mean is not None and len(mean) != self._phases)
+                for mean, deviation in zip(means, deviations)
+            )
+        ):
+            return
+
+        self._means = [None if mean is None else list(mean) for mean in means]
+        self._deviations = [
+            None if deviation is None else list(deviation) for deviation in deviations
+        ]
@@ -0,0 +1,132 @@
+"""Control loop instrumentation"""
+
+import bisect
+import collections
+import math
+
+DEFAULT_TRACE_SIZE = 100
+
+# Upper bounds of the histogram buckets in milliseconds
+BUCKETS_MS = (
+    0.1,
+    0.2,
+    0.5,
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1000,
+    2000,
+    5000,
+    10000,
+    math.inf,
+)
+
+
+class Histogram:
+    """Fixed bucket latency histogram in milliseconds, BUCKETS_MS by default"""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS_MS) -> None:
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._last: float | None = None
+
+    @property
+    def count(self) -> int:
+        """Number of observations"""
+        return self._count
+
+    @property
+    def last(self) -> float | None:
+        """Most recent observation"""
+        return self._last
+
+    @property
+    def mean(self) -> float | None:
+        """Mean of all observations"""
+        return self._sum / self._count if self._count else None
+
+    def observe(self, value_ms: float) -> None:
+        """Record one observation"""
+        self._counts[bisect.bisect_left(self._buckets, value_ms)] += 1
+        self._count += 1
+        self._sum += value_ms
+        self._max = max(self._max, value_ms)
+        self._last = value_ms
+
+    def percentile(self, quantile: float) -> float | None:
+        """Upper bound of the bucket holding the given quantile"""
+        if not self._count:
+            return None
+
+        rank = quantile * self._count
+        seen = 0
+        for bound, count in zip(self._buckets, self._counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self._max)
+
+        return self._max
+
+    def summary(self) -> dict:
+        """Count, mean, max and percentiles"""
+        return {
+            "count": self._count,
+            "last": self._last,
+            "mean": self.mean,
+            "max": self._max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+    def as_dict(self) -> dict:
+        """Summary plus the raw bucket counts"""
+        return {
+            **self.summary(),
+            "buckets": {
+                str(bound): count for bound, count in zip(self._buckets, self._counts)
+            },
+        }
+
+
+class LoopMetrics:
+    """Counters, tick timing and a trace of the last ticks of one balancer"""
+
+    def __init__(self, trace_size: int = DEFAULT_TRACE_SIZE) -> None:
+        self.tick_duration = Histogram()
+        self.ticks = 0
+        self.skipped_ticks = 0
+        self.unavailable_events = 0
+        self.duplicate_samples = 0
+        self._trace = collections.deque([], trace_size)
+
+    @property
+    def trace(self) -> list[dict]:
+        """Inputs and outputs of the most recent ticks, oldest first"""
+        return list(self._trace)
+
+    def record_tick(self, duration_ms: float, trace: dict) -> None:
+        """Account for a finished tick"""
+        self.ticks += 1
+        self.tick_duration.observe(duration_ms)
+        self._trace.append(trace)
+
+    def as_dict(self) -> dict:
+        """Everything, for the diagnostics dump"""
+        return {
+            "ticks": self.ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "unavailable_events": self.unavailable_events,
+            "duplicate_samples": self.duplicate_samples,
+            "tick_duration_ms": self.tick_duration.as_dict(),
+            "trace": self.trace,
+        }
@@ -0,0 +1,104 @@
+"""Per phase measurement data"""
+
+import logging
+import time
+
+import numpy
+
+from ..const import DEFAULT_WINDOW_SIZE
+from .samples import PhaseSampleMatrix
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ElectricalPhase:
+    """Holds data for each phase
+
+    The samples live in one row of a PhaseSampleMatrix shared by all phases
+    of a fuse, a phase created on its own gets a matrix of its own.
+    """
+
+    __slots__ = ("_phase", "_entity_id", "_target_current", "_matrix", "_row")
+
+    def __init__(
+        self,
+        phase: str,
+        entity_id: str,
+        target_current: float,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        matrix: PhaseSampleMatrix | None = None,
+        row: int = 0,
+    ) -> None:
+        self._phase = phase
+        self._entity_id = entity_id
+        self._target_current = target_current
+        self._matrix = matrix or PhaseSampleMatrix(1, window_size)
+        self._row = row
+
+    @property
+    def phase_id(self):
+        """Phase ID"""
+        return self._phase
+
+    @property
+    def entity_id(self):
+        """Entity ID"""
+        return self._entity_id
+
+    @property
+    def target_current(self):
+        """Target current on the phase"""
+        return self._target_current
+
+    @property
+    def matrix(self) -> PhaseSampleMatrix:
+        """Sample matrix the phase is a row of"""
+        return self._matrix
+
+    @property
+    def row(self) -> int:
+        """Row of the phase in the sample matrix"""
+        return self._row
+
+    @property
+    def samples(self) -> numpy.ndarray:
+        """Samples, oldest first"""
+        return self._matrix.values(self._row)
+
+    @property
+    def sample_times(self) -> numpy.ndarray:
+        """Wall clock time of each sample"""
+        return self._matrix.times(self._row)
+
+    @property
+    def sample_count(self) -> int:
+        """Number of samples held"""
+        return self._matrix.count(self._row)
+
+    @property
+    def latest_sample(self) -> float:
+        """Most recent sample, 0 when there is none"""
+        latest = self._matrix.latest(self._row)
+        return latest[0] if latest else 0.0
+
+    @property
+    def latest_sample_time(self) -> float | None:
+        """Wall clock time of the most recent sample"""
+        latest = self._matrix.latest(self._row)
+        return latest[1] if latest else None
+
+    @property
+    def filtered_current(self) -> float:
+        """Mean of the most recent samples"""
+        return self._matrix.mean(self._row)
+
+    def add_sample(self, measurement: float, timestamp: float | None = None) -> None:
+        """Stores a measurement and feeds it to the filter"""
+        self._matrix.push(self._row, measurement, timestamp or time.time())
+
+    def update_target(self, new_target_current: float) -> None:
+        """Sets the target current on the phase"""
+        _LOGGER.debug(
+            "Update target current on phase %s to %s", self._phase, new_target_current
+        )
+        self._target_current = new_target_current
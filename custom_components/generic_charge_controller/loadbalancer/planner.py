@@ -0,0 +1,344 @@
+"""Charge planning over the spot price forecast"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Callable, Iterable
+from datetime import datetime
+import math
+from typing import NamedTuple
+
+from homeassistant.util import dt as dt_util
+
+from .allocation import MIN_CHARGE_CURRENT
+
+NOMINAL_VOLTAGE = 230
+# length of a price entry without an end and without a next one
+DEFAULT_SLOT_SEC = 3600
+
+
+class PriceSlot(NamedTuple):
+    """Spot price from `start` to `end`, both epoch seconds"""
+
+    start: float
+    end: float
+    price: float
+
+
+def _timestamp(value) -> float | None:
+    if isinstance(value, str):
+        value = dt_util.parse_datetime(value)
+    if not isinstance(value, datetime):
+        return None
+    return dt_util.as_utc(value).timestamp()
+
+
+def parse_prices(attributes) -> list[PriceSlot]:
+    """Price slots from the raw_today and raw_tomorrow attributes
+
+    Takes Nordpool entries with start, end and value as well as Energi
+    Data Service ones with hour and price, hourly or by the quarter.
+    Entries without a price, e.g. tomorrow's before they are published,
+    are left out. An entry without an end lasts until the next one.
+    """
+    entries = []
+    for key in ("raw_today", "raw_tomorrow"):
+        for entry in attributes.get(key) or ():
+            if not isinstance(entry, dict):
+                continue
+
+            start = _timestamp(entry.get("start", entry.get("hour")))
+            try:
+                price = float(entry.get("value", entry.get("price")))
+            except (TypeError, ValueError):
+                continue
+            if start is not None:
+                entries.append((start, _timestamp(entry.get("end")), price))
+
+    entries.sort()
+    slots = []
+    for i, (start, end, price) in enumerate(entries):
+        if end is None:
+            end = start + DEFAULT_SLOT_SEC
+            if i + 1 < len(entries):
+                end = min(end, entries[i + 1][0])
+        if end > start:
+            slots.append(PriceSlot(start, end, price))
+    return slots
+
+
+class _Slot:
+    __slots__ = ("start", "end", "begin", "price", "amps")
+
+    def __init__(self, start: float, end: float, price: float) -> None:
+        self.start = start
+        self.end = end
+        # start of what is left of the slot, later than start once running
+        self.begin = start
+        self.price = price
+        # current the slot can be planned with
+        self.amps = 0.0
+
+
+class ChargePlanner:
+    """Cheapest price slots first, within the predicted fuse headroom
+
+    The energy still needed is spread over the slots before the deadline,
+    cheapest first, skipping slots above `max_price`. A slot is planned
+    with the charger's current capped at the fuse headroom predicted for
+    it by `headroom(start, end)`; slots where that is below
+    MIN_CHARGE_CURRENT cannot be planned. The slots taken fully charge at
+    the charger's full current, the balancer keeping them within the
+    live headroom. The most expensive slot taken is only charged with the
+    current that completes the energy. Without a target, every slot up to
+    `max_price` is charged, and without either the planner stays out of
+    the way.
+
+    Eligible slots are kept sorted by price with the running total of
+    the energy they can deliver. The slots to take are the prefix whose
+    total reaches the energy needed, found by bisection, so energy
+    delivered moves the boundary without replanning. A price or headroom
+    change only reorders the changed slots and sums again from the
+    cheapest rank it touched; `replanned` counts the slots summed again.
+    """
+
+    def __init__(
+        self,
+        phases: int,
+        max_current: float,
+        max_price: float | None = None,
+        headroom: Callable[[float, float], float | None] | None = None,
+    ) -> None:
+        self._phases = phases
+        self._max_current = max_current
+        self._max_price = max_price
+        self._headroom = headroom
+        self._slots: dict[float, _Slot] = {}
+        self._starts: list[float] = []
+        # (price, start) of the eligible slots and their running energy total
+        self._order: list[tuple[float, float]] = []
+        self._cumulative: list[float] = []
+        self._dirty = 0
+        self._energy: float | None = None
+        self._deadline: float | None = None
+        self.replanned = 0
+
+    @property
+    def active(self) -> bool:
+        """True while there is a target or a price cap to plan for"""
+        return self._energy is not None or self._max_price is not None
+
+    @property
+    def energy(self) -> float | None:
+        """kWh still to be charged, None without a target"""
+        return self._energy
+
+    @property
+    def deadline(self) -> float | None:
+        """Time the energy is needed by, None for as soon as it is cheap"""
+        return self._deadline
+
+    @property
+    def shortfall(self) -> float:
+        """kWh of the target that no eligible slot can deliver"""
+        if not self._energy:
+            return 0.0
+        self._refresh()
+        total = self._cumulative[-1] if self._cumulative else 0.0
+        return max(0.0, self._energy - total)
+
+    def _cap(self, slot: _Slot) -> float:
+        amps = self._max_current
+        if self._headroom:
+            headroom = self._headroom(slot.start, slot.end)
+            if headroom is not None:
+                amps = min(amps, headroom)
+        return amps
+
+    def _capacity(self, slot: _Slot) -> float:
+        if slot.amps < MIN_CHARGE_CURRENT:
+            return 0.0
+        end = slot.end if self._deadline is None else min(slot.end, self._deadline)
+        hours = max(0.0, end - slot.begin) / 3600
+        return slot.amps * self._phases * NOMINAL_VOLTAGE * hours / 1000
+
+    def _eligible(self, slot: _Slot) -> bool:
+        if self._max_price is not None and slot.price > self._max_price:
+            return False
+        return self._deadline is None or slot.begin < self._deadline
+
+    def _rank(self, slot: _Slot) -> int | None:
+        key = (slot.price, slot.start)
+        i = bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            return i
+        return None
+
+    def _mark(self, rank: int) -> None:
+        self._dirty = min(self._dirty, rank)
+
+    def _add(self, slot: _Slot) -> None:
+        if not self._eligible(slot):
+            return
+        key = (slot.price, slot.start)
+        rank = bisect_left(self._order, key)
+        self._order.insert(rank, key)
+        self._cumulative.insert(rank, 0.0)
+        self._mark(rank)
+
+    def _remove(self, slot: _Slot) -> None:
+        if (rank := self._rank(slot)) is not None:
+            del self._order[rank]
+            del self._cumulative[rank]
+            self._mark(rank)
+
+    def _rebuild(self) -> None:
+        self._order = sorted(
+            (slot.price, slot.start)
+            for slot in self._slots.values()
+            if self._eligible(slot)
+        )
+        self._cumulative = [0.0] * len(self._order)
+        self._dirty = 0
+
+    def _refresh(self) -> None:
+        """Sum the energy totals again from the first changed rank"""
+        start = min(self._dirty, len(self._order))
+        total = self._cumulative[start - 1] if start else 0.0
+        for i in range(start, len(self._order)):
+            total += self._capacity(self._slots[self._order[i][1]])
+            self._cumulative[i] = total
+        self.replanned += len(self._order) - start
+        self._dirty = len(self._order)
+
+    def set_target(self, energy: float | None, deadline: float | None) -> None:
+        """Plan `energy` kWh by `deadline`, None for no target"""
+        self._energy = energy
+        self._deadline = deadline if energy is not None else None
+        for slot in self._slots.values():
+            slot.amps = self._cap(slot)
+        self._rebuild()
+
+    def update_max_current(self, max_current: float) -> None:
+        """Set the charger's current, replanning everything if it changed"""
+        if max_current == self._max_current:
+            return
+        self._max_current = max_current
+        for slot in self._slots.values():
+            slot.amps = self._cap(slot)
+        self._mark(0)
+
+    def update_prices(self, slots: Iterable[PriceSlot], now: float) -> int:
+        """Take new or changed prices, returns the number of slots changed"""
+        changed = 0
+        for start, end, price in slots:
+            if end <= now:
+                continue
+
+            if (slot := self._slots.get(start)) is None:
+                slot = _Slot(start, end, price)
+                slot.begin = max(start, now)
+                slot.amps = self._cap(slot)
+                self._slots[start] = slot
+                insort(self._starts, start)
+                self._add(slot)
+                changed += 1
+            elif slot.price != price or slot.end != end:
+                self._remove(slot)
+                slot.price = price
+                slot.end = end
+                self._add(slot)
+                changed += 1
+        return changed
+
+    def refresh_headroom(self) -> int:
+        """Ask for the predicted headroom again, returns the slots changed"""
+        changed = 0
+        for slot in self._slots.values():
+            amps = self._cap(slot)
+            if abs(amps - slot.amps) < 1:
+                continue
+            slot.amps = amps
+            if (rank := self._rank(slot)) is not None:
+                self._mark(rank)
+            changed += 1
+        return changed
+
+    def advance(self, now: float) -> None:
+        """Drop the slots that are over and shorten the running one"""
+        while self._starts and self._slots[self._starts[0]].end <= now:
+            self._remove(self._slots.pop(self._starts.pop(0)))
+
+        if self._starts and (slot := self._slots[self._starts[0]]).start <= now:
+            slot.begin = now
+            if (rank := self._rank(slot)) is not None:
+                self._mark(rank)
+
+        if self._deadline is not None and now >= self._deadline:
+            self.set_target(None, None)
+
+    def consume(self, energy: float) -> None:
+        """Take `energy` kWh delivered off the target"""
+        if self._energy is not None:
+            self._energy = max(0.0, self._energy - energy)
+
+    def _boundary(self) -> int:
+        """Rank of the most expensive slot taken, partially or fully"""
+        self._refresh()
+        if self._energy is None:
+            return len(self._order)
+        if self._energy <= 0:
+            return -1
+        return bisect_left(self._cumulative, self._energy)
+
+    def _planned(self, slot: _Slot, rank: int | None, boundary: int) -> float:
+        if rank is None or rank > boundary or slot.amps < MIN_CHARGE_CURRENT:
+            return 0
+        if rank < boundary or self._energy is None:
+            return self._max_current
+
+        needed = self._energy - (self._cumulative[rank - 1] if rank else 0.0)
+        end = slot.end if self._deadline is None else min(slot.end, self._deadline)
+        hours = (end - slot.begin) / 3600
+        if hours <= 0:
+            return 0
+        amps = math.ceil(needed * 1000 / (self._phases * NOMINAL_VOLTAGE * hours))
+        return min(max(amps, MIN_CHARGE_CURRENT), slot.amps)
+
+    def limit(self, now: float) -> float | None:
+        """Current to charge with at `now`, None if not planned"""
+        if not self.active:
+            return None
+
+        i = bisect_right(self._starts, now) - 1
+        if i < 0 or (slot := self._slots[self._starts[i]]).end <= now:
+            return None
+        return self._planned(slot, self._rank(slot), self._boundary())
+
+    def schedule(self) -> list[dict]:
+        """Remaining slots with their price and planned current"""
+        boundary = self._boundary()
+        return [
+            {
+                "start": dt_util.utc_from_timestamp(slot.start).isoformat(),
+                "end": dt_util.utc_from_timestamp(slot.end).isoformat(),
+                "price": slot.price,
+                "amps": (
+                    self._planned(slot, self._rank(slot), boundary)
+                    if self.active
+                    else None
+                ),
+            }
+            for slot in (self._slots[start] for start in self._starts)
+        ]
+
+    def as_dict(self) -> dict:
+        """Target and remaining plan, for diagnostics"""
+        return {
+            "energy": self._energy,
+            "deadline": self._deadline,
+            "max_price": self._max_price,
+            "shortfall": self.shortfall,
+            "replanned": self.replanned,
+            "schedule": self.schedule(),
+        }
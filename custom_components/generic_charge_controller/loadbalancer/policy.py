@@ -0,0 +1,110 @@
+"""Rules deciding when a new limit is worth sending to the charger"""
+
+import collections
+
+DEFAULT_DECREASE_DEADBAND = 1  # A, decreases go out as soon as they are seen
+DEFAULT_INCREASE_DEADBAND = 2  # A
+DEFAULT_INCREASE_INTERVAL_SEC = 60
+DEFAULT_COMMAND_TTL_MIN = 5
+REFRESH_MARGIN_SEC = 60  # refresh this long before the charger drops the limit
+
+SENT = "sent"
+SUPPRESSED_DEADBAND = "deadband"
+SUPPRESSED_INCREASE_INTERVAL = "increase_interval"
+SUPPRESSED_UNCONFIRMED = "unconfirmed"
+
+
+class CommandPolicy:
+    """Asymmetric deadband and rate limit for dynamic limit commands
+
+    Decreases are sent at once. Increases have to clear a larger deadband
+    and wait at least `increase_interval` after the previous increase, so
+    a meter flickering around a boundary does not ramp the car up and down.
+    An unchanged limit is sent again just before its time to live runs out.
+    With `hold_increases`, e.g. while the charger has not applied the last
+    command yet, increases wait as if the interval had not passed.
+    """
+
+    def __init__(
+        self,
+        decrease_deadband: float = DEFAULT_DECREASE_DEADBAND,
+        increase_deadband: float = DEFAULT_INCREASE_DEADBAND,
+        increase_interval: float = DEFAULT_INCREASE_INTERVAL_SEC,
+        ttl_minutes: int = DEFAULT_COMMAND_TTL_MIN,
+    ) -> None:
+        self._decrease_deadband = decrease_deadband
+        self._increase_deadband = increase_deadband
+        self._increase_interval = increase_interval
+        self._ttl_minutes = ttl_minutes
+        self._last_limits: dict[str, float] = {}
+        self._last_sent = float("-inf")
+        self._last_increase = float("-inf")
+        self._counters = collections.Counter()
+
+    @property
+    def ttl_minutes(self) -> int:
+        """Minutes the charger keeps a limit before falling back"""
+        return self._ttl_minutes
+
+    @property
+    def last_limits(self) -> dict[str, float]:
+        """Limits of the last command sent"""
+        return self._last_limits
+
+    @property
+    def last_sent(self) -> float:
+        """Time the last command was sent"""
+        return self._last_sent
+
+    @property
+    def counters(self) -> dict[str, int]:
+        """Commands sent and suppressed, by reason"""
+        return dict(self._counters)
+
+    @property
+    def refresh_due(self) -> float:
+        """Time at which the last limits have to be sent again"""
+        return self._last_sent + self._ttl_minutes * 60 - REFRESH_MARGIN_SEC
+
+    def evaluate(
+        self, targets: dict[str, float], now: float, hold_increases: bool = False
+    ) -> dict[str, float]:
+        """Limits to send for the given targets, empty if nothing should be sent"""
+        last = self._last_limits
+        if not last or last.keys() != targets.keys():
+            return targets
+
+        decrease = any(targets[p] <= last[p] - self._decrease_deadband for p in targets)
+        increase = any(targets[p] >= last[p] + self._increase_deadband for p in targets)
+        increase_allowed = (
+            not hold_increases and now - self._last_increase >= self._increase_interval
+        )
+
+        if increase and increase_allowed:
+            return targets
+
+        if decrease or now >= self.refresh_due:
+            # hold the increases back but never exceed the targets
+            return {p: min(targets[p], last[p]) for p in targets}
+
+        if not increase:
+            self._counters[SUPPRESSED_DEADBAND] += 1
+        elif hold_increases:
+            self._counters[SUPPRESSED_UNCONFIRMED] += 1
+        else:
+            self._counters[SUPPRESSED_INCREASE_INTERVAL] += 1
+        return {}
+
+    def restore(self, limits: dict[str, float], sent: float) -> None:
+        """Continue from limits sent before a restart"""
+        self._last_limits = dict(limits)
+        self._last_sent = sent
+
+    def record_sent(self, limits: dict[str, float], now: float) -> None:
+        """Remember a command the charger accepted"""
+        if any(limits[p] > self._last_limits.get(p, limits[p]) for p in limits):
+            self._last_increase = now
+
+        self._last_limits = dict(limits)
+        self._last_sent = now
+        self._counters[SENT] += 1
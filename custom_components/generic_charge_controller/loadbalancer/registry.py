@@ -0,0 +1,195 @@
+"""Mains sensor readings shared by every balancer measuring them"""
+
+from collections.abc import Callable
+import logging
+from typing import NamedTuple
+
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, State, callback
+from homeassistant.helpers.event import async_track_state_change_event
+
+from ..const import DATA_SENSORS, DIRECT_SOURCES, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def reported_at(state: State) -> float:
+    """Time the source last reported its state, as a timestamp
+
+    Home Assistant before 2024.4 has no last_reported, last_updated then
+    only moves when the value or attributes change.
+    """
+    return (getattr(state, "last_reported", None) or state.last_updated).timestamp()
+
+
+def has_heartbeat(state: State) -> bool:
+    """True if the report time of the state moves on every report
+
+    Without last_reported a source repeating its value looks the same as
+    one that stopped reporting, so its age tells nothing.
+    """
+    return getattr(state, "last_reported", None) is not None
+
+
+class SensorReading(NamedTuple):
+    """Parsed sensor state
+
+    `heartbeat` tells if `reported` moves on every report, see
+    has_heartbeat.
+    """
+
+    value: float
+    reported: float
+    heartbeat: bool = False
+
+
+def parse_reading(state: State | None) -> SensorReading | None:
+    """Reading of a current sensor state, None if it is unusable"""
+    if not state or state.state == STATE_UNAVAILABLE:
+        return None
+
+    try:
+        return SensorReading(
+            float(state.state), reported_at(state), has_heartbeat(state)
+        )
+    except ValueError:
+        return None
+
+
+class SensorStream:
+    """One mains sensor, shared by all its readers
+
+    A state is parsed once however many balancers read it, and a single
+    state subscription feeds every listener.
+    """
+
+    __slots__ = (
+        "hass",
+        "entity_id",
+        "refs",
+        "_state",
+        "_reported",
+        "_reading",
+        "_listeners",
+        "_unsub",
+    )
+
+    def __init__(self, hass: HomeAssistant, entity_id: str) -> None:
+        self.hass = hass
+        self.entity_id = entity_id
+        self.refs = 0
+        self._state: State | None = None
+        self._reported = None
+        self._reading: SensorReading | None = None
+        self._listeners: list[Callable[[SensorReading | None], None]] = []
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @property
+    def listener_count(self) -> int:
+        """Number of subscribed listeners"""
+        return len(self._listeners)
+
+    def _parse(self, state: State | None) -> SensorReading | None:
+        # a state is replaced when its value changes, but a repeated value
+        # only moves last_reported of the same state
+        reported = getattr(state, "last_reported", None)
+        if state is not self._state or reported != self._reported:
+            self._state = state
+            self._reported = reported
+            self._reading = parse_reading(state)
+        return self._reading
+
+    def read(self) -> SensorReading | None:
+        """Current reading of the sensor, None if it is unusable"""
+        return self._parse(self.hass.states.get(self.entity_id))
+
+    @callback
+    def async_add_listener(
+        self, listener: Callable[[SensorReading | None], None]
+    ) -> CALLBACK_TYPE:
+        """Call `listener` with every new reading, returns a callable to stop"""
+        self._listeners.append(listener)
+        if not self._unsub:
+            self._unsub = async_track_state_change_event(
+                self.hass, [self.entity_id], self._async_state_changed
+            )
+
+        @callback
+        def remove() -> None:
+            self._listeners.remove(listener)
+            if not self._listeners and self._unsub:
+                self._unsub()
+                self._unsub = None
+
+        return remove
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        reading = self._parse(event.data.get("new_state"))
+        for listener in list(self._listeners):
+            listener(reading)
+
+
+class SensorRegistry:
+    """Reference counted sensor streams, one per entity id
+
+    Sources read straight from an MQTT topic or a Modbus meter get a
+    DirectStream from the meters of the direct module instead, loaded
+    with the first such source.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._streams: dict[str, SensorStream] = {}
+        self._meters = None
+
+    @property
+    def streams(self) -> dict[str, SensorStream]:
+        """Streams in use by entity id"""
+        return self._streams
+
+    @property
+    def meters(self):
+        """Direct meter connections, None until a direct source is used"""
+        return self._meters
+
+    @callback
+    def async_acquire(self, entity_id: str) -> SensorStream:
+        """Stream of the given sensor, created on first use"""
+        stream = self._streams.get(entity_id)
+        if not stream:
+            if entity_id.startswith(DIRECT_SOURCES):
+                stream = self._async_meters().async_open(entity_id)
+            else:
+                stream = SensorStream(self.hass, entity_id)
+            self._streams[entity_id] = stream
+            _LOGGER.debug("Sampling %s", entity_id)
+        stream.refs += 1
+        return stream
+
+    @callback
+    def async_release(self, stream: SensorStream) -> None:
+        """Give back an acquired stream, dropped with the last reference"""
+        stream.refs -= 1
+        if stream.refs <= 0:
+            self._streams.pop(stream.entity_id, None)
+            if self._meters and stream.entity_id.startswith(DIRECT_SOURCES):
+                self._meters.async_close(stream)
+            _LOGGER.debug("Stopped sampling %s", stream.entity_id)
+
+    def _async_meters(self):
+        if self._meters is None:
+            # only sites reading meters directly need it
+            from .direct import DirectMeters
+
+            self._meters = DirectMeters(self.hass)
+        return self._meters
+
+
+@callback
+def async_get_sensor_registry(hass: HomeAssistant) -> SensorRegistry:
+    """Sensor registry of the integration"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_SENSORS not in data:
+        data[DATA_SENSORS] = SensorRegistry(hass)
+    return data[DATA_SENSORS]
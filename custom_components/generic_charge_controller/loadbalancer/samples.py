@@ -0,0 +1,224 @@
+"""Ring buffer holding the samples of all phases in one array"""
+
+import math
+
+import numpy
+
+BUFFER_SIZE = 60  # 60 x 5 seconds => 5 minutes of samples
+# Seconds between samples the window sizes are counted in, the poll interval
+NOMINAL_SAMPLE_INTERVAL_SEC = 5
+# Re-add the windows from scratch every N pushes so float error from the
+# running add/subtract cannot build up over long uptimes.
+RESYNC_INTERVAL = 1000
+
+
+class PhaseSampleMatrix:
+    """Samples and timestamps of every phase in phases x capacity arrays
+
+    Each row is a ring buffer with its own write position, so phases can be
+    sampled together (`push_all`) or one at a time as their meters report
+    (`push`). The window of a row covers the `window_sec` seconds up to its
+    newest sample, `window_size` samples at the nominal interval, so the
+    mean means the same whatever the sample interval in effect. Running
+    sums over the windows are kept up to date, so `means` costs one vector
+    division.
+
+    A window holds at most `capacity` samples. While every row has its
+    write position in the same column, as when the phases are polled
+    together, `push_all` writes that column instead of indexing each row.
+    Every RESYNC_INTERVAL pushes the sums are added up again from the
+    windows.
+    """
+
+    __slots__ = (
+        "_window_size",
+        "_window_sec",
+        "_capacity",
+        "_values",
+        "_times",
+        "_heads",
+        "_head",
+        "_tails",
+        "_counts",
+        "_sizes",
+        "_sums",
+        "_offsets",
+        "_full",
+        "_updates",
+    )
+
+    def __init__(self, phases: int, window_size: int, capacity: int = BUFFER_SIZE):
+        if window_size < 1:
+            raise ValueError(f"Filter window must be positive, got {window_size}")
+
+        self._window_size = window_size
+        self._window_sec = window_size * NOMINAL_SAMPLE_INTERVAL_SEC
+        self._capacity = max(capacity, window_size)
+        self._values = numpy.zeros((phases, self._capacity))
+        self._times = numpy.zeros((phases, self._capacity))
+        self._heads = numpy.zeros(phases, dtype=numpy.intp)
+        # shared write position while the rows are aligned, else None
+        self._head: int | None = 0
+        # oldest sample in the window of each row
+        self._tails = numpy.zeros(phases, dtype=numpy.intp)
+        self._counts = numpy.zeros(phases, dtype=numpy.intp)
+        # samples in the window of each row
+        self._sizes = numpy.zeros(phases, dtype=numpy.intp)
+        self._sums = numpy.zeros(phases)
+        # start of each row in the flattened buffers
+        self._offsets = numpy.arange(phases) * self._capacity
+        self._full = False
+        self._updates = 0
+
+    @property
+    def window_size(self) -> int:
+        """Samples in a window at the nominal sample interval"""
+        return self._window_size
+
+    @property
+    def window_sec(self) -> float:
+        """Seconds the means are calculated over"""
+        return self._window_sec
+
+    @property
+    def capacity(self) -> int:
+        """Samples held per phase at most"""
+        return self._capacity
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _row_head(self, row: int) -> int:
+        return self._head if self._head is not None else int(self._heads[row])
+
+    def push(self, row: int, value: float, timestamp: float) -> None:
+        """Add a sample to one phase"""
+        if self._head is not None:
+            self._heads.fill(self._head)
+            self._head = None
+
+        head = int(self._heads[row])
+        if self._sizes[row] == self._capacity:
+            # overwriting the oldest sample of a full window
+            self._sums[row] -= self._values[row, head]
+            self._tails[row] = (head + 1) % self._capacity
+            self._sizes[row] -= 1
+
+        self._values[row, head] = value
+        self._times[row, head] = timestamp
+        self._sums[row] += value
+        self._sizes[row] += 1
+        self._heads[row] = (head + 1) % self._capacity
+        if self._counts[row] < self._capacity:
+            self._counts[row] += 1
+
+        cutoff = timestamp - self._window_sec
+        tail = int(self._tails[row])
+        while self._times[row, tail] <= cutoff:
+            self._sums[row] -= self._values[row, tail]
+            self._sizes[row] -= 1
+            tail = (tail + 1) % self._capacity
+        self._tails[row] = tail
+        self._count_update()
+
+    def push_all(self, values: numpy.ndarray, timestamp: float | numpy.ndarray) -> None:
+        """Add one sample to every phase, at one time or one time per phase"""
+        overwritten = self._sizes == self._capacity
+        if overwritten.any():
+            # overwriting the oldest sample of full windows
+            self._sums -= numpy.where(
+                overwritten, self._values.take(self._offsets + self._tails), 0.0
+            )
+            self._tails += overwritten
+            self._tails %= self._capacity
+            self._sizes -= overwritten
+
+        if self._head is not None:
+            self._values[:, self._head] = values
+            self._times[:, self._head] = timestamp
+            self._head = (self._head + 1) % self._capacity
+        else:
+            slots = self._offsets + self._heads
+            self._values.put(slots, values)
+            self._times.put(slots, timestamp)
+            self._heads += 1
+            self._heads %= self._capacity
+            if (self._heads == self._heads[0]).all():
+                self._head = int(self._heads[0])
+        self._sums += values
+        self._sizes += 1
+
+        if not self._full:
+            numpy.minimum(self._counts + 1, self._capacity, out=self._counts)
+            self._full = bool(self._counts.min() == self._capacity)
+
+        # the newest sample never leaves, so every row stops there
+        cutoff = numpy.subtract(timestamp, self._window_sec)
+        while True:
+            slots = self._offsets + self._tails
+            leaving = self._times.take(slots) <= cutoff
+            if not leaving.any():
+                break
+            self._sums -= numpy.where(leaving, self._values.take(slots), 0.0)
+            self._tails += leaving
+            self._tails %= self._capacity
+            self._sizes -= leaving
+        self._count_update()
+
+    def _count_update(self) -> None:
+        self._updates += 1
+        if self._updates < RESYNC_INTERVAL:
+            return
+
+        self._updates = 0
+        for row in range(len(self._offsets)):
+            slots = (self._tails[row] + numpy.arange(self._sizes[row])) % self._capacity
+            self._sums[row] = math.fsum(self._values[row, slots].tolist())
+
+    def clear(self) -> None:
+        """Drop all samples"""
+        for array in (
+            self._values,
+            self._times,
+            self._heads,
+            self._tails,
+            self._counts,
+            self._sizes,
+            self._sums,
+        ):
+            array.fill(0)
+        self._head = 0
+        self._full = False
+        self._updates = 0
+
+    def means(self) -> numpy.ndarray:
+        """Mean of the window of every phase, 0 if empty"""
+        return self._sums / numpy.maximum(self._sizes, 1)
+
+    def mean(self, row: int) -> float:
+        """Mean of the window of one phase, 0 if empty"""
+        return float(self._sums[row] / max(int(self._sizes[row]), 1))
+
+    def count(self, row: int) -> int:
+        """Number of samples held for a phase"""
+        return int(self._counts[row])
+
+    def latest(self, row: int) -> tuple[float, float] | None:
+        """Newest (value, timestamp) of a phase"""
+        if not self._counts[row]:
+            return None
+
+        head = (self._row_head(row) - 1) % self._capacity
+        return float(self._values[row, head]), float(self._times[row, head])
+
+    def _order(self, row: int) -> numpy.ndarray:
+        count = self._counts[row]
+        return (self._row_head(row) - count + numpy.arange(count)) % self._capacity
+
+    def values(self, row: int) -> numpy.ndarray:
+        """Samples of a phase, oldest first"""
+        return self._values[row, self._order(row)]
+
+    def times(self, row: int) -> numpy.ndarray:
+        """Timestamps of the samples of a phase, oldest first"""
+        return self._times[row, self._order(row)]
@@ -0,0 +1,78 @@
+"""I²t overload accounting for the main fuse"""
+
+# Reference point of the trip curve: the fuse blows after carrying
+# TRIP_MULTIPLE x rated current for TRIP_SECONDS.
+DEFAULT_TRIP_MULTIPLE = 1.5
+DEFAULT_TRIP_SECONDS = 60
+
+# Share of the thermal budget above which the filter is bypassed
+PROTECTION_THRESHOLD = 0.8
+
+# Longest gap integrated as one step, older readings are not trusted
+MAX_STEP_SEC = 30
+
+
+class FuseThermalModel:
+    """Integrates squared overcurrent of one fuse phase over time
+
+    Current above the rating heats the fuse by (I² - In²) per second and
+    current below it cools the fuse at the same rate, so a short spike
+    uses a little of the budget and is forgotten again, while a sustained
+    overload uses it up.
+    """
+
+    def __init__(
+        self,
+        rated_current: float,
+        trip_multiple: float = DEFAULT_TRIP_MULTIPLE,
+        trip_seconds: float = DEFAULT_TRIP_SECONDS,
+    ) -> None:
+        self._trip_multiple = trip_multiple
+        self._trip_seconds = trip_seconds
+        self._rated_current = rated_current
+        self._heat = 0.0
+        self._current: float | None = None
+        self._updated: float | None = None
+
+    @property
+    def budget(self) -> float:
+        """Overload in A²s the fuse carries before it trips"""
+        return (
+            (self._trip_multiple**2 - 1) * self._rated_current**2 * self._trip_seconds
+        )
+
+    @property
+    def usage(self) -> float:
+        """Share of the thermal budget used, 1 means trip"""
+        if not self.budget:
+            return 0.0
+
+        return self._heat / self.budget
+
+    @property
+    def protecting(self) -> bool:
+        """True when the budget is nearly used and the filter must be bypassed"""
+        return self.usage >= PROTECTION_THRESHOLD
+
+    def update_rated_current(self, rated_current: float) -> None:
+        """Sets the rated current of the fuse"""
+        self._rated_current = rated_current
+
+    def update(self, current: float, now: float) -> float:
+        """Account for the fuse current measured at `now`, returns the usage"""
+        if self._updated is not None:
+            elapsed = min(now - self._updated, MAX_STEP_SEC)
+            if elapsed > 0:
+                # the previous reading held until now
+                overload = self._current**2 - self._rated_current**2
+                self._heat = min(max(0.0, self._heat + overload * elapsed), self.budget)
+
+        self._current = current
+        self._updated = now
+        return self.usage
+
+    def reset(self) -> None:
+        """Forget the accumulated heat"""
+        self._heat = 0.0
+        self._current = None
+        self._updated = None
@@ -0,0 +1,108 @@
+"""Fuse topology of a site, a tree of circuits"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+
+
+class Circuit:
+    """One fuse and the circuits behind it
+
+    `slack` is the room the fuse has on each phase for charging, as its
+    own balancer calculates from its meters. `claimed` is the total of
+    the limits handed out to chargers anywhere behind the fuse, kept up
+    to date along the path to the root whenever a circuit changes the
+    claim of its own chargers.
+
+    What a circuit can give its own chargers is the lowest, over every
+    fuse on its path to the root, of that fuse's slack less the claims
+    of all other chargers behind it. A meter update only touches the
+    slack of its own circuit, a claim and a headroom lookup walk the
+    path, so the cost follows the depth of the tree and not its size.
+    A fuse without a reading yet leaves no room, one that does not
+    measure a phase does not constrain that phase.
+    """
+
+    __slots__ = ("key", "parent", "children", "slack", "claimed", "own_claim")
+
+    def __init__(self, key: tuple) -> None:
+        self.key = key
+        self.parent: Circuit | None = None
+        self.children: list[Circuit] = []
+        self.slack: dict[str, float] | None = None
+        self.claimed: dict[str, float] = {}
+        self.own_claim: dict[str, float] = {}
+
+    def path(self) -> Iterator[Circuit]:
+        """The circuit and the fuses in front of it, up to the root"""
+        circuit: Circuit | None = self
+        while circuit:
+            yield circuit
+            circuit = circuit.parent
+
+    @property
+    def depth(self) -> int:
+        """Number of fuses in front of the circuit"""
+        return sum(1 for _ in self.path()) - 1
+
+    def attach(self, parent: Circuit) -> None:
+        """Put the circuit behind `parent`, with everything claimed behind it"""
+        if any(circuit is self for circuit in parent.path()):
+            raise ValueError(f"{parent.key} is behind {self.key}")
+
+        self.detach()
+        self.parent = parent
+        parent.children.append(self)
+        _add(parent.path(), self.claimed, 1)
+
+    def detach(self) -> None:
+        """Take the circuit and its claims out from behind its parent"""
+        if not self.parent:
+            return
+
+        _add(self.parent.path(), self.claimed, -1)
+        self.parent.children.remove(self)
+        self.parent = None
+
+    def update_slack(self, slack: dict[str, float] | None) -> None:
+        """Set the room on each phase, None while it is unknown"""
+        self.slack = slack
+
+    def claim(self, limits: dict[str, float]) -> None:
+        """Set the total of the limits given to the circuit's own chargers"""
+        delta = {
+            phase: limits.get(phase, 0.0) - self.own_claim.get(phase, 0.0)
+            for phase in self.own_claim.keys() | limits.keys()
+        }
+        self.own_claim = {phase: amps for phase, amps in limits.items() if amps}
+        _add(self.path(), delta, 1)
+
+    def headroom(self, phases: Iterable[str]) -> dict[str, float]:
+        """Room for the circuit's own chargers on each of `phases`
+
+        A fuse on the path without a reading yet leaves no room. Phases
+        no fuse on the path measures are left out.
+        """
+        phases = list(phases)
+        headroom: dict[str, float] = {}
+        for circuit in self.path():
+            if circuit.slack is None:
+                return dict.fromkeys(phases, 0.0)
+            for phase in phases:
+                if (slack := circuit.slack.get(phase)) is None:
+                    continue
+                room = (
+                    slack
+                    - circuit.claimed.get(phase, 0.0)
+                    + self.own_claim.get(phase, 0.0)
+                )
+                headroom[phase] = min(headroom.get(phase, room), room)
+
+        return headroom
+
+
+def _add(path: Iterable[Circuit], amounts: dict[str, float], sign: int) -> None:
+    for circuit in path:
+        claimed = circuit.claimed
+        for phase, amps in amounts.items():
+            claimed[phase] = claimed.get(phase, 0.0) + sign * amps
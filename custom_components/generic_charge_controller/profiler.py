@@ -0,0 +1,172 @@
+"""On demand profiling of the control loop"""
+
+import asyncio
+import cProfile
+from datetime import datetime
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+
+from .const import DATA_BALANCERS, DOMAIN, SERVICE_PROFILE
+
+ATTR_DURATION = "duration"
+ATTR_TICKS = "ticks"
+
+DEFAULT_DURATION_SEC = 60
+MAX_DURATION_SEC = 3600
+POLL_INTERVAL_SEC = 0.5
+REPORT_LINES = 40
+TRACEMALLOC_FRAMES = 10
+
+# what the report zooms in on, as pstats regular expressions
+FOCUS = {
+    "Control loop": r"loadbalancer/core.py.*\((_async_update|_async_tick)\)",
+    "EaseeCharger": r"easee/charger.py",
+    "Calculator": r"loadbalancer/calculator.py",
+}
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=DEFAULT_DURATION_SEC): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=MAX_DURATION_SEC)
+        ),
+        vol.Optional(ATTR_TICKS): cv.positive_int,
+    }
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _total_ticks(hass: HomeAssistant) -> int:
+    balancers = hass.data.get(DOMAIN, {}).get(DATA_BALANCERS, {})
+    return sum(balancer.metrics.ticks for balancer in balancers.values())
+
+
+def _write_report(
+    path: str,
+    profile: cProfile.Profile,
+    memory: list[tracemalloc.StatisticDiff],
+    header: str,
+) -> None:
+    stream = io.StringIO()
+    stream.write(header)
+
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    for title, pattern in FOCUS.items():
+        stream.write(f"\n=== {title} ===\n")
+        stats.print_stats(pattern, REPORT_LINES)
+
+    stream.write("\n=== Integration, by cumulative time ===\n")
+    stats.print_stats(DOMAIN, REPORT_LINES)
+
+    stream.write("\n=== Memory allocated during the run, by line ===\n")
+    for diff in memory[:REPORT_LINES]:
+        stream.write(f"{diff}\n")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    profile.dump_stats(f"{path}.prof")
+    with open(f"{path}.txt", "w", encoding="utf-8") as report:
+        report.write(stream.getvalue())
+
+
+class LoopProfiler:
+    """Profiles the event loop while the control loop runs
+
+    cProfile sees every call on the event loop thread, the report filters
+    out what belongs to the integration. tracemalloc compares the heap
+    before and after the run, limited to the integration's own files.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._running = False
+
+    async def async_profile(self, duration: float, ticks: int | None = None) -> str:
+        """Profile for `duration` seconds or `ticks` ticks, returns the report path"""
+        if self._running:
+            raise HomeAssistantError("A profiling run is already in progress")
+
+        self._running = True
+        try:
+            return await self._async_run(duration, ticks)
+        finally:
+            self._running = False
+
+    async def _async_run(self, duration: float, ticks: int | None) -> str:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as err:
+            if started_tracing:
+                tracemalloc.stop()
+            raise HomeAssistantError(f"Cannot start profiler: {err}") from err
+
+        start = time.monotonic()
+        first_tick = _total_ticks(self.hass)
+        try:
+            while time.monotonic() - start < duration:
+                if ticks and _total_ticks(self.hass) - first_tick >= ticks:
+                    break
+                await asyncio.sleep(POLL_INTERVAL_SEC)
+        finally:
+            profile.disable()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+        own_files = [tracemalloc.Filter(True, f"*{DOMAIN}*")]
+        memory = after.filter_traces(own_files).compare_to(
+            before.filter_traces(own_files), "lineno"
+        )
+        header = (
+            f"Profiled {time.monotonic() - start:.1f}s, "
+            f"{_total_ticks(self.hass) - first_tick} control loop ticks\n"
+        )
+
+        path = self.hass.config.path(DOMAIN, f"profile_{datetime.now():%Y%m%d_%H%M%S}")
+        await self.hass.async_add_executor_job(
+            _write_report, path, profile, memory, header
+        )
+        _LOGGER.info("Profile written to %s.txt", path)
+        return path
+
+
+@callback
+def async_register_services(hass: HomeAssistant) -> None:
+    """Register the profiling service"""
+    profiler = LoopProfiler(hass)
+
+    async def async_handle_profile(call: ServiceCall) -> ServiceResponse:
+        path = await profiler.async_profile(
+            call.data[ATTR_DURATION], call.data.get(ATTR_TICKS)
+        )
+        return {"report": f"{path}.txt", "stats": f"{path}.prof"}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_handle_profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
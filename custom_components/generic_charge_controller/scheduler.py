@@ -0,0 +1,294 @@
+"""Price aware start, stop and current of a charger"""
+
+from __future__ import annotations
+
+from datetime import datetime, time as dt_time, timedelta
+import functools
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    State,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import (
+    async_track_state_change_event,
+    async_track_time_interval,
+)
+from homeassistant.util import dt as dt_util
+
+from .abstract_charger import AbstractCharger
+from .const import DATA_CONTROLLERS, DOMAIN, SERVICE_PLAN_CHARGE
+from .loadbalancer.forecast import FORECAST_BUCKET_SEC
+from .loadbalancer.planner import NOMINAL_VOLTAGE, ChargePlanner, parse_prices
+
+ATTR_ENERGY = "energy_kwh"
+ATTR_READY_BY = "ready_by"
+
+PLAN_INTERVAL_SEC = 60
+# a start or stop the charger did not follow is sent again after this
+COMMAND_HOLD_SEC = 120
+# and at most this many times, e.g. for a vehicle that is full
+COMMAND_RETRIES = 2
+
+PLAN_CHARGE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Required(ATTR_ENERGY): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(ATTR_READY_BY): vol.Any(cv.datetime, cv.time),
+    }
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _deadline(ready_by: datetime | dt_time | None) -> float | None:
+    """Epoch seconds of `ready_by`, a time of day being the next one"""
+    if ready_by is None:
+        return None
+    if isinstance(ready_by, datetime):
+        return dt_util.as_utc(ready_by).timestamp()
+
+    now = dt_util.now()
+    deadline = datetime.combine(now.date(), ready_by, now.tzinfo)
+    if deadline <= now:
+        deadline += timedelta(days=1)
+    return deadline.timestamp()
+
+
+class ChargeScheduler:
+    """Starts, stops and limits a charger as a ChargePlanner plans
+
+    Prices are read from the raw_today and raw_tomorrow attributes of
+    `price_entity`, in the unit of `max_price`. The fuse headroom of a
+    slot is the one the balancer predicts from its load history, and the
+    energy delivered is integrated from the charger's phase currents.
+
+    The plan is moved on every PLAN_INTERVAL_SEC, on price updates and
+    on charger status changes, and the headroom is asked for again every
+    quarter hour. `charge_limit` is the current planned for now, None
+    while the planner has nothing to say. Start and stop are sent when
+    the plan and the charger disagree, see COMMAND_HOLD_SEC and
+    COMMAND_RETRIES; the retries start over on every charger status
+    change. A target is dropped when the vehicle is unplugged.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        charger: AbstractCharger,
+        balancer,
+        price_entity: str,
+        max_price: float | None = None,
+    ) -> None:
+        self.hass = hass
+        self._charger = charger
+        self._balancer = balancer
+        self._price_entity = price_entity
+        self.planner = ChargePlanner(
+            len(charger.phases),
+            self._max_current(),
+            max_price,
+            functools.partial(balancer.predicted_headroom, phases=charger.phases),
+        )
+        self._limit: float | None = None
+        self._plugged: bool | None = None
+        self._quarter: int | None = None
+        self._measured_at: float | None = None
+        self._measured_current = 0.0
+        self._command: str | None = None
+        self._command_at = float("-inf")
+        self._retries = 0
+        self.starts = 0
+        self.stops = 0
+
+    @property
+    def charge_limit(self) -> float | None:
+        """Current planned for now, None if not planned"""
+        return self._limit
+
+    def _max_current(self) -> float:
+        return self._charger.rated_current or self._balancer.rated_current
+
+    @callback
+    def async_subscribe(self) -> CALLBACK_TYPE:
+        """Follow prices and charger status, returns a callable to stop"""
+        unsubs = [
+            async_track_state_change_event(
+                self.hass, [self._price_entity], self._async_prices_changed
+            ),
+            async_track_time_interval(
+                self.hass, self._async_tick, timedelta(seconds=PLAN_INTERVAL_SEC)
+            ),
+            self._charger.async_add_status_listener(self._async_status_changed),
+        ]
+        if state := self.hass.states.get(self._price_entity):
+            self._update_prices(state)
+        self._plugged = self._is_plugged()
+        self._apply()
+
+        @callback
+        def unsubscribe() -> None:
+            while unsubs:
+                unsubs.pop()()
+
+        return unsubscribe
+
+    @callback
+    def async_plan(self, energy: float, deadline: float | None) -> None:
+        """Charge `energy` kWh by `deadline` as cheaply as possible, 0 to cancel"""
+        self._measure()
+        self.planner.set_target(energy or None, deadline)
+        self._command = None
+        self._apply()
+
+    def _update_prices(self, state: State) -> None:
+        changed = self.planner.update_prices(
+            parse_prices(state.attributes), time.time()
+        )
+        if changed:
+            _LOGGER.debug("%s price slots changed on %s", changed, self._price_entity)
+
+    def _is_plugged(self) -> bool:
+        return self._charger.charging or self._charger.can_start
+
+    def _measure(self) -> None:
+        """Take the energy delivered since the last call off the target"""
+        now = time.time()
+        current = sum(self._charger.phase_currents.values())
+        if self._measured_at is not None:
+            average = (self._measured_current + current) / 2
+            self.planner.consume(
+                average * NOMINAL_VOLTAGE * (now - self._measured_at) / 3.6e6
+            )
+        self._measured_at = now
+        self._measured_current = current
+
+    @callback
+    def _async_prices_changed(self, event: Event) -> None:
+        if (state := event.data.get("new_state")) is None:
+            return
+        self._update_prices(state)
+        self._apply()
+
+    @callback
+    def _async_status_changed(self) -> None:
+        self._measure()
+        plugged = self._is_plugged()
+        if self._plugged and not plugged:
+            self._command = None
+            if self.planner.energy is not None:
+                _LOGGER.info(
+                    "Vehicle unplugged with %.1f kWh of the target left, dropping it",
+                    self.planner.energy,
+                )
+                self.planner.set_target(None, None)
+        self._plugged = plugged
+        self._retries = 0
+        self._apply()
+
+    async def _async_tick(self, now=None) -> None:
+        self._measure()
+        timestamp = time.time()
+        self.planner.update_max_current(self._max_current())
+        quarter = int(timestamp // FORECAST_BUCKET_SEC)
+        if quarter != self._quarter:
+            self._quarter = quarter
+            self.planner.refresh_headroom()
+        self.planner.advance(timestamp)
+        self._apply()
+
+    def _apply(self) -> None:
+        """Set the planned current, starting or stopping the charger for it"""
+        now = time.time()
+        limit = self.planner.limit(now)
+        if limit != self._limit:
+            _LOGGER.debug("Planned limit %s -> %s", self._limit, limit)
+            self._limit = limit
+        if limit is None:
+            return
+
+        if limit > 0 and self._charger.can_start:
+            command = "start"
+        elif limit == 0 and self._charger.can_stop:
+            command = "stop"
+        else:
+            return
+
+        if command == self._command:
+            if now - self._command_at < COMMAND_HOLD_SEC:
+                return
+            if self._retries >= COMMAND_RETRIES:
+                return
+            self._retries += 1
+        else:
+            self._command = command
+            self._retries = 0
+
+        self._command_at = now
+        self.hass.async_create_task(self._async_send(command))
+
+    async def _async_send(self, command: str) -> None:
+        _LOGGER.info("Sending %s to the charger as planned", command)
+        try:
+            if command == "start":
+                self.starts += 1
+                await self._charger.start()
+            else:
+                self.stops += 1
+                await self._charger.stop()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.error(
+                "Planned %s failed: %s", command, str(err) or type(err).__name__
+            )
+
+    def as_dict(self) -> dict:
+        """Plan and commands sent, for diagnostics"""
+        return {
+            "price_entity": self._price_entity,
+            "charge_limit": self._limit,
+            "starts": self.starts,
+            "stops": self.stops,
+            **self.planner.as_dict(),
+        }
+
+
+@callback
+def async_register_services(hass: HomeAssistant) -> None:
+    """Register the charge planning service"""
+
+    async def async_handle_plan_charge(call: ServiceCall) -> None:
+        entity_ids = call.data[ATTR_ENTITY_ID]
+        controllers = [
+            controller
+            for controller in hass.data.get(DOMAIN, {})
+            .get(DATA_CONTROLLERS, {})
+            .values()
+            if controller.entity_id in entity_ids
+        ]
+        if not controllers:
+            raise HomeAssistantError(f"No charge controller {', '.join(entity_ids)}")
+
+        deadline = _deadline(call.data.get(ATTR_READY_BY))
+        for controller in controllers:
+            if not controller.scheduler:
+                raise HomeAssistantError(
+                    f"{controller.entity_id} has no spot price sensor configured"
+                )
+            controller.scheduler.async_plan(call.data[ATTR_ENERGY], deadline)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PLAN_CHARGE,
+        async_handle_plan_charge,
+        schema=PLAN_CHARGE_SCHEMA,
+    )
@@ -1,55 +1,97 @@
-"""Support for MQTT sensors."""
+"""Charge controller sensor of each charger and its diagnostic sensors"""
+
 from __future__ import annotations
 
-import collections
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import timedelta
 import logging
+import time
 
 from .abstract_charger import AbstractCharger
 from .easee.charger import EaseeCharger
-import voluptuous as vol
 
-from homeassistant.components import sensor
-from homeassistant.components.sensor import PLATFORM_SCHEMA, SensorEntity
+from homeassistant.components.sensor import SensorEntity
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     CONF_NAME,
-    CONF_UNIQUE_ID,
-    STATE_ON,
-    STATE_UNAVAILABLE,
     STATE_OFF,
+    EntityCategory,
+    UnitOfEnergy,
+    UnitOfTime,
+)
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.components.sensor import (
+    SensorEntityDescription,
+    SensorStateClass,
 )
-from homeassistant.core import HomeAssistant, callback
-from homeassistant.components.sensor import SensorStateClass
-from homeassistant.exceptions import HomeAssistantError, PlatformNotReady
-import homeassistant.helpers.config_validation as cv
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.device_registry import async_get as async_get_dev_reg
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.entity_registry import async_get as async_get_entity_reg
-from homeassistant.helpers.event import (
-    async_track_time_interval,
-    async_track_state_change,
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.typing import StateType
+from homeassistant.util import dt as dt_util
+
+
+from .scheduler import ChargeScheduler
+from .storage import async_get_store
+from .loadbalancer.core import DynamicLoadBalancer, async_get_balancer
+from .loadbalancer.policy import (
+    DEFAULT_COMMAND_TTL_MIN,
+    DEFAULT_INCREASE_DEADBAND,
+    DEFAULT_INCREASE_INTERVAL_SEC,
+    SENT,
+    CommandPolicy,
 )
-from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-
-
-from .loadbalancer.calculator import Calculator
 from .const import (
+    CONF_ACC_MAX_PRICE_CENTS,
+    CONF_CHARGER_PHASES,
     CONF_CHRG_DOMAIN,
     CONF_CHRG_ID,
+    CONF_COMMAND_TTL,
     CONF_ENTITYID_CURR_P1,
     CONF_ENTITYID_CURR_P2,
     CONF_ENTITYID_CURR_P3,
+    CONF_ENTITYID_PRICE_CENTS,
+    CONF_FILTER_STRATEGY,
+    CONF_FILTER_WINDOW,
+    CONF_INCREASE_DEADBAND,
+    CONF_INCREASE_INTERVAL,
+    CONF_LIMIT_CHANGE_THRESHOLD,
+    CONF_MAX_SAMPLE_AGE,
+    CONF_PARENT_ENTITYID_CURR_P1,
+    CONF_PARENT_ENTITYID_CURR_P2,
+    CONF_PARENT_ENTITYID_CURR_P3,
+    CONF_PARENT_RATED_CURRENT,
+    CONF_PHASE_SWITCHING,
     CONF_RATED_CURRENT,
+    CONF_SAMPLING_MODE,
+    CONF_SPIKE_THRESHOLD,
+    CONF_STALE_FALLBACK_LIMIT,
+    CONF_STATE_MIN_INTERVAL,
+    DATA_CONTROLLERS,
+    DEFAULT_CHARGER_PHASES,
+    DEFAULT_LIMIT_CHANGE_THRESHOLD,
+    DEFAULT_MAX_SAMPLE_AGE_SEC,
+    DEFAULT_STALE_FALLBACK_LIMIT,
+    DEFAULT_SAMPLING_MODE,
+    DEFAULT_STATE_MIN_INTERVAL_SEC,
+    DEFAULT_WINDOW_SIZE,
     DOMAIN,
+    FILTER_MEAN,
     PHASE1,
     PHASE2,
     PHASE3,
+    CHRG_DOMAIN_EASEE,
+    ATTR_COMMANDS_SENT,
+    ATTR_COMMANDS_SUPPRESSED,
     ATTR_LIMIT_Px,
+    ATTR_PLANNED_LIMIT,
+    ATTR_SAMPLE_INTERVAL,
 )
-from .exceptions import NoSensorsError
 
-DEFAULT_SAMPLE_INTERVAL_SEC = 5
+SCAN_INTERVAL = timedelta(seconds=30)  # diagnostic sensors
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -59,205 +101,473 @@ async def async_setup_entry(
 ) -> None:
     """Set up the charger sensor(s)"""
 
-    entity_registry = async_get_entity_reg(hass)
-    device_registry = async_get_dev_reg(hass)
-
-    _LOGGER.warning("Setup request")
-    phases = {
-        PHASE1: ElectricalPhase(PHASE1, entry.data.get(CONF_ENTITYID_CURR_P1), None)
-    }
+    _LOGGER.debug("Setup request")
+    phase_entities = {PHASE1: entry.data.get(CONF_ENTITYID_CURR_P1)}
 
-    charger_dev = device_registry.async_get(entry.data.get(CONF_CHRG_ID))
-
-    if not charger_dev:
-        raise HomeAssistantError(
-            "Device ID %s is not found in registry", entry.data.get(CONF_CHRG_ID)
+    if not async_get_dev_reg(hass).async_get(entry.data.get(CONF_CHRG_ID)):
+        # the charger becomes ready once its integration adds the device
+        _LOGGER.debug(
+            "Device ID %s not in the registry yet", entry.data.get(CONF_CHRG_ID)
         )
 
     if entry.data.get(CONF_CHRG_DOMAIN) != "easee":
         raise HomeAssistantError("Currently only EASEE chargers are supported")
 
-    charger = EaseeCharger(hass, _LOGGER, entry.data.get(CONF_CHRG_ID), entry.unique_id)
+    policy = CommandPolicy(
+        increase_deadband=entry.data.get(
+            CONF_INCREASE_DEADBAND, DEFAULT_INCREASE_DEADBAND
+        ),
+        increase_interval=entry.data.get(
+            CONF_INCREASE_INTERVAL, DEFAULT_INCREASE_INTERVAL_SEC
+        ),
+        ttl_minutes=entry.data.get(CONF_COMMAND_TTL, DEFAULT_COMMAND_TTL_MIN),
+    )
+    store = await async_get_store(hass)
+    store.restore_policy(entry.unique_id, policy)
+    charger = EaseeCharger(
+        hass,
+        _LOGGER,
+        entry.data.get(CONF_CHRG_ID),
+        entry.unique_id,
+        policy,
+        phase_count=entry.data.get(CONF_CHARGER_PHASES, DEFAULT_CHARGER_PHASES),
+        phase_switching=entry.data.get(CONF_PHASE_SWITCHING, False),
+    )
 
     if p2_entity := entry.data.get(CONF_ENTITYID_CURR_P2):
-        phases[PHASE2] = ElectricalPhase(PHASE2, p2_entity, None)
+        phase_entities[PHASE2] = p2_entity
 
     if p3_entity := entry.data.get(CONF_ENTITYID_CURR_P3):
-        phases[PHASE3] = ElectricalPhase(PHASE3, p3_entity, None)
+        phase_entities[PHASE3] = p3_entity
+
+    balancer_options = {
+        "max_sample_age": entry.data.get(
+            CONF_MAX_SAMPLE_AGE, DEFAULT_MAX_SAMPLE_AGE_SEC
+        ),
+        "stale_limit": entry.data.get(
+            CONF_STALE_FALLBACK_LIMIT, DEFAULT_STALE_FALLBACK_LIMIT
+        ),
+        "filter_strategy": entry.data.get(CONF_FILTER_STRATEGY, FILTER_MEAN),
+        "spike_threshold": entry.data.get(CONF_SPIKE_THRESHOLD, 0),
+    }
+    parent = None
+    parent_entities = {
+        phase_id: entity_id
+        for phase_id, conf in (
+            (PHASE1, CONF_PARENT_ENTITYID_CURR_P1),
+            (PHASE2, CONF_PARENT_ENTITYID_CURR_P2),
+            (PHASE3, CONF_PARENT_ENTITYID_CURR_P3),
+        )
+        if (entity_id := entry.data.get(conf))
+    }
+    if PHASE1 in parent_entities:
+        # the main fuse's own entry with the same sensors shares this balancer
+        parent = async_get_balancer(
+            hass,
+            parent_entities,
+            entry.data.get(CONF_PARENT_RATED_CURRENT),
+            entry.data.get(CONF_FILTER_WINDOW, DEFAULT_WINDOW_SIZE),
+            entry.data.get(CONF_SAMPLING_MODE, DEFAULT_SAMPLING_MODE),
+            store,
+            **balancer_options,
+        )
 
-    async_add_entities(
-        [
-            ChargeControllerSensor(
-                hass,
-                entry.data.get(CONF_NAME),
-                entry.unique_id,
-                phases,
-                charger,
-            )
-        ]
+    balancer = async_get_balancer(
+        hass,
+        phase_entities,
+        entry.data.get(CONF_RATED_CURRENT),
+        entry.data.get(CONF_FILTER_WINDOW, DEFAULT_WINDOW_SIZE),
+        entry.data.get(CONF_SAMPLING_MODE, DEFAULT_SAMPLING_MODE),
+        store,
+        parent=parent,
+        **balancer_options,
     )
 
+    scheduler = None
+    if price_entity := entry.data.get(CONF_ENTITYID_PRICE_CENTS):
+        scheduler = ChargeScheduler(
+            hass,
+            charger,
+            balancer,
+            price_entity,
+            entry.data.get(CONF_ACC_MAX_PRICE_CENTS),
+        )
+        store.restore_plan(entry.unique_id, scheduler.planner)
 
-class ElectricalPhase:
-    """Holds data for each phase"""
-
-    def __init__(self, phase: str, entity_id: str, target_current: float) -> None:
-        self._phase = phase
-        self._entity_id = entity_id
-        self._target_current = target_current
-        self._samples = collections.deque(
-            [], 60
-        )  # 60 x 5 seconds => 5 minutes of samples
-
-    @property
-    def phase_id(self):
-        """Phase ID"""
-        return self._phase
-
-    @property
-    def entity_id(self):
-        """Entity ID"""
-        return self._entity_id
+    controller = ChargeControllerSensor(
+        hass,
+        entry.data.get(CONF_NAME),
+        entry.unique_id,
+        balancer,
+        charger,
+        entry.data.get(CONF_STATE_MIN_INTERVAL, DEFAULT_STATE_MIN_INTERVAL_SEC),
+        entry.data.get(CONF_LIMIT_CHANGE_THRESHOLD, DEFAULT_LIMIT_CHANGE_THRESHOLD),
+        scheduler,
+    )
+    hass.data[DOMAIN].setdefault(DATA_CONTROLLERS, {})[entry.entry_id] = controller
 
-    @property
-    def target_current(self):
-        """Target current on the phase"""
-        return self._target_current
+    async_add_entities(
+        [controller]
+        + [
+            ControllerDiagnosticSensor(controller, description)
+            for description in DIAGNOSTIC_SENSORS
+        ]
+    )
 
-    @property
-    def samples(self) -> collections.deque:
-        """Samples"""
-        return self._samples
 
-    def add_sample(self, measurement: float) -> None:
-        self._samples.append(measurement)
+class ChargeControllerSensor(SensorEntity):
+    """Representation of a Sensor.
 
-    def update_target(self, new_target_current: float) -> None:
-        """Sets the target current on the phase"""
-        _LOGGER.debug(
-            "Update target current on phase %s to %s", self._phase, new_target_current
-        )
-        self._target_current = new_target_current
+    The balancer pushes an allocation every tick, but the state is only
+    written when it changes or a phase limit moves by `limit_threshold`
+    amps. Other attributes ride along with those writes, and changes to
+    the limits alone are written at most every `min_interval` seconds.
 
+    With a `scheduler`, the charger is started, stopped and limited as
+    planned over the spot prices.
+    """
 
-class ChargeControllerSensor(SensorEntity):
-    """Representation of a Sensor."""
+    _attr_should_poll = False
 
     def __init__(
         self,
         hass,
         name,
         unique_id,
-        phases: dict[str, ElectricalPhase],
+        balancer: DynamicLoadBalancer,
         charger: AbstractCharger,
+        min_interval: float = DEFAULT_STATE_MIN_INTERVAL_SEC,
+        limit_threshold: int = DEFAULT_LIMIT_CHANGE_THRESHOLD,
+        scheduler: ChargeScheduler | None = None,
     ) -> None:
         """Initialize the controller."""
-        try:
-            self._attr_name = name
-            self._attr_unique_id = unique_id
-            self.hass = hass  # hass
-            self._phases: dict[str, ElectricalPhase] = phases
-
-            # self.state_class = SensorStateClass.MEASUREMENT
-            self._state = STATE_OFF
+        self._attr_name = name
+        self._attr_unique_id = unique_id
+        self.hass = hass  # hass
+        self._balancer = balancer
+        self._targets: dict[str, int] = {}
+        self._min_interval = min_interval
+        self._limit_threshold = limit_threshold
+        self._attributes: dict = {}
+        self._published_state: str | None = None
+        self._published_targets: dict[str, int] = {}
+        self._published_at = 0.0
+        self._published_ready = False
+        self._cancel_write: CALLBACK_TYPE | None = None
+
+        # self.state_class = SensorStateClass.MEASUREMENT
+        self._state = STATE_OFF
+
+        self._charger = charger
+        self._scheduler = scheduler
+
+        self._icon = "mdi:car-speed-limiter"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, unique_id)},
+            name=name or f"Charge controller {unique_id}",
+            via_device=(CHRG_DOMAIN_EASEE, unique_id),
+        )
 
-            self._charger = charger
+        _LOGGER.debug("Succesfully initialized sensor")
 
-            # 6 samples, 5 seconds sampling -> 30 seconds mean calc
+    @property
+    def charger(self) -> AbstractCharger:
+        """The controlled charger"""
+        return self._charger
 
-            self._icon = "mdi:car-speed-limiter"
+    @property
+    def balancer(self) -> DynamicLoadBalancer:
+        """Balancer of the fuse the charger is behind"""
+        return self._balancer
 
-            async_track_time_interval(
-                self.hass,
-                self._async_update,
-                timedelta(seconds=DEFAULT_SAMPLE_INTERVAL_SEC),
-            )
+    @property
+    def scheduler(self) -> ChargeScheduler | None:
+        """Price aware planning of the charge, if a price sensor is set"""
+        return self._scheduler
 
-            _LOGGER.debug("Succesfully initialized sensor")
+    @property
+    def charge_limit(self) -> float | None:
+        """Current planned for now, None if not planned"""
+        return self._scheduler.charge_limit if self._scheduler else None
+
+    async def async_added_to_hass(self) -> None:
+        """Join the load balancing of the fuse once the entity is registered."""
+        self.async_on_remove(self._charger.async_subscribe())
+        self.async_on_remove(
+            self._charger.async_add_status_listener(self._async_readiness_changed)
+        )
+        if self._scheduler:
+            self.async_on_remove(self._scheduler.async_subscribe())
+        self.async_on_remove(self._balancer.async_register(self))
+        self.async_on_remove(self._async_cancel_write)
 
-            self.schedule_update_ha_state()
-        except Exception as err:
-            raise PlatformNotReady from err
+    @property
+    def available(self) -> bool:
+        """Unavailable until the charger's entities are found"""
+        return self._charger.ready
 
     @callback
-    async def _do_balancing(self, now=None):
-        await self._charger.update_limits(
-            dict(map(lambda kv: (kv[0], kv[1].target_current), self._phases.items()))
-        )
+    def _async_readiness_changed(self) -> None:
+        if self._charger.ready != self._published_ready:
+            self._publish()
 
     @callback
-    async def _async_update(self, now=None):
-        self._update_phase_currents()
-        if self._state == STATE_UNAVAILABLE:
-            raise PlatformNotReady("Sensors unavailable, cannot do load balancing")
-
-        if self._charger.charging:
-            _LOGGER.debug("Charging detected, balancing")
-            self._set_state(STATE_ON)
-            await self._do_balancing()
-        else:
-            _LOGGER.debug("No charging detected")
-            self._set_state(STATE_OFF)
-
-    def _has_valid_value(self, entity_state) -> bool:
-        return entity_state and entity_state.state is not STATE_UNAVAILABLE
-
-    def _update_phase_currents(self):
-        """Update local phase currents from source sensors."""
-        calculator = Calculator(_LOGGER, self._charger.rated_current)
-        charger_currents = self._charger.phase_currents
-
-        # if not self._charger_power:
-        #     raise HomeAssistantError("Charger power not available")
-
-        if not self._phases:
-            raise NoSensorsError("Phase sensor(s) not available")
-
-        for phase_data in self._phases.values():
-            state = self.hass.states.get(phase_data.entity_id)
-
-            _LOGGER.debug(state.as_dict())
-            if not state or state.state == STATE_UNAVAILABLE:
-                self._set_state(STATE_UNAVAILABLE)
-                return
-
-            phase_data.add_sample(
-                float(state.state) - charger_currents[phase_data.phase_id]
-            )
+    def async_update_allocation(self, state, targets: dict[str, int] | None):
+        """Called by the balancer with this charger's share of the fuse."""
+        self._targets = targets or {}
+        self._set_state(state)
 
-            new_target = calculator.calculate_target_with_filter(phase_data)
-            _LOGGER.debug("Running mean: %s", new_target)
-
-            if phase_data.target_current != new_target:
-                _LOGGER.debug(
-                    "New target current on %s, %s -> %s",
-                    phase_data.phase_id,
-                    phase_data.target_current,
-                    new_target,
-                )
-                phase_data.update_target(new_target)
-        self._set_state(STATE_OFF)
+    @property
+    def native_value(self) -> StateType:
+        """Balancing state"""
+        return self._state
 
     @property
     def state_attributes(self):
-        """Return the attributes of the entity."""
+        """Return the attributes of the entity, as of the last write."""
+        return self._attributes
+
+    def _build_attributes(self) -> dict:
         attributes = {}
 
         for phase in (PHASE1, PHASE2, PHASE3):
-            if value := self._phases.get(phase):
-                attributes[ATTR_LIMIT_Px % phase] = value.target_current
-            else:
-                attributes[ATTR_LIMIT_Px % phase] = None
+            attributes[ATTR_LIMIT_Px % phase] = self._targets.get(phase)
 
         attributes["Current charger power (A)"] = 0
+        attributes[ATTR_SAMPLE_INTERVAL] = self._balancer.sample_interval
+        if self._scheduler:
+            attributes[ATTR_PLANNED_LIMIT] = self._scheduler.charge_limit
+
+        if policy := self._charger.command_policy:
+            counters = policy.counters
+            attributes[ATTR_COMMANDS_SENT] = counters.pop(SENT, 0)
+            attributes[ATTR_COMMANDS_SUPPRESSED] = sum(counters.values())
         return attributes
 
     def _set_state(self, state):
-        """Setting sensor to given state."""
+        """Setting sensor to given state, written only if it changed."""
         self._state = state
-        self.schedule_update_ha_state()
+        if not self._changed():
+            return
+
+        wait = self._published_at + self._min_interval - time.monotonic()
+        if state != self._published_state or wait <= 0:
+            self._publish()
+        elif not self._cancel_write:
+            self._cancel_write = async_call_later(
+                self.hass, wait, self._async_write_deferred
+            )
+
+    def _changed(self) -> bool:
+        """True if the state or a limit differs from what was last written."""
+        if self._state != self._published_state:
+            return True
+
+        for phase in (PHASE1, PHASE2, PHASE3):
+            old = self._published_targets.get(phase)
+            new = self._targets.get(phase)
+            if old is None or new is None:
+                if old != new:
+                    return True
+            elif abs(new - old) >= self._limit_threshold:
+                return True
+
+        return False
+
+    def _publish(self) -> None:
+        self._async_cancel_write()
+        self._attributes = self._build_attributes()
+        self._published_state = self._state
+        self._published_targets = dict(self._targets)
+        self._published_at = time.monotonic()
+        self._published_ready = self._charger.ready
+        self.async_write_ha_state()
+
+    @callback
+    def _async_write_deferred(self, _now) -> None:
+        self._cancel_write = None
+        if self._changed():
+            self._publish()
+
+    @callback
+    def _async_cancel_write(self) -> None:
+        if self._cancel_write:
+            self._cancel_write()
+            self._cancel_write = None
 
     @property
     def rated_current(self):
         """Rated current"""
         return self._rated_current
+
+
+def _suppressed(controller: ChargeControllerSensor) -> dict[str, int]:
+    if not (policy := controller.charger.command_policy):
+        return {}
+
+    counters = policy.counters
+    counters.pop(SENT, None)
+    return counters
+
+
+def _latency(controller: ChargeControllerSensor) -> float | None:
+    if not (histogram := controller.charger.call_latency):
+        return None
+
+    return _round(histogram.mean)
+
+
+def _actuation(controller: ChargeControllerSensor) -> float | None:
+    if not (tracker := controller.charger.actuation):
+        return None
+
+    return _round(tracker.latency.mean)
+
+
+def _plan(controller: ChargeControllerSensor) -> dict:
+    if not (scheduler := controller.scheduler):
+        return {}
+
+    planner = scheduler.planner
+    return {
+        "planned_limit": scheduler.charge_limit,
+        "ready_by": (
+            dt_util.utc_from_timestamp(planner.deadline).isoformat()
+            if planner.deadline
+            else None
+        ),
+        "shortfall_kwh": _round(planner.shortfall),
+        "next_charge": next(
+            (slot["start"] for slot in planner.schedule() if slot["amps"]), None
+        ),
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 2)
+
+
+@dataclass(frozen=True, kw_only=True)
+class ControllerDiagnosticDescription(SensorEntityDescription):
+    """Describes a control loop value published as a diagnostic sensor"""
+
+    value_fn: Callable[[ChargeControllerSensor], StateType]
+    attrs_fn: Callable[[ChargeControllerSensor], dict] | None = None
+
+
+DIAGNOSTIC_SENSORS = (
+    ControllerDiagnosticDescription(
+        key="tick_duration",
+        name="Tick duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _round(c.balancer.metrics.tick_duration.mean),
+    ),
+    ControllerDiagnosticDescription(
+        key="command_latency",
+        name="Limit command latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_latency,
+    ),
+    ControllerDiagnosticDescription(
+        key="actuation_latency",
+        name="Limit actuation latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_actuation,
+    ),
+    ControllerDiagnosticDescription(
+        key="charge_plan",
+        name="Planned charge energy",
+        native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        value_fn=lambda c: _round(c.scheduler.planner.energy) if c.scheduler else None,
+        attrs_fn=_plan,
+    ),
+    ControllerDiagnosticDescription(
+        key="commands_sent",
+        name="Limit commands sent",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: (
+            c.charger.command_policy.counters.get(SENT, 0)
+            if c.charger.command_policy
+            else None
+        ),
+    ),
+    ControllerDiagnosticDescription(
+        key="commands_suppressed",
+        name="Limit commands suppressed",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: sum(_suppressed(c).values()),
+        attrs_fn=_suppressed,
+    ),
+    ControllerDiagnosticDescription(
+        key="command_failures",
+        name="Limit command failures",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: (
+            c.charger.command_dispatcher.failures
+            if c.charger.command_dispatcher
+            else None
+        ),
+    ),
+    ControllerDiagnosticDescription(
+        key="unavailable_events",
+        name="Unavailable phase readings",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: c.balancer.metrics.unavailable_events,
+    ),
+    ControllerDiagnosticDescription(
+        key="skipped_ticks",
+        name="Skipped ticks",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: c.balancer.metrics.skipped_ticks,
+    ),
+    ControllerDiagnosticDescription(
+        key="sample_age",
+        name="Last sample age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _round(
+            max(filter(None, c.balancer.sample_ages().values()), default=None)
+        ),
+    ),
+)
+
+
+class ControllerDiagnosticSensor(SensorEntity):
+    """Control loop figure shown on the controller device
+
+    Disabled until the user enables it, as each one records a value on
+    every poll. Histograms and other breakdowns that change with every
+    tick are left to the diagnostics download.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_has_entity_name = True
+
+    entity_description: ControllerDiagnosticDescription
+
+    def __init__(
+        self,
+        controller: ChargeControllerSensor,
+        description: ControllerDiagnosticDescription,
+    ) -> None:
+        self.entity_description = description
+        self._controller = controller
+        self._attr_unique_id = f"{controller.unique_id}_{description.key}"
+        self._attr_device_info = controller.device_info
+
+    @property
+    def native_value(self) -> StateType:
+        """Current value"""
+        return self.entity_description.value_fn(self._controller)
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        """Breakdown of the value"""
+        if not self.entity_description.attrs_fn:
+            return None
+
+        return self.entity_description.attrs_fn(self._controller)
@@ -0,0 +1,186 @@
+"""Persistence of phase samples, limits and charge plans across restarts"""
+
+from __future__ import annotations
+
+from array import array
+import base64
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_BALANCERS, DATA_STORE, DOMAIN
+from .loadbalancer.forecast import LoadForecast
+from .loadbalancer.phase import ElectricalPhase
+from .loadbalancer.planner import ChargePlanner
+from .loadbalancer.policy import CommandPolicy
+
+STORAGE_VERSION = 1
+STORAGE_KEY = DOMAIN
+SAVE_DELAY_SEC = 60
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_get_store(hass: HomeAssistant) -> ChargeControllerStore:
+    """Get the integration store, loading it on first use"""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_STORE not in domain_data:
+        store = ChargeControllerStore(hass)
+        await store.async_load()
+        domain_data[DATA_STORE] = store
+
+    return domain_data[DATA_STORE]
+
+
+def _pack(typecode: str, values) -> str:
+    return base64.b64encode(array(typecode, values).tobytes()).decode()
+
+
+def _unpack(typecode: str, data: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+class ChargeControllerStore:
+    """Saves the phase buffers of every fuse and the last limits of every
+    charger, so load balancing starts from filtered values after a restart.
+    The load forecast of every fuse and the charge target of every
+    charger are kept as well.
+
+    Samples are kept as packed float32 values with uint16 ages in seconds
+    before the newest sample. Writes are delayed and at most one is
+    pending at a time; the Store helper flushes a pending one on shutdown.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data: dict = {}
+        self._save_pending = False
+
+    async def async_load(self) -> None:
+        """Read the stored data"""
+        self._data = await self._store.async_load() or {}
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Save soon, unless a save is already waiting"""
+        if self._save_pending:
+            return
+
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY_SEC)
+
+    def restore_phases(
+        self, key: tuple, phases: dict[str, ElectricalPhase], max_age: float
+    ) -> None:
+        """Refill phase buffers with the stored samples younger than max_age"""
+        stored = self._data.get("fuses", {}).get("|".join(key), {})
+        now = time.time()
+
+        for phase_id, phase_data in phases.items():
+            if not (packed := stored.get(phase_id)):
+                continue
+
+            try:
+                ages = _unpack("H", packed["ages"])
+                values = _unpack("f", packed["values"])
+            except (KeyError, ValueError) as err:
+                _LOGGER.warning("Ignoring stored samples of %s: %s", phase_id, err)
+                continue
+
+            restored = 0
+            for age, value in zip(ages, values):
+                timestamp = packed["time"] - age
+                if now - timestamp <= max_age:
+                    phase_data.add_sample(value, timestamp)
+                    restored += 1
+
+            _LOGGER.debug("Restored %s samples on %s", restored, phase_id)
+
+    def restore_policy(self, unique_id: str, policy: CommandPolicy) -> None:
+        """Restore the last limits sent to a charger if they are still live"""
+        if not (stored := self._data.get("limits", {}).get(unique_id)):
+            return
+
+        age = time.time() - stored["time"]
+        if age < policy.ttl_minutes * 60:
+            policy.restore(stored["limits"], time.monotonic() - age)
+
+    def restore_forecast(self, key: tuple, forecast: LoadForecast) -> None:
+        """Restore the load forecast of a fuse"""
+        if stored := self._data.get("forecasts", {}).get("|".join(key)):
+            forecast.restore(stored)
+
+    def restore_plan(self, unique_id: str, planner: ChargePlanner) -> None:
+        """Restore the charge target of a charger unless its deadline passed"""
+        if not (stored := self._data.get("plans", {}).get(unique_id)):
+            return
+
+        deadline = stored["deadline"]
+        if deadline is None or deadline > time.time():
+            planner.set_target(stored["energy"], deadline)
+
+    @callback
+    def async_save_balancer(self, balancer) -> None:
+        """Keep the state of a balancer that is going away and save it"""
+        self._update_balancer(balancer)
+        self.async_schedule_save()
+
+    def _update_balancer(self, balancer) -> None:
+        fuses = self._data.setdefault("fuses", {})
+        limits = self._data.setdefault("limits", {})
+        plans = self._data.setdefault("plans", {})
+
+        fuses["|".join(balancer.key)] = {
+            phase_id: self._pack_phase(phase_data)
+            for phase_id, phase_data in balancer.phases.items()
+            if phase_data.sample_count
+        }
+        if balancer.forecast.known:
+            self._data.setdefault("forecasts", {})[
+                "|".join(balancer.key)
+            ] = balancer.forecast.as_dict()
+
+        for controller in balancer.controllers:
+            policy = controller.charger.command_policy
+            if policy and policy.last_limits:
+                limits[controller.unique_id] = {
+                    "time": time.time() - (time.monotonic() - policy.last_sent),
+                    "limits": policy.last_limits,
+                }
+
+            if scheduler := controller.scheduler:
+                planner = scheduler.planner
+                if planner.energy is None:
+                    plans.pop(controller.unique_id, None)
+                else:
+                    plans[controller.unique_id] = {
+                        "energy": planner.energy,
+                        "deadline": planner.deadline,
+                    }
+
+    def _data_to_save(self) -> dict:
+        self._save_pending = False
+        balancers = self.hass.data.get(DOMAIN, {}).get(DATA_BALANCERS, {})
+        for balancer in balancers.values():
+            self._update_balancer(balancer)
+
+        return self._data
+
+    def _pack_phase(self, phase_data: ElectricalPhase) -> dict:
+        newest = phase_data.latest_sample_time
+        return {
+            "time": newest,
+            "ages": _pack(
+                "H",
+                (
+                    min(round(newest - t), 0xFFFF)
+                    for t in phase_data.sample_times.tolist()
+                ),
+            ),
+            "values": _pack("f", phase_data.samples.tolist()),
+        }
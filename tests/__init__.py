@@ -0,0 +1 @@
+"""Tests for the generic charge controller"""
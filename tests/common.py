@@ -0,0 +1,73 @@
+"""Chargers and controllers the balancer can be driven with"""
+
+import asyncio
+import functools
+
+from custom_components.generic_charge_controller.abstract_charger import (
+    AbstractCharger,
+)
+from custom_components.generic_charge_controller.const import PHASE1, PHASE2, PHASE3
+
+PHASES = (PHASE1, PHASE2, PHASE3)
+
+
+def async_test(func):
+    """Run a coroutine test in an event loop of its own"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        asyncio.run(func(*args, **kwargs))
+
+    return wrapper
+
+
+class StubCharger(AbstractCharger):
+    """Charger drawing fixed currents and recording the limits it gets"""
+
+    def __init__(self, currents: float = 0.0, reported: float | None = None) -> None:
+        self.currents = dict.fromkeys(PHASES, currents)
+        self.reported = reported
+        self.limits: list[dict[str, float]] = []
+        self.is_charging = True
+
+    async def start(self) -> None:
+        self.is_charging = True
+
+    async def stop(self) -> None:
+        self.is_charging = False
+
+    async def update_limits(self, phases: dict[str, float]) -> None:
+        self.limits.append(phases)
+
+    @property
+    def phase_currents(self) -> dict[str, float]:
+        return self.currents
+
+    @property
+    def currents_reported(self) -> float | None:
+        return self.reported
+
+    @property
+    def rated_current(self) -> float:
+        return 32
+
+    @property
+    def charging(self) -> bool:
+        return self.is_charging
+
+
+class StubController:
+    """What the balancer needs of a charge controller"""
+
+    scheduler = None
+    charge_limit = None
+
+    def __init__(self, charger: AbstractCharger, unique_id: str) -> None:
+        self.charger = charger
+        self.unique_id = unique_id
+        self.state = None
+        self.targets = None
+
+    def async_update_allocation(self, state, targets) -> None:
+        self.state = state
+        self.targets = targets
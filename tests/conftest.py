@@ -0,0 +1,20 @@
+"""Fixtures driving the integration on the fake Home Assistant of the benchmarks"""
+
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_hass import FakeHass, patch_integration  # noqa: E402
+
+
+@pytest.fixture
+def hass(monkeypatch) -> FakeHass:
+    """Fake hass with the integration modules pointed at it until the test ends"""
+    hass = FakeHass()
+    patch_integration(hass, monkeypatch.setattr)
+    return hass
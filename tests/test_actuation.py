@@ -0,0 +1,75 @@
+"""Acknowledgment and reissue of limit commands"""
+
+from custom_components.generic_charge_controller.loadbalancer.actuation import (
+    ActuationTracker,
+)
+
+LIMITS = {"P1": 16.0}
+
+
+def _tracking(reissues: int = 2) -> ActuationTracker:
+    tracker = ActuationTracker(timeout=60, reissues=reissues)
+    tracker.observe({"P1": 10.0}, 32, 0)
+    return tracker
+
+
+def test_matching_report_confirms_the_command():
+    tracker = _tracking()
+    tracker.sent(LIMITS, 0, 0)
+    assert tracker.awaiting
+
+    tracker.observe({"P1": 16.2}, 32, 3)
+
+    assert not tracker.awaiting
+    assert tracker.confirmed == 1
+    assert tracker.latency.count == 1
+
+
+def test_limits_above_the_rating_are_confirmed_at_the_rating():
+    tracker = _tracking()
+    tracker.sent({"P1": 40.0}, 0, 0)
+    tracker.observe({"P1": 32.0}, 32, 3)
+
+    assert tracker.confirmed == 1
+
+
+def test_unapplied_command_is_reissued_then_dropped():
+    tracker = _tracking()
+    tracker.sent(LIMITS, 0, 0)
+
+    assert tracker.overdue(30) is None
+    for now in (60, 120):
+        assert tracker.overdue(now) == LIMITS
+        tracker.sent(LIMITS, now, now)
+
+    assert tracker.overdue(180) is None
+    assert not tracker.awaiting
+    assert (tracker.reissued, tracker.unapplied) == (2, 1)
+
+
+def test_capped_reissues_are_bounded():
+    tracker = _tracking()
+    tracker.sent(LIMITS, 0, 0)
+
+    # every reissue goes out capped to lower targets than the one before
+    reissues = 0
+    now = 0
+    while tracker.overdue(now + 60) is not None:
+        now += 60
+        reissues += 1
+        tracker.sent({"P1": LIMITS["P1"] - reissues}, now, now)
+        assert reissues <= 2
+
+    assert tracker.unapplied == 1
+
+
+def test_reissue_not_sent_is_forgotten():
+    tracker = _tracking(reissues=1)
+    tracker.sent(LIMITS, 0, 0)
+    assert tracker.overdue(60) == LIMITS
+    tracker.cancel_reissue()
+
+    # the next command is a new one with reissues of its own
+    tracker.sent({"P1": 12.0}, 61, 61)
+
+    assert tracker.overdue(121) == {"P1": 12.0}
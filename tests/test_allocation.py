@@ -0,0 +1,61 @@
+"""Phase aware sharing of the fuse headroom"""
+
+from custom_components.generic_charge_controller.loadbalancer.allocation import (
+    PHASE_SWITCH_HOLD_SEC,
+    ChargerDemand,
+    PhaseAllocator,
+)
+
+from custom_components.generic_charge_controller.const import PHASE1, PHASE2, PHASE3
+
+from .common import PHASES
+
+IDLE = dict.fromkeys(PHASES, 0.0)
+
+
+def _demand(key, limit=16, currents=IDLE, switchable=False) -> ChargerDemand:
+    return ChargerDemand(key, limit, PHASES, currents, switchable)
+
+
+def test_headroom_is_shared_evenly():
+    allocations = PhaseAllocator().allocate(
+        dict.fromkeys(PHASES, 20), [_demand("a"), _demand("b")], 0
+    )
+
+    assert allocations == [dict.fromkeys(PHASES, 10)] * 2
+
+
+def test_one_charger_pauses_when_both_cannot_charge():
+    allocations = PhaseAllocator().allocate(
+        dict.fromkeys(PHASES, 10), [_demand("a"), _demand("b")], 0
+    )
+
+    assert sorted(allocation[PHASE1] for allocation in allocations) == [0, 10]
+
+
+def test_single_phase_vehicle_leaves_the_other_phases():
+    single = _demand("a", 6, {PHASE1: 6.0, PHASE2: 0.0, PHASE3: 0.0})
+    allocator = PhaseAllocator()
+    allocations = allocator.allocate(
+        dict.fromkeys(PHASES, 16), [single, _demand("b")], 0
+    )
+
+    assert allocator.drawn_phases(single) == (PHASE1,)
+    assert allocations == [dict.fromkeys(PHASES, 6), dict.fromkeys(PHASES, 10)]
+
+
+def test_switch_to_one_phase_and_back_after_the_hold():
+    allocator = PhaseAllocator()
+    demand = _demand("a", switchable=True)
+
+    allocations = allocator.allocate({PHASE1: 12, PHASE2: 4, PHASE3: 4}, [demand], 0)
+    assert allocations == [{PHASE1: 12, PHASE2: 0, PHASE3: 0}]
+    assert allocator.single_phase == ["a"]
+
+    roomy = dict.fromkeys(PHASES, 16)
+    allocator.allocate(roomy, [demand], PHASE_SWITCH_HOLD_SEC - 1)
+    assert allocator.single_phase == ["a"]
+
+    allocations = allocator.allocate(roomy, [demand], PHASE_SWITCH_HOLD_SEC)
+    assert allocations == [dict.fromkeys(PHASES, 16)]
+    assert allocator.single_phase == []
@@ -0,0 +1,202 @@
+"""Fuse limits of the balancer from the mains readings"""
+
+from homeassistant.const import STATE_ON, STATE_UNAVAILABLE
+
+from custom_components.generic_charge_controller.const import (
+    SAMPLING_MODE_ADAPTIVE,
+    SAMPLING_MODE_POLL,
+)
+from custom_components.generic_charge_controller.loadbalancer.calculator import (
+    MAX_SAMPLE_INTERVAL_SEC,
+    MIN_SAMPLE_INTERVAL_SEC,
+)
+from custom_components.generic_charge_controller.loadbalancer.core import (
+    DEFAULT_SAMPLE_INTERVAL_SEC,
+    async_get_balancer,
+)
+
+from .common import PHASES, StubCharger, StubController, async_test
+
+MAX_SAMPLE_AGE = 30
+STALE_LIMIT = 6
+
+
+def _balancer(
+    hass, prefix, rated_current, window_size=6, parent=None, mode=SAMPLING_MODE_POLL
+):
+    return async_get_balancer(
+        hass,
+        {phase: f"{prefix}_{phase.lower()}" for phase in PHASES},
+        rated_current,
+        window_size,
+        mode,
+        max_sample_age=MAX_SAMPLE_AGE,
+        stale_limit=STALE_LIMIT,
+        parent=parent,
+    )
+
+
+def _set_mains(hass, prefix, value) -> None:
+    for phase in PHASES:
+        hass.states.async_set(f"{prefix}_{phase.lower()}", value)
+
+
+def _report_mains(hass, prefix) -> None:
+    for phase in PHASES:
+        hass.states.async_report(f"{prefix}_{phase.lower()}")
+
+
+async def _tick(hass, ticks=1, mains=None) -> None:
+    """Let `ticks` sample intervals pass, the meter reporting `mains` if given"""
+    for _ in range(ticks):
+        hass.clock.advance(DEFAULT_SAMPLE_INTERVAL_SEC)
+        if mains is not None:
+            _set_mains(hass, "sensor.main", mains)
+        await hass.async_run_due()
+
+
+def _register(balancer, charger=None) -> StubController:
+    controller = StubController(charger or StubCharger(), "charger")
+    balancer.async_register(controller)
+    return controller
+
+
+@async_test
+async def test_limits_follow_the_household_load(hass):
+    _set_mains(hass, "sensor.main", 5)
+    main = _balancer(hass, "sensor.main", 25)
+    charger = StubCharger(8.0)
+    controller = _register(main, charger)
+
+    # the charger's own draw is not household load
+    await _tick(hass, 6, mains=13)
+    assert controller.state == STATE_ON
+    assert controller.targets == dict.fromkeys(PHASES, 19)
+
+
+@async_test
+async def test_unavailable_parent_holds_the_sub_circuit(hass):
+    _set_mains(hass, "sensor.main", 5)
+    _set_mains(hass, "sensor.garage", 2)
+    main = _balancer(hass, "sensor.main", 40)
+    garage = _balancer(hass, "sensor.garage", 25, parent=main)
+    controller = _register(garage)
+
+    await _tick(hass, 3)
+    assert controller.targets == dict.fromkeys(PHASES, 22)
+
+    hass.states.async_set("sensor.main_p2", STATE_UNAVAILABLE)
+    # the sub-circuit ticks first and sees the fallback one tick later
+    await _tick(hass, 2)
+    assert main.circuit.slack == dict.fromkeys(PHASES, STALE_LIMIT)
+    assert controller.targets == dict.fromkeys(PHASES, STALE_LIMIT)
+
+
+@async_test
+async def test_parent_without_reading_holds_the_sub_circuit(hass):
+    _set_mains(hass, "sensor.garage", 2)
+    main = _balancer(hass, "sensor.main", 40)
+    garage = _balancer(hass, "sensor.garage", 25, parent=main)
+    controller = _register(garage)
+
+    await _tick(hass)
+    assert controller.targets == dict.fromkeys(PHASES, 0)
+
+    await _tick(hass)
+    assert controller.targets == dict.fromkeys(PHASES, STALE_LIMIT)
+
+
+@async_test
+async def test_stale_parent_holds_the_sub_circuit(hass):
+    _set_mains(hass, "sensor.main", 5)
+    _set_mains(hass, "sensor.garage", 2)
+    main = _balancer(hass, "sensor.main", 40)
+    garage = _balancer(hass, "sensor.garage", 25, parent=main)
+    controller = _register(garage)
+
+    for _ in range(3):
+        _report_mains(hass, "sensor.main")
+        await _tick(hass)
+    assert controller.targets == dict.fromkeys(PHASES, 22)
+    assert not main.stale_sources
+
+    # the meter goes quiet, the parent has no charger of its own to notice
+    await _tick(hass, MAX_SAMPLE_AGE // DEFAULT_SAMPLE_INTERVAL_SEC + 1)
+    assert len(main.stale_sources) == len(PHASES)
+    assert controller.targets == dict.fromkeys(PHASES, STALE_LIMIT)
+
+    for _ in range(2):
+        _report_mains(hass, "sensor.main")
+        await _tick(hass)
+    assert not main.stale_sources
+    assert controller.targets == dict.fromkeys(PHASES, 22)
+
+
+@async_test
+async def test_steady_meter_without_heartbeat_is_not_stale(hass):
+    _set_mains(hass, "sensor.main", 5)
+    main = _balancer(hass, "sensor.main", 25)
+    controller = _register(main)
+
+    # Home Assistant before 2024.4 writes no new state for a repeated value
+    await _tick(hass, MAX_SAMPLE_AGE // DEFAULT_SAMPLE_INTERVAL_SEC * 3)
+    assert not main.stale_sources
+    assert controller.targets == dict.fromkeys(PHASES, 19)
+
+
+@async_test
+async def test_only_chargers_drawing_current_go_stale(hass):
+    _set_mains(hass, "sensor.main", 5)
+    main = _balancer(hass, "sensor.main", 25)
+    charger = StubCharger(reported=hass.clock.time())
+    controller = _register(main, charger)
+
+    await _tick(hass, MAX_SAMPLE_AGE // DEFAULT_SAMPLE_INTERVAL_SEC + 1)
+    assert not main.stale_sources
+
+    charger.currents = dict.fromkeys(PHASES, 8.0)
+    _set_mains(hass, "sensor.main", 13)
+    await _tick(hass)
+    assert main.stale_sources == [controller.unique_id]
+    assert controller.targets == dict.fromkeys(PHASES, STALE_LIMIT)
+
+
+@async_test
+async def test_thermal_protection_bypasses_the_filter(hass):
+    _set_mains(hass, "sensor.main", 5)
+    main = _balancer(hass, "sensor.main", 25, window_size=60)
+    controller = _register(main)
+    await _tick(hass, 60, mains=5)
+    assert controller.targets == dict.fromkeys(PHASES, 19)
+
+    await _tick(hass, 2, mains=40)
+    # the mean follows slowly while the fuse has budget left
+    assert not any(main.fuse_usage[phase] >= 0.8 for phase in PHASES)
+    assert controller.targets["P1"] > 0
+
+    await _tick(hass, 8, mains=40)
+    assert all(main.fuse_usage[phase] >= 0.8 for phase in PHASES)
+    assert all(main.phases[phase].filtered_current < 15 for phase in PHASES)
+    assert controller.targets == dict.fromkeys(PHASES, 0)
+
+
+@async_test
+async def test_adaptive_interval_follows_the_household_load(hass):
+    _set_mains(hass, "sensor.main", 20)
+    main = _balancer(hass, "sensor.main", 25, mode=SAMPLING_MODE_ADAPTIVE)
+    charger = StubCharger(18.0)
+    _register(main, charger)
+
+    async def sample(ticks, mains) -> None:
+        for _ in range(ticks):
+            hass.clock.advance(main.sample_interval)
+            _set_mains(hass, "sensor.main", mains)
+            await hass.async_run_due()
+
+    # a charger drawing up to the rating leaves the interval long
+    await sample(3, 20)
+    assert main.sample_interval == MAX_SAMPLE_INTERVAL_SEC
+
+    charger.currents = dict.fromkeys(PHASES, 0.0)
+    await sample(20, 24)
+    assert main.sample_interval == MIN_SAMPLE_INTERVAL_SEC
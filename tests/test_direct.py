@@ -0,0 +1,92 @@
+"""Phase currents read straight from MQTT and Modbus meters"""
+
+import asyncio
+import json
+
+from custom_components.generic_charge_controller.loadbalancer import direct
+from custom_components.generic_charge_controller.loadbalancer.direct import (
+    MBAP_HEADER,
+    DirectMeters,
+)
+
+from sim import SimulatedModbusMeter
+
+from .common import async_test
+
+
+async def _until(condition, timeout: float = 2) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@async_test
+async def test_mqtt_payloads_plain_and_json(hass):
+    meters = DirectMeters(hass)
+    plain = meters.async_open("mqtt:meter/p1")
+    nested = meters.async_open("mqtt:meter/all#current.1")
+    await asyncio.sleep(0)
+
+    hass.mqtt.publish("meter/p1", b"12.5")
+    hass.mqtt.publish("meter/all", json.dumps({"current": [10, 11, 12]}).encode())
+
+    assert plain.read().value == 12.5
+    assert nested.read().value == 11.0
+
+    hass.mqtt.publish("meter/all", b"offline")
+    assert nested.read() is None
+
+    meters.async_close(plain)
+    meters.async_close(nested)
+    assert not meters.meters
+
+
+@async_test
+async def test_modbus_registers_are_read_in_one_request(hass):
+    meter = SimulatedModbusMeter()
+    meter.currents.update(P1=10.0, P2=11.0, P3=12.0)
+    await meter.start()
+    meters = DirectMeters(hass)
+    streams = [
+        meters.async_open(meter.source(phase, interval=0.1))
+        for phase in ("P1", "P2", "P3")
+    ]
+    try:
+        await _until(lambda: all(stream.read() for stream in streams))
+
+        assert [stream.read().value for stream in streams] == [10.0, 11.0, 12.0]
+        (connection,) = meters.meters.values()
+        assert connection.as_dict()["requests"] == 1
+    finally:
+        for stream in streams:
+            meters.async_close(stream)
+        await meter.stop()
+
+
+@async_test
+async def test_modbus_poll_survives_short_frames(hass, monkeypatch):
+    monkeypatch.setattr(direct, "RECONNECT_DELAY_SEC", 0.01)
+
+    async def serve(reader, writer) -> None:
+        header = await reader.readexactly(MBAP_HEADER.size)
+        transaction, _, length, unit = MBAP_HEADER.unpack(header)
+        await reader.readexactly(length - 1)
+        # unit id and function code, but no data
+        writer.write(MBAP_HEADER.pack(transaction, 0, 2, unit) + b"\x04")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    meters = DirectMeters(hass)
+    stream = meters.async_open(f"modbus://127.0.0.1:{port}/1/6")
+    (connection,) = meters.meters.values()
+    try:
+        await _until(lambda: connection.errors >= 2)
+
+        assert stream.read() is None
+        assert "Frame of 2 bytes" in connection.last_error
+    finally:
+        meters.async_close(stream)
+        server.close()
+        await server.wait_closed()
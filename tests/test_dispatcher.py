@@ -0,0 +1,75 @@
+"""Priority of limit decreases in the command dispatcher"""
+
+import asyncio
+import logging
+
+from homeassistant.exceptions import HomeAssistantError
+
+from custom_components.generic_charge_controller.loadbalancer.dispatcher import (
+    CommandDispatcher,
+)
+
+from .common import async_test
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FlakyCharger:
+    """Fails the first limit command, records every one"""
+
+    def __init__(self) -> None:
+        self.sent: list[dict[str, float]] = []
+        self.delivered = asyncio.Event()
+
+    async def send(self, limits: dict[str, float]) -> None:
+        self.sent.append(limits)
+        if len(self.sent) == 1:
+            raise HomeAssistantError("cloud unavailable")
+        self.delivered.set()
+
+
+async def _first_failed(dispatcher: CommandDispatcher, charger: FlakyCharger) -> None:
+    dispatcher.submit({"P1": 16})
+    while not charger.sent:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert dispatcher.busy
+
+
+@async_test
+async def test_decrease_cuts_the_retry_backoff_short(hass):
+    charger = FlakyCharger()
+    dispatcher = CommandDispatcher(hass, _LOGGER, charger.send, backoff=60)
+    await _first_failed(dispatcher, charger)
+
+    dispatcher.submit({"P1": 6})
+    await asyncio.wait_for(charger.delivered.wait(), 1)
+
+    # the failed increase is not retried after the decrease
+    assert charger.sent == [{"P1": 16}, {"P1": 6}]
+    assert dispatcher.retries == 0
+
+
+@async_test
+async def test_increase_waits_out_the_retry_backoff(hass):
+    charger = FlakyCharger()
+    dispatcher = CommandDispatcher(hass, _LOGGER, charger.send, backoff=60)
+    await _first_failed(dispatcher, charger)
+
+    dispatcher.submit({"P1": 20})
+    await asyncio.sleep(0.1)
+
+    assert charger.sent == [{"P1": 16}]
+    assert dispatcher.busy
+    dispatcher.async_cancel()
+
+
+@async_test
+async def test_limits_already_in_flight_are_not_queued_again(hass):
+    charger = FlakyCharger()
+    dispatcher = CommandDispatcher(hass, _LOGGER, charger.send, backoff=60)
+    await _first_failed(dispatcher, charger)
+
+    assert not dispatcher.submit({"P1": 16})
+    assert dispatcher.submit({"P1": 6})
+    await asyncio.wait_for(charger.delivered.wait(), 1)
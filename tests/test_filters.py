@@ -0,0 +1,107 @@
+"""Load filter strategies over a sample matrix"""
+
+import math
+
+import numpy
+
+from custom_components.generic_charge_controller.const import (
+    FILTER_EWMA,
+    FILTER_KALMAN,
+    FILTER_MEAN,
+    FILTER_MEDIAN,
+    FILTER_TRIMMED_MEAN,
+)
+from custom_components.generic_charge_controller.loadbalancer.filters import (
+    EwmaLoadFilter,
+    create_load_filter,
+)
+from custom_components.generic_charge_controller.loadbalancer.samples import (
+    NOMINAL_SAMPLE_INTERVAL_SEC,
+    PhaseSampleMatrix,
+)
+
+
+def _feed(load_filter, matrix, samples) -> None:
+    for timestamp, value in samples:
+        matrix.push(0, value, timestamp)
+        load_filter.observe(0, value, timestamp)
+
+
+def test_mean_is_the_window_mean():
+    matrix = PhaseSampleMatrix(1, 3)
+    load_filter = create_load_filter(FILTER_MEAN, matrix)
+    _feed(load_filter, matrix, [(0, 30.0), (5, 6.0), (10, 9.0), (15, 12.0)])
+
+    assert load_filter.estimate().tolist() == [9.0]
+
+
+def test_ewma_weighs_samples_by_the_time_between_them():
+    time_constant = 10.0
+    steady = EwmaLoadFilter(PhaseSampleMatrix(1, 6), time_constant)
+    for timestamp in (0, 10, 20):
+        steady.observe(0, 0.0 if timestamp == 0 else 10.0, timestamp)
+    sparse = EwmaLoadFilter(PhaseSampleMatrix(1, 6), time_constant)
+    sparse.observe(0, 0.0, 0)
+    sparse.observe(0, 10.0, 20)
+
+    expected = 10.0 * -math.expm1(-20 / time_constant)
+    assert numpy.allclose(steady.estimate(), [expected])
+    assert numpy.allclose(sparse.estimate(), [expected])
+    assert create_load_filter(FILTER_EWMA, PhaseSampleMatrix(1, 6)).name == FILTER_EWMA
+
+
+def test_kalman_looks_ahead_of_a_rising_load():
+    matrix = PhaseSampleMatrix(1, 6)
+    kalman = create_load_filter(FILTER_KALMAN, matrix)
+    mean = create_load_filter(FILTER_MEAN, matrix)
+    ramp = [(t, 0.2 * t) for t in range(0, 300, NOMINAL_SAMPLE_INTERVAL_SEC)]
+    _feed(kalman, matrix, ramp)
+
+    latest = ramp[-1][1]
+    assert mean.estimate()[0] < latest < kalman.estimate()[0]
+    assert (
+        abs(kalman.estimate()[0] - (latest + 0.2 * NOMINAL_SAMPLE_INTERVAL_SEC)) < 0.5
+    )
+
+
+def test_median_ignores_outliers_in_the_window():
+    matrix = PhaseSampleMatrix(1, 6)
+    median = create_load_filter(FILTER_MEDIAN, matrix)
+    _feed(median, matrix, [(0, 10.0), (5, 10.0), (10, 40.0), (15, 11.0), (20, 9.0)])
+
+    assert median.estimate().tolist() == [10.0]
+
+
+def test_trimmed_mean_drops_a_quarter_at_each_end():
+    matrix = PhaseSampleMatrix(1, 8)
+    trimmed = create_load_filter(FILTER_TRIMMED_MEAN, matrix)
+    _feed(trimmed, matrix, [(5 * i, float(i + 1)) for i in range(8)])
+
+    assert trimmed.estimate().tolist() == [4.5]
+
+
+def test_window_is_a_span_of_time():
+    matrix = PhaseSampleMatrix(1, 3)
+    median = create_load_filter(FILTER_MEDIAN, matrix)
+    # one sample a second, then a gap longer than the window
+    _feed(median, matrix, [(t, 30.0) for t in range(10)] + [(30, 6.0)])
+
+    assert median.estimate().tolist() == [6.0]
+
+
+def test_lone_spike_is_rejected():
+    matrix = PhaseSampleMatrix(1, 6)
+    median = create_load_filter(FILTER_MEDIAN, matrix, spike_threshold=5)
+    _feed(median, matrix, [(0, 10.0), (5, 10.0), (10, 10.0), (15, 40.0), (20, 10.0)])
+
+    assert median.rejected == [1]
+    assert median.estimate().tolist() == [10.0]
+
+
+def test_step_in_the_load_is_let_in():
+    matrix = PhaseSampleMatrix(1, 3)
+    median = create_load_filter(FILTER_MEDIAN, matrix, spike_threshold=5)
+    _feed(median, matrix, [(0, 10.0), (5, 10.0), (10, 10.0), (15, 30.0), (20, 30.0)])
+
+    assert median.rejected == [0]
+    assert median.estimate().tolist() == [30.0]
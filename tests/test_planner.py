@@ -0,0 +1,136 @@
+"""Charging in the cheapest price slots"""
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+from homeassistant.core import callback
+
+from custom_components.generic_charge_controller.loadbalancer.planner import (
+    ChargePlanner,
+    PriceSlot,
+    parse_prices,
+)
+from custom_components.generic_charge_controller.scheduler import (
+    COMMAND_HOLD_SEC,
+    COMMAND_RETRIES,
+    ChargeScheduler,
+)
+
+from .common import StubCharger, async_test
+
+HOUR = 3600
+PRICES = [30.0, 20.0, 5.0, 5.0, 40.0, 50.0]
+# one hour at 16 A on three phases
+SLOT_KWH = 16 * 3 * 230 / 1000
+
+
+def _planner(headroom=None, max_price=None) -> ChargePlanner:
+    planner = ChargePlanner(3, 16, max_price, headroom)
+    planner.update_prices(
+        [PriceSlot(h * HOUR, (h + 1) * HOUR, p) for h, p in enumerate(PRICES)], 0
+    )
+    return planner
+
+
+def _limits(planner: ChargePlanner) -> list[float]:
+    return [planner.limit(h * HOUR + 1) for h in range(len(PRICES))]
+
+
+def test_cheapest_slots_are_taken():
+    planner = _planner()
+    planner.set_target(SLOT_KWH + 4, len(PRICES) * HOUR)
+
+    # the second cheap hour only charges what is left
+    assert _limits(planner) == [0, 0, 16, 6, 0, 0]
+    assert planner.shortfall == 0
+
+
+def test_slots_without_headroom_are_skipped():
+    planner = _planner(lambda start, end: 4 if start == 2 * HOUR else None)
+    planner.set_target(SLOT_KWH, len(PRICES) * HOUR)
+
+    assert _limits(planner) == [0, 0, 0, 16, 0, 0]
+
+
+def test_delivered_energy_frees_the_expensive_slots():
+    planner = _planner()
+    planner.set_target(3 * SLOT_KWH, len(PRICES) * HOUR)
+    assert _limits(planner) == [0, 16, 16, 16, 0, 0]
+
+    planner.consume(SLOT_KWH)
+    assert _limits(planner) == [0, 0, 16, 16, 0, 0]
+
+
+def test_without_a_target_every_slot_up_to_the_max_price_charges():
+    planner = _planner(max_price=20)
+
+    assert _limits(planner) == [0, 16, 16, 16, 0, 0]
+
+
+def test_prices_by_the_hour_last_until_the_next_one():
+    slots = parse_prices(
+        {
+            "raw_today": [
+                {"hour": "2024-03-01T00:00:00+00:00", "price": 10},
+                {"hour": "2024-03-01T00:15:00+00:00", "price": "12.5"},
+                {"hour": "2024-03-01T00:30:00+00:00", "price": None},
+            ],
+            "raw_tomorrow": None,
+        }
+    )
+
+    assert [(slot.end - slot.start, slot.price) for slot in slots] == [
+        (900, 10.0),
+        (HOUR, 12.5),
+    ]
+
+
+class PluggedCharger(StubCharger):
+    """Vehicle waiting for `start`, which the charger ignores"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.is_charging = False
+        self.commands: list[str] = []
+        self.status_listener = None
+
+    async def start(self) -> None:
+        self.commands.append("start")
+
+    @property
+    def can_start(self) -> bool:
+        return not self.is_charging
+
+    @callback
+    def async_add_status_listener(self, listener):
+        self.status_listener = listener
+        return lambda: None
+
+
+@async_test
+async def test_start_retries_start_over_on_a_status_change(hass):
+    now = hass.clock.now()
+    hass.states.async_set(
+        "sensor.price",
+        10,
+        {
+            "raw_today": [
+                {"start": now, "end": now + timedelta(hours=1), "value": 5},
+            ]
+        },
+    )
+    charger = PluggedCharger()
+    balancer = SimpleNamespace(
+        rated_current=25, predicted_headroom=lambda start, end, phases: None
+    )
+    scheduler = ChargeScheduler(hass, charger, balancer, "sensor.price", 10)
+    scheduler.async_subscribe()
+
+    for _ in range(COMMAND_RETRIES + 2):
+        hass.clock.advance(COMMAND_HOLD_SEC)
+        await hass.async_run_due()
+    assert charger.commands == ["start"] * (COMMAND_RETRIES + 1)
+
+    charger.status_listener()
+    await hass.async_run_due()
+    assert len(charger.commands) == COMMAND_RETRIES + 2
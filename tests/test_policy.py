@@ -0,0 +1,56 @@
+"""Deadband, increase interval and refresh of limit commands"""
+
+from custom_components.generic_charge_controller.loadbalancer.policy import (
+    REFRESH_MARGIN_SEC,
+    SUPPRESSED_DEADBAND,
+    SUPPRESSED_INCREASE_INTERVAL,
+    CommandPolicy,
+)
+
+
+def _sent(policy: CommandPolicy, limits: dict[str, float], now: float) -> None:
+    assert policy.evaluate(limits, now) == limits
+    policy.record_sent(limits, now)
+
+
+def test_first_limits_and_decreases_go_out_at_once():
+    policy = CommandPolicy()
+    _sent(policy, {"P1": 16}, 0)
+
+    assert policy.evaluate({"P1": 15}, 1) == {"P1": 15}
+
+
+def test_small_increase_is_suppressed():
+    policy = CommandPolicy(increase_deadband=2, increase_interval=0)
+    _sent(policy, {"P1": 10}, 0)
+
+    assert policy.evaluate({"P1": 11}, 100) == {}
+    assert policy.counters[SUPPRESSED_DEADBAND] == 1
+    assert policy.evaluate({"P1": 12}, 100) == {"P1": 12}
+
+
+def test_increase_waits_for_the_interval():
+    policy = CommandPolicy(increase_interval=60)
+    _sent(policy, {"P1": 10}, 0)
+    _sent(policy, {"P1": 14}, 10)
+
+    assert policy.evaluate({"P1": 18}, 30) == {}
+    assert policy.counters[SUPPRESSED_INCREASE_INTERVAL] == 1
+    assert policy.evaluate({"P1": 18}, 70) == {"P1": 18}
+
+
+def test_decrease_holds_back_a_pending_increase():
+    policy = CommandPolicy(increase_interval=60)
+    _sent(policy, {"P1": 10, "P2": 10}, 0)
+    _sent(policy, {"P1": 14, "P2": 14}, 10)
+
+    assert policy.evaluate({"P1": 8, "P2": 18}, 20) == {"P1": 8, "P2": 14}
+
+
+def test_unchanged_limits_are_refreshed_before_they_expire():
+    policy = CommandPolicy(ttl_minutes=5)
+    _sent(policy, {"P1": 10}, 0)
+    refresh = 5 * 60 - REFRESH_MARGIN_SEC
+
+    assert policy.evaluate({"P1": 10}, refresh - 1) == {}
+    assert policy.evaluate({"P1": 10}, refresh) == {"P1": 10}
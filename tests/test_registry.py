@@ -0,0 +1,39 @@
+"""Mains sensor streams shared between balancers"""
+
+from custom_components.generic_charge_controller.loadbalancer.registry import (
+    async_get_sensor_registry,
+)
+
+
+def test_balancers_share_one_stream(hass):
+    registry = async_get_sensor_registry(hass)
+    first = registry.async_acquire("sensor.mains_p1")
+    second = registry.async_acquire("sensor.mains_p1")
+    assert first is second
+
+    readings = []
+    remove = first.async_add_listener(readings.append)
+    second.async_add_listener(readings.append)
+    hass.states.async_set("sensor.mains_p1", 12.5)
+    assert [reading.value for reading in readings] == [12.5, 12.5]
+
+    remove()
+    registry.async_release(first)
+    assert registry.streams
+    registry.async_release(second)
+    assert not registry.streams
+
+
+def test_repeated_value_moves_the_report_time(hass):
+    stream = async_get_sensor_registry(hass).async_acquire("sensor.mains_p1")
+    hass.states.async_set("sensor.mains_p1", 12.5)
+    first = stream.read()
+    assert not first.heartbeat
+
+    hass.clock.advance(5)
+    hass.states.async_report("sensor.mains_p1")
+    reading = stream.read()
+
+    assert reading.heartbeat
+    assert reading.value == 12.5
+    assert reading.reported == first.reported + 5
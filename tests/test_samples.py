@@ -0,0 +1,64 @@
+"""Running window means of the phase sample matrix"""
+
+import random
+
+import numpy
+
+from custom_components.generic_charge_controller.loadbalancer import samples
+from custom_components.generic_charge_controller.loadbalancer.samples import (
+    NOMINAL_SAMPLE_INTERVAL_SEC,
+    PhaseSampleMatrix,
+)
+
+
+def test_means_follow_the_newest_window(monkeypatch):
+    # resync mid-run, so both the running and the re-added sums are checked
+    monkeypatch.setattr(samples, "RESYNC_INTERVAL", 7)
+    rng = random.Random(1)
+    matrix = PhaseSampleMatrix(3, 4, capacity=6)
+    history = [[], [], []]
+
+    for step in range(50):
+        timestamp = step * NOMINAL_SAMPLE_INTERVAL_SEC
+        if step % 5 == 4:
+            # the meters reporting one at a time
+            for row in rng.sample(range(3), 3):
+                value = rng.uniform(0, 40)
+                matrix.push(row, value, timestamp)
+                history[row].append(value)
+        else:
+            values = numpy.array([rng.uniform(0, 40) for _ in range(3)])
+            matrix.push_all(values, timestamp)
+            for row, value in enumerate(values.tolist()):
+                history[row].append(value)
+
+        expected = [numpy.mean(values[-4:]) for values in history]
+        assert numpy.allclose(matrix.means(), expected)
+
+    assert matrix.values(0).tolist() == history[0][-6:]
+    assert matrix.latest(1)[0] == history[1][-1]
+
+
+def test_empty_rows_have_no_mean():
+    matrix = PhaseSampleMatrix(2, 3)
+    matrix.push(0, 12.0, 0)
+
+    assert matrix.means().tolist() == [12.0, 0.0]
+    assert matrix.latest(1) is None
+
+    matrix.clear()
+    assert matrix.means().tolist() == [0.0, 0.0]
+
+
+def test_window_is_a_span_of_time():
+    matrix = PhaseSampleMatrix(1, 3)
+    assert matrix.window_sec == 3 * NOMINAL_SAMPLE_INTERVAL_SEC
+
+    # faster samples all count, up to the capacity
+    for timestamp in range(10):
+        matrix.push(0, float(timestamp), timestamp)
+    assert matrix.mean(0) == numpy.mean(range(10))
+
+    # a sample after a gap longer than the window stands alone
+    matrix.push_all(numpy.array([30.0]), 40)
+    assert matrix.mean(0) == 30.0
@@ -0,0 +1,77 @@
+"""Controller state written only when it changes"""
+
+from types import SimpleNamespace
+
+from homeassistant.const import STATE_OFF, STATE_ON
+
+from custom_components.generic_charge_controller.const import ATTR_LIMIT_Px
+from custom_components.generic_charge_controller.sensor import (
+    ChargeControllerSensor,
+)
+
+from .common import PHASES, StubCharger, async_test
+
+MIN_INTERVAL = 30
+
+
+def _controller(hass) -> tuple[ChargeControllerSensor, list]:
+    controller = ChargeControllerSensor(
+        hass,
+        "Charger",
+        "charger",
+        SimpleNamespace(sample_interval=5),
+        StubCharger(),
+        min_interval=MIN_INTERVAL,
+        limit_threshold=2,
+    )
+    writes = []
+
+    def write() -> None:
+        attributes = controller.state_attributes
+        limits = [attributes[ATTR_LIMIT_Px % phase] for phase in PHASES]
+        writes.append((controller.native_value, limits))
+
+    controller.async_write_ha_state = write
+    return controller, writes
+
+
+def test_repeated_allocation_is_written_once(hass):
+    controller, writes = _controller(hass)
+    for _ in range(3):
+        controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 10))
+
+    assert len(writes) == 1
+
+
+def test_state_change_is_written_at_once(hass):
+    controller, writes = _controller(hass)
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 10))
+    controller.async_update_allocation(STATE_OFF, None)
+
+    assert [state for state, _ in writes] == [STATE_ON, STATE_OFF]
+
+
+@async_test
+async def test_small_limit_changes_are_not_written(hass):
+    controller, writes = _controller(hass)
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 10))
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 11))
+
+    hass.clock.advance(MIN_INTERVAL)
+    await hass.async_run_due()
+    assert len(writes) == 1
+
+
+@async_test
+async def test_limit_changes_wait_for_the_interval(hass):
+    controller, writes = _controller(hass)
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 10))
+    hass.clock.advance(1)
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 14))
+    controller.async_update_allocation(STATE_ON, dict.fromkeys(PHASES, 16))
+    assert len(writes) == 1
+
+    hass.clock.advance(MIN_INTERVAL)
+    await hass.async_run_due()
+    assert writes[-1] == (STATE_ON, [16, 16, 16])
+    assert len(writes) == 2
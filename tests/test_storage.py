@@ -0,0 +1,79 @@
+"""Phase samples and limits kept across restarts"""
+
+from types import SimpleNamespace
+import time
+
+from custom_components.generic_charge_controller.const import (
+    DATA_BALANCERS,
+    DOMAIN,
+    PHASE1,
+)
+from custom_components.generic_charge_controller.loadbalancer.phase import (
+    ElectricalPhase,
+)
+from custom_components.generic_charge_controller.loadbalancer.policy import (
+    CommandPolicy,
+)
+from custom_components.generic_charge_controller.storage import (
+    ChargeControllerStore,
+)
+
+from .common import StubCharger, StubController
+
+KEY = ("sensor.mains_p1",)
+
+
+class PolicyCharger(StubCharger):
+    """Charger with a command policy to persist"""
+
+    def __init__(self, policy: CommandPolicy) -> None:
+        super().__init__()
+        self.policy = policy
+
+    @property
+    def command_policy(self) -> CommandPolicy:
+        return self.policy
+
+
+def _restarted(hass, phase: ElectricalPhase, policy: CommandPolicy):
+    """Store data saved from a balancer with the given phase and policy"""
+    balancer = SimpleNamespace(
+        key=KEY,
+        phases={PHASE1: phase},
+        forecast=SimpleNamespace(known=False),
+        controllers=[StubController(PolicyCharger(policy), "charger")],
+    )
+    hass.data[DOMAIN] = {DATA_BALANCERS: {KEY: balancer}}
+    saved = ChargeControllerStore(hass)._data_to_save()
+
+    restarted = ChargeControllerStore(hass)
+    restarted._data = saved
+    return restarted
+
+
+def test_recent_samples_are_restored(hass):
+    now = time.time()
+    phase = ElectricalPhase(PHASE1, KEY[0], None)
+    for age, value in ((600, 30.0), (10, 8.0), (5, 9.0), (0, 10.0)):
+        phase.add_sample(value, now - age)
+    store = _restarted(hass, phase, CommandPolicy())
+
+    restored = ElectricalPhase(PHASE1, KEY[0], None)
+    store.restore_phases(KEY, {PHASE1: restored}, 60)
+
+    assert restored.samples.tolist() == [8.0, 9.0, 10.0]
+    assert abs(restored.latest_sample_time - now) < 1
+
+
+def test_live_limits_are_restored_expired_ones_are_not(hass):
+    policy = CommandPolicy(ttl_minutes=5)
+    policy.record_sent({"P1": 12}, time.monotonic() - 60)
+    store = _restarted(hass, ElectricalPhase(PHASE1, KEY[0], None), policy)
+
+    restored = CommandPolicy(ttl_minutes=5)
+    store.restore_policy("charger", restored)
+    assert restored.last_limits == {"P1": 12}
+
+    expired = CommandPolicy(ttl_minutes=1)
+    store.restore_policy("charger", expired)
+    assert expired.last_limits == {}
@@ -0,0 +1,44 @@
+"""Headroom through the fuse tree"""
+
+from custom_components.generic_charge_controller.loadbalancer.topology import Circuit
+
+
+def _tree() -> tuple[Circuit, Circuit, Circuit]:
+    main = Circuit(("sensor.main",))
+    garage = Circuit(("sensor.garage",))
+    shed = Circuit(("sensor.shed",))
+    garage.attach(main)
+    shed.attach(main)
+    return main, garage, shed
+
+
+def test_unknown_slack_leaves_no_room():
+    main, garage, _ = _tree()
+    garage.update_slack({"P1": 20, "P2": 20})
+
+    assert garage.headroom(["P1", "P2"]) == {"P1": 0, "P2": 0}
+
+    main.update_slack({"P1": 10, "P2": 30})
+    assert garage.headroom(["P1", "P2"]) == {"P1": 10, "P2": 20}
+
+
+def test_claims_of_other_circuits_count_against_the_parent():
+    main, garage, shed = _tree()
+    main.update_slack({"P1": 16})
+    garage.update_slack({"P1": 16})
+    shed.update_slack({"P1": 16})
+
+    shed.claim({"P1": 10})
+    assert garage.headroom(["P1"]) == {"P1": 6}
+    assert shed.headroom(["P1"]) == {"P1": 16}
+
+    shed.claim({})
+    assert garage.headroom(["P1"]) == {"P1": 16}
+
+
+def test_unmeasured_phase_is_not_constrained():
+    main, garage, _ = _tree()
+    main.update_slack({"P1": 10})
+    garage.update_slack({"P1": 20, "P2": 15})
+
+    assert garage.headroom(["P1", "P2", "P3"]) == {"P1": 10, "P2": 15}